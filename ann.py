@@ -0,0 +1,271 @@
+"""Приближенный поиск похожих книг: векторы признаков и LSH случайных проекций.
+
+Книга — разреженный вектор: по признаку на значение жанра, поджанра, автора и
+на каждое значение тегов, тропов, настроений, тем и стилей; вес признака —
+корень из веса слагаемого формулы схожести, поэтому скалярное произведение
+векторов равно оценке формулы. Вектор хешируется знаками случайных проекций
+(SimHash) в несколько таблиц; кандидаты — книги из того же бакета и из бакетов
+с перевернутыми наименее уверенными битами, они ранжируются точной оценкой.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from multi_hot import _ranges
+from neighbors import SimilarityWeights
+
+# Число таблиц: больше — выше полнота и память (8 байт на книгу на таблицу)
+ANN_TABLES = 32
+# Бит ключа по умолчанию подбирается так, чтобы в бакете было около BUCKET_BOOKS книг:
+# больше бит — меньше бакеты, быстрее запрос и ниже полнота
+BUCKET_BOOKS = 16
+# Ключей на таблицу при запросе: бакет книги и бакеты с одним перевернутым битом
+ANN_PROBES = 4
+
+# Добавленные книги просматриваются линейно, пока их не наберется столько; затем таблицы пересортировываются
+TAIL_MERGE = 1024
+
+# Память на блок проекций при хешировании (элементы векторов × проекции, float32)
+HASH_BLOCK_BYTES = 64 * 2**20
+
+# Векторы книг: слагаемые формулы SimpleRecommender и остальные списковые атрибуты Book
+BOOK_VECTOR_WEIGHTS = SimilarityWeights(
+    "book_vectors",
+    scalar=(("main_genre", 3), ("sub_genre", 2), ("author", 1)),
+    lists=(("mood", 0.5), ("plot_tropes", 0.3), ("tags", 0.3), ("themes", 0.3), ("style", 0.2)),
+)
+
+
+class FeatureSpace:
+    """Словарь признаков (колонка, значение) → номер; новые значения дописываются в конец"""
+
+    def __init__(self, weights: SimilarityWeights = BOOK_VECTOR_WEIGHTS):
+        self.weights = weights
+        self.column_weights: Dict[str, float] = dict(weights.scalar) | dict(weights.lists)
+        self.features: Dict[Tuple[str, str], int] = {}
+        self.scales: List[float] = []  # значение признака в векторе: корень из веса колонки
+
+    @property
+    def n_features(self) -> int:
+        return len(self.scales)
+
+    def feature(self, column: str, value: str) -> int:
+        key = (column, value)
+        if key not in self.features:
+            self.features[key] = len(self.scales)
+            self.scales.append(float(np.sqrt(self.column_weights[column])))
+        return self.features[key]
+
+    def catalog_vectors(self, book_db) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Векторы всех книг каталога в CSR: indptr, признаки, значения (по кодам и multi-hot матрицам)"""
+        books = book_db.books
+        rows, features = [], []
+        for column, _ in self.weights.scalar:
+            categories = books[column].cat.categories
+            feature_of_code = np.array([self.feature(column, value) for value in categories], dtype=np.int64)
+            codes = books[column].cat.codes.to_numpy()
+            present = np.flatnonzero(codes >= 0)
+            rows.append(present)
+            features.append(feature_of_code[codes[present]])
+        for column, _ in self.weights.lists:
+            matrix = book_db.get_attribute_matrix(column)
+            feature_of_code = np.array([self.feature(column, value) for value in matrix.vocabulary], dtype=np.int64)
+            rows.append(matrix.row_of_entry.astype(np.int64))
+            features.append(feature_of_code[matrix.indices])
+
+        rows, features = np.concatenate(rows), np.concatenate(features)
+        order = np.lexsort((features, rows))
+        indptr = np.zeros(len(books) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(books)), out=indptr[1:])
+        features = features[order].astype(np.int32)
+        return indptr, features, np.asarray(self.scales, dtype=np.float32)[features]
+
+    def book_vector(self, book: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        """Вектор одной книги (словарь полей Book): признаки и значения"""
+        features = set()
+        for column, _ in self.weights.scalar:
+            if isinstance(book.get(column), str):
+                features.add(self.feature(column, book[column]))
+        for column, _ in self.weights.lists:
+            for value in book.get(column) or []:
+                features.add(self.feature(column, value))
+        features = np.asarray(sorted(features), dtype=np.int32)
+        return features, np.asarray(self.scales, dtype=np.float32)[features]
+
+
+def default_bits(n_books: int) -> int:
+    """Бит ключа для каталога: log2(n_books / BUCKET_BOOKS), от 4 до 30"""
+    return int(np.clip(round(np.log2(max(n_books, 1) / BUCKET_BOOKS)), 4, 30))
+
+
+class LSHIndex:
+    """LSH-индекс векторов книг с добавлением и удалением отдельных книг.
+
+    Слот — порядковый номер книги в индексе (при построении по каталогу совпадает
+    с позицией). Каждая таблица — отсортированные ключи и слоты (бинарный поиск
+    бакета); ключи добавленных позже книг лежат в «хвосте» и сравниваются
+    напрямую. Удаленные книги помечаются и не попадают в выдачу.
+    """
+
+    def __init__(self, space: FeatureSpace, tables: int = ANN_TABLES, bits: int = 16, seed: int = 0):
+        self.space = space
+        self.tables = tables
+        self.bits = bits
+        self.rng = np.random.default_rng(seed)
+        self.projections = np.zeros((0, tables * bits), dtype=np.float32)
+        self.bit_weights = (1 << np.arange(bits)).astype(np.int32)
+
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.ratings = np.zeros(0, dtype=np.float64)
+        self.alive = np.zeros(0, dtype=bool)
+        self.slot_of_id: Dict[int, int] = {}
+        self.indptr = np.zeros(1, dtype=np.int64)
+        self.features = np.zeros(0, dtype=np.int32)
+        self.values = np.zeros(0, dtype=np.float32)
+        self.sorted_count = 0  # слоты [0, sorted_count) — в отсортированных таблицах
+        self.orders = [np.zeros(0, dtype=np.int32) for _ in range(tables)]
+        self.sorted_keys = [np.zeros(0, dtype=np.int32) for _ in range(tables)]
+        self.tail_keys = np.zeros((0, tables), dtype=np.int32)  # ключи слотов от sorted_count
+
+    @classmethod
+    def build(cls, book_db, weights: SimilarityWeights = BOOK_VECTOR_WEIGHTS, tables: int = ANN_TABLES,
+              bits: Optional[int] = None, seed: int = 0) -> "LSHIndex":
+        """Индекс всех книг каталога (bits=None — по размеру каталога)"""
+        bits = default_bits(len(book_db.books)) if bits is None else bits
+        index = cls(FeatureSpace(weights), tables, bits, seed)
+        indptr, features, values = index.space.catalog_vectors(book_db)
+        index._append(book_db.books["id"].to_numpy(dtype=np.int64),
+                      book_db.books["rating"].to_numpy(dtype=np.float64), indptr, features, values)
+        index._sort_tables()
+        return index
+
+    def __len__(self) -> int:
+        return len(self.slot_of_id)
+
+    def _project(self, indptr: np.ndarray, features: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Проекции векторов CSR на случайные направления: строки × (таблицы · биты)"""
+        if len(self.projections) < self.space.n_features:
+            # Новым признакам — новые случайные направления; прежние не меняются
+            extra = self.rng.standard_normal((self.space.n_features - len(self.projections), self.projections.shape[1]))
+            self.projections = np.vstack([self.projections, extra.astype(np.float32)])
+
+        n_rows = len(indptr) - 1
+        result = np.zeros((n_rows, self.projections.shape[1]), dtype=np.float32)
+        max_entries = max(1, HASH_BLOCK_BYTES // (4 * self.projections.shape[1]))
+        start = 0
+        while start < n_rows:
+            stop = int(np.searchsorted(indptr, indptr[start] + max_entries, side="right")) - 1
+            stop = min(max(stop, start + 1), n_rows)
+            lengths = np.diff(indptr[start:stop + 1])
+            nonempty = np.flatnonzero(lengths)
+            if len(nonempty):
+                entries = slice(indptr[start], indptr[stop])
+                weighted = self.projections[features[entries]] * values[entries, None]
+                offsets = (indptr[start:stop] - indptr[start])[nonempty]
+                result[start + nonempty] = np.add.reduceat(weighted, offsets, axis=0)
+            start = stop
+        return result
+
+    def _keys(self, projections: np.ndarray) -> np.ndarray:
+        """Ключи бакетов: биты знаков проекций каждой таблицы, упакованные в число"""
+        signs = (projections > 0).reshape(len(projections), self.tables, self.bits)
+        return signs.astype(np.int32) @ self.bit_weights
+
+    def _append(self, ids: np.ndarray, ratings: np.ndarray, indptr: np.ndarray,
+                features: np.ndarray, values: np.ndarray):
+        first_slot = len(self.ids)
+        self.tail_keys = np.concatenate([self.tail_keys, self._keys(self._project(indptr, features, values))])
+        self.ids = np.concatenate([self.ids, ids])
+        self.ratings = np.concatenate([self.ratings, ratings])
+        self.alive = np.concatenate([self.alive, np.ones(len(ids), dtype=bool)])
+        self.indptr = np.concatenate([self.indptr, self.indptr[-1] + indptr[1:]])
+        self.features = np.concatenate([self.features, features])
+        self.values = np.concatenate([self.values, values])
+        for offset, book_id in enumerate(ids.tolist()):
+            self.slot_of_id[book_id] = first_slot + offset
+
+    def _sort_tables(self):
+        """Перенос хвоста в отсортированные таблицы"""
+        for table in range(self.tables):
+            keys = np.empty(len(self.ids), dtype=np.int32)
+            keys[self.orders[table]] = self.sorted_keys[table]
+            keys[self.sorted_count:] = self.tail_keys[:, table]
+            self.orders[table] = np.argsort(keys, kind="stable").astype(np.int32)
+            self.sorted_keys[table] = keys[self.orders[table]]
+        self.sorted_count = len(self.ids)
+        self.tail_keys = self.tail_keys[:0]
+
+    def add(self, book: Dict):
+        """Добавление книги (словарь полей Book); книга с тем же id заменяется"""
+        self.remove(book["id"])
+        features, values = self.space.book_vector(book)
+        self._append(np.array([int(book["id"])], dtype=np.int64),
+                     np.array([float(book.get("rating") or 0)]),
+                     np.array([0, len(features)], dtype=np.int64), features, values)
+        if len(self.tail_keys) >= TAIL_MERGE:
+            self._sort_tables()
+
+    def remove(self, book_id: int):
+        """Удаление книги (неизвестный id игнорируется)"""
+        slot = self.slot_of_id.pop(int(book_id), None)
+        if slot is not None:
+            self.alive[slot] = False
+
+    def vector(self, book_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        slot = self.slot_of_id[int(book_id)]
+        entries = slice(self.indptr[slot], self.indptr[slot + 1])
+        return self.features[entries], self.values[entries]
+
+    def candidates(self, features: np.ndarray, values: np.ndarray, probes: int = ANN_PROBES) -> np.ndarray:
+        """Слоты живых книг из бакетов запроса: свой бакет и (probes − 1) бакетов
+        с перевернутым одним битом — из наименее уверенных (проекция ближе к нулю)"""
+        projections = self._project(np.array([0, len(features)], dtype=np.int64), features, values)[0]
+        projections = projections.reshape(self.tables, self.bits)
+        keys = ((projections > 0).astype(np.int32) @ self.bit_weights)[:, None]
+        if probes > 1:
+            weakest = np.argsort(np.abs(projections), axis=1)[:, :min(probes, self.bits + 1) - 1]
+            keys = np.hstack([keys, keys ^ self.bit_weights[weakest]])
+
+        # Хвост: ключ книги в таблице совпадает с любым ключом запроса той же таблицы
+        found = [self.sorted_count + np.flatnonzero((self.tail_keys[:, :, None] == keys[None, :, :]).any(axis=(1, 2)))]
+        for table in range(self.tables):
+            sorted_keys = self.sorted_keys[table]
+            starts = np.searchsorted(sorted_keys, keys[table], side="left")
+            stops = np.searchsorted(sorted_keys, keys[table], side="right")
+            found.append(self.orders[table][_ranges(starts, stops - starts)])
+        slots = np.unique(np.concatenate(found).astype(np.int64))
+        return slots[self.alive[slots]]
+
+    def scores(self, slots: np.ndarray, features: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Точные оценки формулы для слотов: скалярное произведение векторов плюс бонус за рейтинг"""
+        query = np.zeros(self.space.n_features, dtype=np.float64)
+        query[features] = values
+        lengths = self.indptr[slots + 1] - self.indptr[slots]
+        entries = _ranges(self.indptr[slots], lengths)
+        products = self.values[entries] * query[self.features[entries]]
+        scores = np.bincount(np.repeat(np.arange(len(slots)), lengths), products, minlength=len(slots))
+        weights = self.space.weights
+        return scores + np.where(self.ratings[slots] >= weights.rating_threshold, weights.rating_bonus, 0.0)
+
+    def search(self, book_id: int, limit: int = 10, probes: int = ANN_PROBES,
+               exclude_ids: Iterable[int] = ()) -> Tuple[np.ndarray, np.ndarray]:
+        """Приближенно самые похожие книги: id и оценки, упорядоченные как у SimilarityScorer.rank
+        (оценка, затем рейтинг, затем порядок добавления); сама книга и exclude_ids пропускаются"""
+        features, values = self.vector(book_id)
+        slots = self.candidates(features, values, probes)
+        excluded = [self.slot_of_id[int(other)] for other in exclude_ids if int(other) in self.slot_of_id]
+        slots = np.setdiff1d(slots, np.asarray(excluded + [self.slot_of_id[int(book_id)]], dtype=np.int64))
+        scores = self.scores(slots, features, values)
+        keep = scores > 0
+        slots, scores = slots[keep], scores[keep]
+
+        keys = [slots]
+        if self.space.weights.rating_tiebreak:
+            keys.append(-self.ratings[slots])
+        keys.append(-scores)
+        top = np.lexsort(keys)[:limit]
+        return self.ids[slots[top]], scores[top]
+
+    def memory_usage(self) -> int:
+        """Объем массивов индекса в байтах"""
+        arrays = [self.projections, self.ids, self.ratings, self.alive, self.indptr, self.features,
+                  self.values, self.tail_keys, *self.orders, *self.sorted_keys]
+        return sum(array.nbytes for array in arrays)
\ No newline at end of file
@@ -7,6 +7,8 @@ from book_filter import BookFilter
 from user_lists import UserListsManager
 from book_page import BookPageManager
 from simple_recommender import SimpleRecommender
+from sqlite_storage import SQLiteStorage
+from taste_profiles import TasteProfileManager
 
 # Настройка страницы
 st.set_page_config(
@@ -25,10 +27,20 @@ st.set_page_config(
 @st.cache_resource
 def init_managers():
     """Инициализация всех менеджеров"""
+    # Хранилище SQLite включается переменной окружения LIBRO_SQLITE_PATH
+    sqlite_path = os.environ.get("LIBRO_SQLITE_PATH")
+    storage = SQLiteStorage(sqlite_path) if sqlite_path else None
+    auth = UserManager(storage=storage)
+    book_db = BookDatabase(storage=storage)
+    # Профили вкуса обновляются при отзывах и изменении «Любимых»
+    profiles = TasteProfileManager(book_db, auth)
+    
     return {
-        "auth": UserManager(),
-        "db": BookDatabase(),
-        "lists": UserListsManager(),
+        "storage": storage,
+        "auth": auth,
+        "db": book_db,
+        "profiles": profiles,
+        "lists": UserListsManager(storage=storage, profiles=profiles),
         "book_page": None,  # Инициализируем позже
         "recommender": None
     }
@@ -40,7 +52,7 @@ lists_manager = managers["lists"]
 
 # Инициализируем BookPageManager после создания других менеджеров
 if managers["book_page"] is None:
-    managers["book_page"] = BookPageManager(db, auth_manager, lists_manager)
+    managers["book_page"] = BookPageManager(db, auth_manager, lists_manager, managers["storage"], managers["profiles"])
 book_page_manager = managers["book_page"]
 
 # Инициализируем SimpleRecommender
@@ -48,6 +60,13 @@ if managers["recommender"] is None:
     managers["recommender"] = SimpleRecommender(db, book_page_manager)
 recommender = managers["recommender"]
 
+@st.cache_resource(max_entries=1)
+def get_book_filter(catalog_version: int) -> BookFilter:
+    """Общий для всех сессий движок фильтров: один на версию каталога"""
+    # С SQLite фильтры считает база: multi-hot матрицы для фильтров не нужны
+    attribute_matrices = db.get_attribute_matrices() if db.storage is None else None
+    return BookFilter(db.books, db.storage, attribute_matrices, db.get_text_index())
+
 # CSS стили
 st.markdown("""
     <style>
@@ -144,6 +163,28 @@ def show_login_register():
                     else:
                         st.error(message)
 
+def format_with_count(filter_node: dict):
+    """Подпись опции фильтра с числом подходящих книг: «Фэнтези (123)»"""
+    counts = filter_node.get("counts", {})
+    return lambda option: f"{option} ({counts[option]})" if option in counts else option
+
+def completion_options(book_filter: BookFilter, column: str, options_filters: dict,
+                       selected=(), placeholder: str = None) -> list:
+    """Опции большого фасета для виджета: поле поиска и top-K дополнений вместо полного списка.
+    
+    Уже выбранные значения остаются в списке, чтобы виджет не сбрасывал выбор;
+    placeholder («Любая») идет первым.
+    """
+    prefix = st.text_input(
+        "Поиск значения",
+        key=f"{column}_prefix",
+        placeholder="Начните вводить...",
+        label_visibility="collapsed"
+    )
+    options = book_filter.complete(column, prefix, selected_filters=options_filters)
+    options += [value for value in selected if value and value != placeholder and value not in options]
+    return options if placeholder is None else [placeholder] + options
+
 def show_book_card(book, show_actions=True):
     """Отображение карточки книги"""
     with st.container():
@@ -207,9 +248,10 @@ def show_book_card(book, show_actions=True):
             if pd.notna(book["setting_location"]) and pd.notna(book["setting_time_period"]):
                 st.write(f"**Место:** {book['setting_location']} ({book['setting_time_period']})")
             
-            # Теги
-            if book.get("tags"):
-                tags_html = " ".join([f'<span style="background:#f0f0f0; padding:2px 8px; border-radius:10px; margin:2px; display:inline-block;">{tag}</span>' for tag in book["tags"]])
+            # Теги (в горячей проекции каталога их нет — берем из multi-hot матрицы)
+            tags = book.get("tags") or db.get_attribute_values(book["id"], "tags")
+            if tags:
+                tags_html = " ".join([f'<span style="background:#f0f0f0; padding:2px 8px; border-radius:10px; margin:2px; display:inline-block;">{tag}</span>' for tag in tags])
                 st.markdown(f"<div>{tags_html}</div>", unsafe_allow_html=True)
         
         # Действия с книгой (добавление в списки)
@@ -358,9 +400,9 @@ def show_user_profile():
                                 
                                 with col_rev1:
                                     # Обложка книги (если есть)
-                                    book_info = db.books[db.books["id"] == review['book_id']]
-                                    if not book_info.empty and 'cover_image' in book_info.columns:
-                                        cover_path = book_info.iloc[0]['cover_image']
+                                    book_info = db.get_book(review['book_id'])
+                                    if book_info is not None and book_info.get('cover_image'):
+                                        cover_path = book_info['cover_image']
                                         if os.path.exists(cover_path):
                                             st.image(cover_path, width=80)
                                 
@@ -436,165 +478,18 @@ def show_recommendations_page():
     
     st.header("🎯 Рекомендуемое вам")
     
-    # 1. Собираем ВСЕ книги пользователя из всех списков
-    user_all_books = set()  # ID всех книг пользователя
-    
-    # Все категории списков
-    list_categories = ["reading", "read", "planned", "dropped", "favorites"]
-    
-    for category in list_categories:
-        books_in_list = lists_manager.get_books_in_list(user.username, category, db)
-        for book in books_in_list:
-            if isinstance(book, dict) and "id" in book:
-                user_all_books.add(book["id"])
+    # Рекомендации кэшируются в рекомендателе: пересчет только после новых отзывов,
+    # изменения списков пользователя или каталога, а не на каждом перезапуске скрипта
+    all_recommendations, from_reviews = recommender.get_page_recommendations(user.username)
     
-    # 2. Получаем ID книг с хорошими отзывами, исключая те, что уже в списках
-    good_reviews_books = []
-    for book_id_str, reviews in book_page_manager.reviews.items():
-        for review in reviews:
-            if review["username"] == user.username and review["rating"] >= 4:
-                book_id = int(book_id_str)
-                if book_id not in user_all_books:  # Исключаем если уже в списках
-                    good_reviews_books.append(book_id)
-    
-    if not good_reviews_books:
+    if not from_reviews:
         # Показываем популярные книги, которых нет в списках пользователя
-        popular = db.books[
-            ~db.books["id"].isin(user_all_books)  # Исключаем книги из списков
-        ].sort_values("rating", ascending=False).head(10)
-        
-        if not popular.empty:
-            for _, book in popular.iterrows():
-                show_book_card(book, show_actions=True)
+        for item in all_recommendations:
+            show_book_card(item["book"], show_actions=True)
         return
     
-    # 3. Находим похожие книги, учитывая теги и тропы
-    recommended_ids = set()
-    all_recommendations = []
-    
-    for good_book_id in good_reviews_books[:3]:  # Берем только 3 книги для анализа
-        good_book = db.books[db.books["id"] == good_book_id]
-        if good_book.empty:
-            continue
-        
-        good_book = good_book.iloc[0]
-        
-        # Получаем теги и тропы из хорошей книги
-        good_book_tags = set(good_book.get("tags", [])) if isinstance(good_book.get("tags"), list) else set()
-        good_book_tropes = set(good_book.get("plot_tropes", [])) if isinstance(good_book.get("plot_tropes"), list) else set()
-        good_book_moods = set(good_book.get("mood", [])) if isinstance(good_book.get("mood"), list) else set()
-        
-        # Ищем похожие книги
-        similar_books = []
-        
-        for _, book in db.books.iterrows():
-            # Пропускаем если книга уже в списках пользователя
-            if book["id"] in user_all_books:
-                continue
-            
-            # Пропускаем если уже в рекомендациях
-            if book["id"] in recommended_ids:
-                continue
-            
-            # Пропускаем если это та же книга
-            if book["id"] == good_book_id:
-                continue
-            
-            similarity_score = 0
-            
-            # Совпадение по жанру
-            if book["main_genre"] == good_book["main_genre"]:
-                similarity_score += 2
-            
-            # Совпадение по поджанру
-            if book["sub_genre"] == good_book["sub_genre"]:
-                similarity_score += 1
-            
-            # Совпадение по тегам
-            book_tags = set(book.get("tags", [])) if isinstance(book.get("tags"), list) else set()
-            common_tags = good_book_tags.intersection(book_tags)
-            similarity_score += len(common_tags) * 0.5
-            
-            # Совпадение по тропам
-            book_tropes = set(book.get("plot_tropes", [])) if isinstance(book.get("plot_tropes"), list) else set()
-            common_tropes = good_book_tropes.intersection(book_tropes)
-            similarity_score += len(common_tropes) * 0.5
-            
-            # Совпадение по настроению
-            book_moods = set(book.get("mood", [])) if isinstance(book.get("mood"), list) else set()
-            common_moods = good_book_moods.intersection(book_moods)
-            similarity_score += len(common_moods) * 0.3
-            
-            # Бонус за высокий рейтинг
-            if book["rating"] >= 4.0:
-                similarity_score += 0.5
-            
-            if similarity_score > 0:
-                similar_books.append({
-                    "book": book,
-                    "score": similarity_score,
-                    "common_tags": list(common_tags),
-                    "common_tropes": list(common_tropes),
-                    "common_moods": list(common_moods)
-                })
-        
-        # Сортируем по схожести и берем топ
-        similar_books.sort(key=lambda x: x["score"], reverse=True)
-        
-        for item in similar_books[:4]:  # Берем до 4 книг от каждой исходной
-            if item["book"]["id"] not in recommended_ids:
-                all_recommendations.append(item)
-                recommended_ids.add(item["book"]["id"])
-    
-    # 4. Если мало рекомендаций, добавляем книги по другим критериям
-    if len(all_recommendations) < 5:
-        # Ищем книги с общими тегами/тропами из ВСЕХ оцененных книг
-        all_good_tags = set()
-        all_good_tropes = set()
-        all_good_moods = set()
-        
-        for good_book_id in good_reviews_books[:5]:
-            good_book = db.books[db.books["id"] == good_book_id]
-            if not good_book.empty:
-                book = good_book.iloc[0]
-                if isinstance(book.get("tags"), list):
-                    all_good_tags.update(book["tags"])
-                if isinstance(book.get("plot_tropes"), list):
-                    all_good_tropes.update(book["plot_tropes"])
-                if isinstance(book.get("mood"), list):
-                    all_good_moods.update(book["mood"])
-        
-        # Ищем книги с общими тегами/тропами
-        for _, book in db.books.iterrows():
-            if (book["id"] in user_all_books) or (book["id"] in recommended_ids):
-                continue
-            
-            book_tags = set(book.get("tags", [])) if isinstance(book.get("tags"), list) else set()
-            book_tropes = set(book.get("plot_tropes", [])) if isinstance(book.get("plot_tropes"), list) else set()
-            book_moods = set(book.get("mood", [])) if isinstance(book.get("mood"), list) else set()
-            
-            common_with_all_tags = all_good_tags.intersection(book_tags)
-            common_with_all_tropes = all_good_tropes.intersection(book_tropes)
-            common_with_all_moods = all_good_moods.intersection(book_moods)
-            
-            if common_with_all_tags or common_with_all_tropes or common_with_all_moods:
-                all_recommendations.append({
-                    "book": book,
-                    "score": 1.0,
-                    "common_tags": list(common_with_all_tags),
-                    "common_tropes": list(common_with_all_tropes),
-                    "common_moods": list(common_with_all_moods)
-                })
-                recommended_ids.add(book["id"])
-                
-            if len(all_recommendations) >= 10:  # Максимум 10 рекомендаций
-                break
-    
-    # 5. Сортируем и показываем рекомендации
+    # Показываем рекомендации (уже отсортированы по score)
     if all_recommendations:
-        # Сортируем по score
-        all_recommendations.sort(key=lambda x: x["score"], reverse=True)
-        
         st.write(f"**Основываясь на ваших оценках, вам могут понравиться ({len(all_recommendations)} книг):**")
         
         for item in all_recommendations:
@@ -624,21 +519,26 @@ def show_recommendations_page():
         """)
         
         # Показываем популярные книги, которых нет в списках
-        popular = db.books[
-            ~db.books["id"].isin(user_all_books)
-        ].sort_values("rating", ascending=False).head(10)
+        popular = recommender.popular_books(10, recommender.user_list_books(user.username))
         
         if not popular.empty:
             for _, book in popular.iterrows():
                 show_book_card(book, show_actions=True)
 
+# Выдача поиска: книг на странице и варианты сортировки {подпись: (колонка, по убыванию)}
+SEARCH_PAGE_SIZE = 20
+SEARCH_SORT_OPTIONS = {
+    "По умолчанию": (None, True),  # по релевантности запросу, без запроса — в порядке каталога
+    "Рейтингу": ("rating", True),
+    "Году издания (новые)": ("year", True),
+    "Году издания (старые)": ("year", False),
+}
+
 def show_main_search():
     """Главная страница поиска"""
-    # Инициализация фильтра
-    if "book_filter" not in st.session_state:
-        st.session_state.book_filter = BookFilter(db.books)
-    
-    book_filter = st.session_state.book_filter
+    # Общий движок фильтров; в сессии хранятся только выбранные значения
+    book_filter = get_book_filter(db.catalog_version)
+    filter_hierarchy = book_filter.filter_hierarchy
     
     # Боковая панель с фильтрами
     with st.sidebar:
@@ -647,7 +547,8 @@ def show_main_search():
         # Основной жанр
         main_genre = st.selectbox(
             "Основной жанр",
-            options=["Все"] + book_filter.filter_hierarchy["main_genre"]["options"],
+            options=["Все"] + filter_hierarchy["main_genre"]["options"],
+            format_func=format_with_count(filter_hierarchy["main_genre"]),
             key="main_genre"
         )
         
@@ -656,36 +557,40 @@ def show_main_search():
             selected_filters["main_genre"] = main_genre
         
         # Обновляем опции фильтров
-        book_filter.update_filter_options(selected_filters)
+        filter_hierarchy = book_filter.get_filter_options(selected_filters)
+        options_filters = dict(selected_filters)  # выбор, по которому посчитаны опции
         
         # Поджанр (появляется только если выбран основной жанр)
         if main_genre != "Все":
-            sub_genre_options = ["Все"] + book_filter.filter_hierarchy["sub_genre"]["options"]
+            sub_genre_options = ["Все"] + filter_hierarchy["sub_genre"]["options"]
             sub_genre = st.selectbox(
                 "Поджанр",
                 options=sub_genre_options,
+                format_func=format_with_count(filter_hierarchy["sub_genre"]),
                 key="sub_genre"
             )
             
             if sub_genre != "Все":
                 selected_filters["sub_genre"] = sub_genre
-                book_filter.update_filter_options(selected_filters)
+                filter_hierarchy = book_filter.get_filter_options(selected_filters)
+                options_filters = dict(selected_filters)
         
         # Разворачиваемые секции для подтем
         with st.expander("👤 Характеристики героя", expanded=False):
             # Пол героя
-            if book_filter.filter_hierarchy["character"]["children"]["character_gender"]["options"]:
+            if filter_hierarchy["character"]["children"]["character_gender"]["options"]:
                 character_gender = st.selectbox(
                     "Пол героя",
-                    options=["Любой"] + book_filter.filter_hierarchy["character"]["children"]["character_gender"]["options"],
+                    options=["Любой"] + filter_hierarchy["character"]["children"]["character_gender"]["options"],
+                    format_func=format_with_count(filter_hierarchy["character"]["children"]["character_gender"]),
                     key="character_gender"
                 )
                 if character_gender != "Любой":
                     selected_filters["character_gender"] = character_gender
             
             # Слайдер для диапазона возраста
-            if book_filter.filter_hierarchy["character"]["children"]["character_age"]["options"]:
-                age_options = book_filter.filter_hierarchy["character"]["children"]["character_age"]["options"]
+            if filter_hierarchy["character"]["children"]["character_age"]["options"]:
+                age_options = filter_hierarchy["character"]["children"]["character_age"]["options"]
                 
                 if age_options:  # Проверяем, что список не пустой
                     # Определяем min и max из доступных опций
@@ -731,48 +636,62 @@ def show_main_search():
                     st.info("Нет доступных вариантов возраста для выбранных фильтров")
             
             # Профессия героя
-            if book_filter.filter_hierarchy["character"]["children"]["character_profession"]["options"]:
+            if filter_hierarchy["character"]["children"]["character_profession"]["options"]:
+                st.write("**Профессия героя:**")
                 character_profession = st.selectbox(
                     "Профессия героя",
-                    options=["Любая"] + book_filter.filter_hierarchy["character"]["children"]["character_profession"]["options"],
+                    options=completion_options(book_filter, "character_profession", options_filters,
+                                               [st.session_state.get("character_profession")], "Любая"),
+                    label_visibility="collapsed",
+                    format_func=format_with_count(filter_hierarchy["character"]["children"]["character_profession"]),
                     key="character_profession"
                 )
                 if character_profession != "Любая":
                     selected_filters["character_profession"] = character_profession
         
         with st.expander("🌍 Сеттинг", expanded=False):
-            if book_filter.filter_hierarchy["setting"]["children"]["setting_location"]["options"]:
+            if filter_hierarchy["setting"]["children"]["setting_location"]["options"]:
+                st.write("**Место действия:**")
                 setting_location = st.selectbox(
                     "Место действия",
-                    options=["Любое"] + book_filter.filter_hierarchy["setting"]["children"]["setting_location"]["options"],
+                    options=completion_options(book_filter, "setting_location", options_filters,
+                                               [st.session_state.get("setting_location")], "Любое"),
+                    label_visibility="collapsed",
+                    format_func=format_with_count(filter_hierarchy["setting"]["children"]["setting_location"]),
                     key="setting_location"
                 )
                 if setting_location != "Любое":
                     selected_filters["setting_location"] = setting_location
             
-            if book_filter.filter_hierarchy["setting"]["children"]["setting_time_period"]["options"]:
+            if filter_hierarchy["setting"]["children"]["setting_time_period"]["options"]:
                 setting_time = st.selectbox(
                     "Временной период",
-                    options=["Любой"] + book_filter.filter_hierarchy["setting"]["children"]["setting_time_period"]["options"],
+                    options=["Любой"] + filter_hierarchy["setting"]["children"]["setting_time_period"]["options"],
+                    format_func=format_with_count(filter_hierarchy["setting"]["children"]["setting_time_period"]),
                     key="setting_time_period"
                 )
                 if setting_time != "Любой":
                     selected_filters["setting_time_period"] = setting_time
         
         with st.expander("📖 Сюжет и атмосфера", expanded=False):
-            if book_filter.filter_hierarchy["plot"]["children"]["plot_tropes"]["options"]:
+            if filter_hierarchy["plot"]["children"]["plot_tropes"]["options"]:
+                st.write("**Литературные тропы:**")
                 plot_tropes = st.multiselect(
                     "Литературные тропы",
-                    options=book_filter.filter_hierarchy["plot"]["children"]["plot_tropes"]["options"],
+                    options=completion_options(book_filter, "plot_tropes", options_filters,
+                                               st.session_state.get("plot_tropes", [])),
+                    label_visibility="collapsed",
+                    format_func=format_with_count(filter_hierarchy["plot"]["children"]["plot_tropes"]),
                     key="plot_tropes"
                 )
                 if plot_tropes:
                     selected_filters["plot_tropes"] = plot_tropes
             
-            if book_filter.filter_hierarchy["plot"]["children"]["mood"]["options"]:
+            if filter_hierarchy["plot"]["children"]["mood"]["options"]:
                 mood = st.multiselect(
                     "Настроение",
-                    options=book_filter.filter_hierarchy["plot"]["children"]["mood"]["options"],
+                    options=filter_hierarchy["plot"]["children"]["mood"]["options"],
+                    format_func=format_with_count(filter_hierarchy["plot"]["children"]["mood"]),
                     key="mood"
                 )
                 if mood:
@@ -834,12 +753,20 @@ def show_main_search():
     st.markdown("<h1>LIBRO 📚</h1>", unsafe_allow_html=True)
     st.caption("Найди свою следующую любимую книгу")
     
+    # Полнотекстовый поиск: слова ранжируются по BM25, фразы в кавычках ищутся целиком
+    query = st.text_input(
+        "Поиск",
+        key="search_query",
+        placeholder='Название, автор или описание; "фраза в кавычках"',
+        label_visibility="collapsed"
+    ).strip()
+    
     # Применение фильтров
     current_filters = st.session_state.get("current_filters", {})
-    filtered_books = book_filter.apply_filters(current_filters)
+    summary = book_filter.summarize(current_filters, query)  # считается по позициям книг, без строк
     
     # Отображение результатов
-    st.subheader(f"📖 Найдено книг: {len(filtered_books)}")
+    st.subheader(f"📖 Найдено книг: {summary['count']}")
     
     if len(current_filters) > 0:
         filter_desc = book_filter.get_filter_description(current_filters)
@@ -850,25 +777,49 @@ def show_main_search():
         
         st.info(f"**Примененные фильтры:** {filter_desc}")
     
-    if len(filtered_books) == 0:
+    if summary["count"] == 0:
         st.warning("Книги по вашим критериям не найдены. Попробуйте изменить фильтры.")
+        
+        # Подсказки по названиям и авторам с опечатками: кандидаты из триграммного индекса
+        suggestions = [text for text in db.suggest_titles_authors(query) if text.lower() != query.lower()] if query else []
+        if suggestions:
+            st.write("**Возможно, вы имели в виду:**")
+            for i, suggestion in enumerate(suggestions):
+                st.button(suggestion, key=f"search_suggestion_{i}",
+                          on_click=st.session_state.update, kwargs={"search_query": suggestion})
     else:
         # Статистика
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Средний рейтинг", f"{filtered_books['rating'].mean():.1f}⭐")
+            st.metric("Средний рейтинг", f"{summary['mean_rating']:.1f}⭐")
         with col2:
-            st.metric("Жанров", len(filtered_books['main_genre'].unique()))
+            st.metric("Жанров", summary["genres"])
         with col3:
-            st.metric("Авторов", len(filtered_books['author'].unique()))
+            st.metric("Авторов", summary["authors"])
         with col4:
-            st.metric("Лет издания", f"{filtered_books['year'].min()}-{filtered_books['year'].max()}")
+            st.metric("Лет издания", f"{summary['year_min']}-{summary['year_max']}")
         
         st.divider()
         
-        # Список книг
-        for _, book in filtered_books.iterrows():
+        sort_label = st.selectbox("Сортировать по", options=list(SEARCH_SORT_OPTIONS), key="search_sort")
+        sort_by, descending = SEARCH_SORT_OPTIONS[sort_label]
+        
+        # При смене фильтров или сортировки выдача начинается с первой страницы
+        results_key = (book_filter.normalize_filters(current_filters), query, sort_label)
+        if st.session_state.get("search_results_key") != results_key:
+            st.session_state.search_results_key = results_key
+            st.session_state.search_results_limit = SEARCH_PAGE_SIZE
+        limit = st.session_state.search_results_limit
+        
+        # Список книг: карточки строятся только для показанной части выдачи
+        for _, book in book_filter.get_page(current_filters, limit, sort_by, descending, query).iterrows():
             show_book_card(book)
+        
+        if limit < summary["count"]:
+            st.caption(f"Показано {limit} из {summary['count']}")
+            if st.button("Показать еще", key="search_load_more"):
+                st.session_state.search_results_limit = limit + SEARCH_PAGE_SIZE
+                st.rerun()
 
 # Главное приложение
 def main():
@@ -34,10 +34,21 @@ class User:
 class UserManager:
     """Менеджер пользователей"""
     
-    def __init__(self, users_file="users.json"):
+    def __init__(self, users_file="users.json", storage=None, profiles_dir="taste_profiles"):
         self.users_file = users_file
+        self.storage = storage
+        # Профили вкуса (taste_profiles.py) меняются на каждом отзыве, поэтому хранятся
+        # отдельно от users.json: по файлу на пользователя (в режиме SQLite — в базе)
+        self.profiles_dir = profiles_dir
         self.users = self._load_users()
         self.current_user = None
+        
+        if storage is not None:
+            # Пользователи хранятся в SQLite, JSON импортируется один раз
+            if storage.is_empty("users"):
+                for user in self.users.values():
+                    storage.save_user(asdict(user))
+            self.users = {}
     
     def _load_users(self) -> Dict[str, User]:
         """Загрузка пользователей из файла"""
@@ -50,6 +61,22 @@ class UserManager:
                 return {}
         return {}
     
+    def _get_user(self, username: str) -> Optional[User]:
+        """Поиск пользователя по имени"""
+        if self.storage is not None:
+            user_data = self.storage.get_user(username)
+            return User(**user_data) if user_data else None
+        return self.users.get(username)
+    
+    def _save_user(self, user: User):
+        """Сохранение одного пользователя"""
+        if self.storage is not None:
+            self.storage.save_user(asdict(user))
+            return
+        
+        self.users[user.username] = user
+        self._save_users()
+    
     def _save_users(self):
         """Сохранение пользователей в файл"""
         users_data = {username: asdict(user) for username, user in self.users.items()}
@@ -62,10 +89,15 @@ class UserManager:
     
     def register(self, username: str, email: str, password: str) -> bool:
         """Регистрация нового пользователя"""
-        if username in self.users:
+        if self._get_user(username) is not None:
             return False, "Пользователь с таким именем уже существует"
         
-        if any(user.email == email for user in self.users.values()):
+        if self.storage is not None:
+            email_taken = self.storage.email_exists(email)
+        else:
+            email_taken = any(user.email == email for user in self.users.values())
+        
+        if email_taken:
             return False, "Пользователь с таким email уже существует"
         
         password_hash = self.hash_password(password)
@@ -76,16 +108,15 @@ class UserManager:
             created_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         )
         
-        self.users[username] = new_user
-        self._save_users()
+        self._save_user(new_user)
         return True, "Регистрация успешна!"
     
     def login(self, username: str, password: str) -> bool:
         """Вход пользователя"""
-        if username not in self.users:
+        user = self._get_user(username)
+        if user is None:
             return False, "Пользователь не найден"
         
-        user = self.users[username]
         if user.password_hash == self.hash_password(password):
             self.current_user = user
             return True, "Вход выполнен успешно!"
@@ -100,8 +131,41 @@ class UserManager:
         """Получение текущего пользователя"""
         return self.current_user
     
+    def _profile_path(self, username: str) -> str:
+        """Файл профиля вкуса: имя — хэш имени пользователя (в имени могут быть любые символы)"""
+        return os.path.join(self.profiles_dir, hashlib.sha1(username.encode()).hexdigest() + ".json")
+    
+    def get_taste_profile(self, username: str) -> Optional[Dict]:
+        """Сохраненный профиль вкуса пользователя (None — еще не построен)"""
+        if self.storage is not None:
+            return self.storage.get_taste_profile(username)
+        
+        path = self._profile_path(username)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def update_taste_profile(self, username: str, profile: Dict):
+        """Сохранение профиля вкуса: перезаписывается только профиль этого пользователя"""
+        if self.storage is not None:
+            self.storage.save_taste_profile(username, profile)
+            return
+        
+        if self._get_user(username) is None:
+            return
+        os.makedirs(self.profiles_dir, exist_ok=True)
+        path = self._profile_path(username)
+        with open(path + ".tmp", 'w', encoding='utf-8') as f:
+            json.dump(profile, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+    
     def update_user_preferences(self, username: str, preferences: Dict):
         """Обновление предпочтений пользователя"""
-        if username in self.users:
-            self.users[username].preferences.update(preferences)
-            self._save_users()
\ No newline at end of file
+        user = self._get_user(username)
+        if user is not None:
+            user.preferences.update(preferences)
+            self._save_user(user)
\ No newline at end of file
@@ -0,0 +1,73 @@
+from bisect import bisect_left
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from filter_index import top_k
+from fuzzy_search import normalize
+from ttl_cache import TTLCache
+
+# Диапазоны длиннее этого (короткие префиксы) кэшируются: их top-K дороже бинарного поиска
+CACHED_RANGE = 256
+PREFIX_CACHE_SIZE = 4096
+
+# Верхняя граница диапазона префикса: символ больше любой буквы ключа
+_MAX_CHAR = "\uffff"
+
+
+class PrefixIndex:
+    """Автодополнение по отсортированному массиву ключей.
+
+    Ключ — нормализованное значение, начиная с каждого его слова, поэтому
+    «булг» дополняется до «Михаил Булгаков». Префикс задает непрерывный
+    диапазон ключей (два бинарных поиска), из него берутся top-K значений
+    по весу: числу книг или популярности.
+    """
+
+    def __init__(self, values: Sequence[str], weights: Sequence[float]):
+        self.values = list(values)
+        self.weights = np.asarray(weights, dtype=np.float64)
+
+        keys, owners = [], []
+        for owner, value in enumerate(self.values):
+            words = normalize(value).split()
+            for start in range(len(words)):
+                keys.append(" ".join(words[start:]))
+                owners.append(owner)
+
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys = [keys[i] for i in order]
+        self.owners = np.asarray([owners[i] for i in order], dtype=np.int64)
+        self.cache = TTLCache(PREFIX_CACHE_SIZE)
+
+    def prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """Диапазон ключей, начинающихся с нормализованного префикса"""
+        return bisect_left(self.keys, prefix), bisect_left(self.keys, prefix + _MAX_CHAR)
+
+    def complete(self, prefix: str, limit: int = 10,
+                 weights: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """Top-K значений с префиксом: (значение, вес) по убыванию веса.
+
+        weights заменяет веса по умолчанию (например, счетчики при выбранных
+        фильтрах); значения с нулевым весом не предлагаются.
+        """
+        prefix = normalize(prefix)
+        start, stop = self.prefix_range(prefix)
+        if weights is None:
+            if stop - start > CACHED_RANGE:
+                return self.cache.get_or_compute((prefix, limit), lambda: self._top(start, stop, limit))
+            return self._top(start, stop, limit)
+        return self._top(start, stop, limit, weights)
+
+    def _top(self, start: int, stop: int, limit: int,
+             weights: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        # Значение может попасть в диапазон несколькими словами — учитывается один раз
+        owners = np.unique(self.owners[start:stop])
+        if weights is None:
+            weights = self.weights
+        else:
+            owners = owners[weights[owners] > 0]
+        owners = owners[top_k(weights[owners], limit)]
+        return [(self.values[owner], float(weights[owner])) for owner in owners]
+
+    def weights_for(self, counts: dict) -> np.ndarray:
+        """Веса значений из словаря {значение: число книг} (остальные — 0)"""
+        return np.array([counts.get(value, 0) for value in self.values], dtype=np.float64)
\ No newline at end of file
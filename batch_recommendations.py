@@ -0,0 +1,138 @@
+"""Пакетный расчет рекомендаций страницы «Рекомендуемое вам» для всех пользователей.
+
+Пользователи делятся на порции и считаются в пуле процессов; результат —
+хранилище recommendation_store.py, которое приложение читает до расчета на
+лету. Повторный запуск с --incremental пересчитывает только пользователей,
+у которых изменились отзывы или списки (по отпечатку), и всех — если
+изменился каталог. Запуск:
+    python batch_recommendations.py --out batch_recommendations --workers 4 --incremental
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+from database import BookDatabase
+from recommendation_store import RESULTS_DIR, RecommendationStore, StoredRecommendations, user_fingerprint
+from simple_recommender import SimpleRecommender
+from user_lists import UserListsManager
+
+# Пользователей в порции пула (порций больше, чем процессов, — для выравнивания нагрузки)
+SHARD_SIZE = 200
+
+
+def load_reviews_by_user(reviews_file: str) -> Dict[str, List[Tuple[int, Dict]]]:
+    """Отзывы из book_reviews.json, сгруппированные по пользователю (в порядке BookPageManager.get_user_reviews)"""
+    if not os.path.exists(reviews_file):
+        return {}
+    with open(reviews_file, encoding="utf-8") as f:
+        reviews = json.load(f)
+    by_user: Dict[str, List[Tuple[int, Dict]]] = {}
+    for book_id, book_reviews in reviews.items():
+        for review in book_reviews:
+            by_user.setdefault(review["username"], []).append((int(book_id), review))
+    return by_user
+
+
+def load_usernames(users_file: str) -> List[str]:
+    if not os.path.exists(users_file):
+        return []
+    with open(users_file, encoding="utf-8") as f:
+        return list(json.load(f))
+
+
+class _UserReviews:
+    """Отзывы и списки для SimpleRecommender без просмотра всех отзывов на каждого пользователя"""
+
+    def __init__(self, reviews_by_user: Dict[str, List[Tuple[int, Dict]]], lists_manager):
+        self.reviews_by_user = reviews_by_user
+        self.lists_manager = lists_manager
+
+    def get_user_reviews(self, username: str) -> List[Tuple[int, Dict]]:
+        return self.reviews_by_user.get(username, [])
+
+
+def _make_recommender(catalog: Optional[str], reviews_file: str, lists_file: str):
+    reviews = _UserReviews(load_reviews_by_user(reviews_file), UserListsManager(lists_file))
+    return SimpleRecommender(BookDatabase(catalog), reviews, results_dir=None)
+
+
+# Рекомендатель в процессе пула (создается один раз через initializer)
+_worker_recommender = None
+
+
+def _init_worker(catalog: Optional[str], reviews_file: str, lists_file: str):
+    global _worker_recommender
+    _worker_recommender = _make_recommender(catalog, reviews_file, lists_file)
+
+
+def _worker_shard(usernames: Sequence[str]) -> Dict[str, StoredRecommendations]:
+    return {username: _worker_recommender.page_recommendations_entry(username) for username in usernames}
+
+
+def run_batch(catalog: Optional[str] = None, users_file: str = "users.json", reviews_file: str = "book_reviews.json",
+              lists_file: str = "user_lists.json", directory: str = RESULTS_DIR, workers: Optional[int] = None,
+              incremental: bool = False) -> Dict[str, float]:
+    """Расчет и сохранение рекомендаций; возвращает статистику запуска"""
+    started = time.perf_counter()
+    recommender = _make_recommender(catalog, reviews_file, lists_file)
+    reviews = recommender.book_page_manager
+    n_books = len(recommender.book_db.books)
+    usernames = load_usernames(users_file)
+
+    # Пересчитываются пользователи без записи или с изменившимися данными; записи
+    # удаленных пользователей не переносятся
+    previous = RecommendationStore.load(directory) if incremental else None
+    entries: Dict[str, StoredRecommendations] = {}
+    pending = []
+    for username in usernames:
+        entry = previous.get(username) if previous is not None and previous.n_books == n_books else None
+        fingerprint = user_fingerprint(reviews.get_user_reviews(username), recommender.user_list_books(username))
+        if entry is not None and entry.fingerprint == fingerprint:
+            entries[username] = entry
+        else:
+            pending.append(username)
+
+    computing = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    shards = [pending[start:start + SHARD_SIZE] for start in range(0, len(pending), SHARD_SIZE)]
+    if workers <= 1 or len(shards) < 2:
+        results = [{username: recommender.page_recommendations_entry(username) for username in shard}
+                   for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(catalog, reviews_file, lists_file)) as executor:
+            results = list(executor.map(_worker_shard, shards))
+    for result in results:
+        entries.update(result)
+    elapsed = time.perf_counter() - computing
+
+    # Порядок пользователей — как в users.json
+    RecommendationStore.build(n_books, {username: entries[username] for username in usernames}).save(directory)
+    return {
+        "users": len(usernames),
+        "computed": len(pending),
+        "reused": len(usernames) - len(pending),
+        "compute_seconds": elapsed,
+        "users_per_second": len(pending) / elapsed if elapsed > 0 else 0.0,
+        "total_seconds": time.perf_counter() - started,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пакетный расчет рекомендаций пользователей")
+    parser.add_argument("--catalog", default=None, help="Файл каталога (по умолчанию — найденный рядом)")
+    parser.add_argument("--users", default="users.json")
+    parser.add_argument("--reviews", default="book_reviews.json")
+    parser.add_argument("--lists", default="user_lists.json")
+    parser.add_argument("--out", default=RESULTS_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--incremental", action="store_true",
+                        help="Пересчитать только пользователей с изменившимися отзывами или списками")
+    args = parser.parse_args()
+
+    stats = run_batch(args.catalog, args.users, args.reviews, args.lists, args.out, args.workers, args.incremental)
+    print(f"Пользователей: {stats['users']}, пересчитано: {stats['computed']}, без изменений: {stats['reused']}")
+    print(f"Расчет {stats['compute_seconds']:.1f} с ({stats['users_per_second']:.1f} пользователей/с), "
+          f"всего {stats['total_seconds']:.1f} с; результат в {args.out}")
\ No newline at end of file
@@ -0,0 +1,610 @@
+"""Бенчмарки LIBRO на синтетическом каталоге.
+
+Запуск:
+    python benchmarks.py memory --books 500000
+    python benchmarks.py filters --books 10000 100000 1000000
+    python benchmarks.py search --books 500000
+    python benchmarks.py fuzzy --books 100000
+    python benchmarks.py autocomplete --books 500000
+    python benchmarks.py recommend --books 20000 --liked 5
+    python benchmarks.py collaborative --users 200000 --books 50000 --ratings 2000000
+    python benchmarks.py ann --books 500000 --probes 1 2 4 8
+    python benchmarks.py descriptions --books 1000000 --components 128
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from book_filter import BookFilter
+from catalog_loader import write_catalog
+from database import BOOK_COLUMNS, CATEGORICAL_COLUMNS, BookDatabase, encode_categorical_columns
+from simple_recommender import SimpleRecommender
+from ann import ANN_TABLES, LSHIndex
+from neighbors import RECOMMENDER_WEIGHTS
+from description_vectors import DescriptionVectors, build_svd, build_tfidf
+from collaborative import ALS_FACTORS, ALS_ITERATIONS, Interactions, item_neighbors, train_als
+from text_search import TextIndex
+from fuzzy_search import TrigramIndex, default_max_distance, match_distance, normalize
+
+# Размеры словарей синтетического каталога
+SCALAR_VOCABULARY = {
+    "main_genre": ("Жанр", 15),
+    "sub_genre": ("Поджанр", 120),
+    "character_gender": ("Пол героя", 4),
+    "character_profession": ("Профессия героя", 300),
+    "setting_location": ("Место действия", 500),
+    "setting_time_period": ("Временной период", 60),
+    "setting_type": ("Тип сеттинга", 25),
+    "pacing": ("Темп повествования", 6),
+}
+
+LIST_VOCABULARY = {
+    "tags": ("Тег", 3000, 3, 6),  # (префикс, размер словаря, мин. и макс. длина списка)
+    "plot_tropes": ("Литературный троп", 600, 1, 4),
+    "mood": ("Настроение", 80, 1, 4),
+    "themes": ("Тема", 400, 2, 4),
+    "style": ("Стиль", 60, 1, 3),
+}
+
+DESCRIPTION_WORDS = [
+    "история", "герой", "город", "любовь", "тайна", "война", "семья", "дорога", "магия", "прошлое",
+    "судьба", "дом", "ночь", "море", "страх", "надежда", "друг", "враг", "время", "память",
+    "путешествие", "убийство", "расследование", "королевство", "космос", "корабль", "письмо", "сон",
+]
+
+AUTHORS_PER_BOOK = 20  # в среднем книг на одного автора
+
+# Типичные запросы поиска: от одного фасета до комбинации всех
+FILTER_QUERIES = {
+    "жанр": {"main_genre": "Жанр 0"},
+    "жанр + поджанр": {"main_genre": "Жанр 1", "sub_genre": "Поджанр 5"},
+    "рейтинг >= 4.2": {"min_rating": 4.2},
+    "возраст 20-40 + пол": {"character_age_range": (20, 40), "character_gender": "Пол героя 1"},
+    "настроения": {"mood": ["Настроение 1", "Настроение 7"]},
+    "тропы + теги + рейтинг": {"plot_tropes": ["Литературный троп 3"], "tags": ["Тег 10", "Тег 250"],
+                               "min_rating": 3.5},
+    "все фасеты": {"main_genre": "Жанр 0", "character_profession": "Профессия героя 2",
+                   "setting_time_period": "Временной период 1", "pacing": "Темп повествования 0",
+                   "mood": ["Настроение 0", "Настроение 2"], "character_age_range": (30, 60),
+                   "min_rating": 2.5},
+}
+
+# Запросы полнотекстового поиска: слова, название, автор, фразы
+SEARCH_QUERIES = [
+    "история",
+    "тайна убийства",
+    "книга 12345",
+    "автор 7",
+    '"история герой"',
+    'магия "тег 10"',
+]
+
+
+def _vocabulary(prefix: str, size: int) -> np.ndarray:
+    """Словарь значений вида «Префикс N»"""
+    return np.array([f"{prefix} {i}" for i in range(size)], dtype=object)
+
+
+def _skewed_choice(rng: np.random.Generator, vocabulary: np.ndarray, size: int) -> np.ndarray:
+    """Выборка с убывающей популярностью значений (закон Ципфа)"""
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    return vocabulary[rng.choice(len(vocabulary), size=size, p=weights / weights.sum())]
+
+
+def _list_column(rng: np.random.Generator, vocabulary: np.ndarray, n_books: int,
+                 min_length: int, max_length: int) -> List[List[str]]:
+    """Списковая колонка: для каждой книги несколько уникальных значений словаря"""
+    lengths = rng.integers(min_length, max_length + 1, size=n_books)
+    flat = _skewed_choice(rng, vocabulary, int(lengths.sum()))
+    return [list(dict.fromkeys(values)) for values in np.split(flat, np.cumsum(lengths)[:-1])]
+
+
+def _character_ages(rng: np.random.Generator, n_books: int) -> np.ndarray:
+    """Возраст героя в тех же форматах, что в каталоге: «30-40», «40+», «17»"""
+    low = rng.integers(1, 8, size=n_books) * 10
+    kind = rng.integers(0, 3, size=n_books)
+    ages = np.empty(n_books, dtype=object)
+    for i in range(n_books):
+        if kind[i] == 0:
+            ages[i] = f"{low[i]}-{low[i] + 10}"
+        elif kind[i] == 1:
+            ages[i] = f"{low[i]}+"
+        else:
+            ages[i] = str(low[i] + int(rng.integers(0, 10)))
+    return ages
+
+
+def make_synthetic_catalog(n_books: int, seed: int = 42, with_descriptions: bool = True) -> pd.DataFrame:
+    """Синтетический каталог в схеме dataclass Book"""
+    rng = np.random.default_rng(seed)
+    data: Dict[str, object] = {
+        "id": np.arange(1, n_books + 1),
+        "title": [f"Книга {i}" for i in range(1, n_books + 1)],
+        "author": _skewed_choice(rng, _vocabulary("Автор", max(1, n_books // AUTHORS_PER_BOOK)), n_books),
+        "rating": np.round(rng.uniform(1.0, 5.0, size=n_books), 1),
+        "year": rng.integers(1800, 2025, size=n_books),
+        "pages": rng.integers(50, 1500, size=n_books),
+        "cover_image": [f"images/book_{i}.jpg" for i in range(1, n_books + 1)],
+        "character_age": _character_ages(rng, n_books),
+    }
+
+    for column, (prefix, size) in SCALAR_VOCABULARY.items():
+        data[column] = _skewed_choice(rng, _vocabulary(prefix, size), n_books)
+
+    for column, (prefix, size, min_length, max_length) in LIST_VOCABULARY.items():
+        data[column] = _list_column(rng, _vocabulary(prefix, size), n_books, min_length, max_length)
+
+    if with_descriptions:
+        words = np.array(DESCRIPTION_WORDS, dtype=object)
+        data["description"] = [" ".join(words[rng.integers(0, len(words), size=40)]) for _ in range(n_books)]
+    else:
+        data["description"] = [""] * n_books
+
+    return pd.DataFrame(data, columns=BOOK_COLUMNS)
+
+
+def memory_report(n_books: int):
+    """Сравнение памяти: строки Python (object) против словарного кодирования"""
+    started = time.perf_counter()
+    books_df = make_synthetic_catalog(n_books, with_descriptions=False)
+    print(f"Синтетический каталог: {n_books} книг ({time.perf_counter() - started:.1f} с)")
+
+    object_df = books_df[CATEGORICAL_COLUMNS].copy()
+    encoded_df = books_df[CATEGORICAL_COLUMNS].copy()
+    started = time.perf_counter()
+    code_tables = encode_categorical_columns(encoded_df)
+    print(f"Кодирование: {time.perf_counter() - started:.2f} с\n")
+
+    object_usage = object_df.memory_usage(deep=True, index=False)
+    encoded_usage = encoded_df.memory_usage(deep=True, index=False)
+
+    print(f"{'Колонка':<24}{'Значений':>10}{'object, МБ':>14}{'codes, МБ':>14}{'Сжатие':>10}")
+    for column in CATEGORICAL_COLUMNS:
+        print(f"{column:<24}{len(code_tables[column]):>10}"
+              f"{object_usage[column] / 2**20:>14.1f}{encoded_usage[column] / 2**20:>14.1f}"
+              f"{object_usage[column] / encoded_usage[column]:>9.1f}x")
+
+    total_object = object_usage.sum()
+    total_encoded = encoded_usage.sum()
+    print(f"{'Итого':<34}{total_object / 2**20:>14.1f}{total_encoded / 2**20:>14.1f}"
+          f"{total_object / total_encoded:>9.1f}x")
+    print(f"На книгу: {total_object / n_books:.0f} байт → {total_encoded / n_books:.0f} байт")
+
+
+def _median_time(function, repeats: int) -> float:
+    """Медианное время вызова в миллисекундах"""
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.median(timings))
+
+
+def filter_report(sizes: List[int], repeats: int):
+    """Задержка фильтров: битмап-индекс против просмотра колонок"""
+    for n_books in sizes:
+        books_df = make_synthetic_catalog(n_books, with_descriptions=False)
+        encode_categorical_columns(books_df)
+
+        started = time.perf_counter()
+        book_filter = BookFilter(books_df)
+        build_time = time.perf_counter() - started
+        print(f"\n{n_books} книг: индекс построен за {build_time:.1f} с, "
+              f"{book_filter.index.memory_usage() / 2**20:.1f} МБ")
+
+        def scan(filters: Dict):
+            mask = np.ones(n_books, dtype=bool)
+            for key, value in filters.items():
+                if value:
+                    mask &= book_filter._scan_mask(key, value)
+            return book_filter.books_df[mask]
+
+        def index(filters: Dict):
+            return book_filter.books_df.iloc[book_filter._filter_positions(filters)]
+
+        print(f"{'Запрос':<26}{'Книг':>10}{'Просмотр, мс':>16}{'Индекс, мс':>14}{'Ускорение':>12}{'Кэш, мс':>10}")
+        for name, filters in FILTER_QUERIES.items():
+            result = book_filter.apply_filters(filters)
+            assert result["id"].tolist() == scan(filters)["id"].tolist(), name
+
+            scan_time = _median_time(lambda: scan(filters), repeats)
+            index_time = _median_time(lambda: index(filters), repeats)
+            cached_time = _median_time(lambda: book_filter.apply_filters(filters), repeats)
+            print(f"{name:<26}{len(result):>10}{scan_time:>16.2f}{index_time:>14.2f}"
+                  f"{scan_time / index_time:>11.1f}x{cached_time:>10.2f}")
+        print(f"Кэш результатов: {book_filter.cache_stats()['results']}")
+        print(f"План запроса «все фасеты»:\n{book_filter.explain(FILTER_QUERIES['все фасеты'])}")
+
+
+def search_report(n_books: int, repeats: int):
+    """Полнотекстовый поиск: построение индекса и задержка запросов"""
+    books_df = make_synthetic_catalog(n_books)
+    records = books_df[["title", "author", "description", "tags"]].to_dict("records")
+
+    started = time.perf_counter()
+    text_index = TextIndex(records)
+    print(f"{n_books} книг: индекс построен за {time.perf_counter() - started:.1f} с, "
+          f"{text_index.memory_usage() / 2**20:.1f} МБ, терминов {len(text_index.vocabulary)}")
+
+    def uncached(query: str, limit=None):
+        text_index.scores_cache.clear()
+        return text_index.search(query, limit=limit)
+
+    print(f"{'Запрос':<26}{'Найдено':>10}{'Все, мс':>12}{'Топ-20, мс':>12}{'Кэш, мс':>10}")
+    for query in SEARCH_QUERIES:
+        positions, _ = text_index.search(query)
+        full_time = _median_time(lambda: uncached(query), repeats)
+        top_time = _median_time(lambda: uncached(query, limit=20), repeats)
+        cached_time = _median_time(lambda: text_index.search(query, limit=20), repeats)
+        print(f"{query:<26}{len(positions):>10}{full_time:>12.1f}{top_time:>12.1f}{cached_time:>10.1f}")
+
+    started = time.perf_counter()
+    for record in records[:100]:
+        text_index.add_document(record)
+    print(f"Добавление 100 книг: {(time.perf_counter() - started) * 1000:.0f} мс")
+
+
+def _misspell(rng: np.random.Generator, text: str) -> str:
+    """Опечатка: удаление, замена или перестановка соседних букв"""
+    i = int(rng.integers(1, len(text) - 1))
+    kind = rng.integers(0, 3)
+    if kind == 0:
+        return text[:i] + text[i + 1:]
+    if kind == 1:
+        return text[:i] + "о" + text[i + 1:]
+    return text[:i - 1] + text[i] + text[i - 1] + text[i + 1:]
+
+
+def fuzzy_report(n_books: int, n_queries: int):
+    """Поиск с опечатками: кандидаты из триграммного индекса против Левенштейна по всему словарю"""
+    books_df = make_synthetic_catalog(n_books, with_descriptions=False)
+    strings = list(dict.fromkeys(list(books_df["title"]) + list(books_df["author"])))
+
+    started = time.perf_counter()
+    fuzzy_index = TrigramIndex(strings)
+    fuzzy_index.suggest(strings[0])  # транспонированная матрица строится при первом запросе
+    print(f"{len(strings)} строк: индекс построен за {time.perf_counter() - started:.1f} с, "
+          f"{fuzzy_index.memory_usage() / 2**20:.1f} МБ")
+
+    def brute_force(query: str):
+        query = normalize(query)
+        max_distance = default_max_distance(query)
+        scored = [(match_distance(query, text, max_distance), row)
+                  for row, text in enumerate(fuzzy_index.normalized)]
+        return sorted(item for item in scored if item[0] <= max_distance)[:5]
+
+    rng = np.random.default_rng(7)
+    queries = [_misspell(rng, strings[i]) for i in rng.integers(0, len(strings), size=n_queries)]
+    index_times, brute_times, same_best = [], [], 0
+    for query in queries:
+        started = time.perf_counter()
+        suggestions = fuzzy_index.suggest(query)
+        index_times.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        expected = brute_force(query)
+        brute_times.append((time.perf_counter() - started) * 1000)
+        same_best += bool(suggestions) and bool(expected) and suggestions[0][1] == expected[0][0]
+
+    print(f"{'Запрос':<24}{'Подсказка':<24}{'Индекс, мс':>12}{'Перебор, мс':>14}")
+    for query, index_time, brute_time in list(zip(queries, index_times, brute_times))[:5]:
+        suggestions = fuzzy_index.suggest(query)
+        print(f"{query:<24}{suggestions[0][0] if suggestions else '-':<24}{index_time:>12.2f}{brute_time:>14.1f}")
+    print(f"Медиана по {n_queries} запросам: индекс {np.median(index_times):.2f} мс, "
+          f"перебор {np.median(brute_times):.1f} мс; лучшая подсказка совпала в {same_best} из {n_queries}")
+
+
+def autocomplete_report(n_books: int, repeats: int):
+    """Автодополнение: построение отсортированных ключей и задержка top-K по префиксу"""
+    books_df = make_synthetic_catalog(n_books, with_descriptions=False)
+    encode_categorical_columns(books_df)
+    book_filter = BookFilter(books_df)
+
+    print(f"{'Колонка':<24}{'Значений':>10}{'Построение, с':>16}{'Префикс':>22}{'Первый, мкс':>14}{'Повтор, мкс':>14}")
+    for column in ["title", "author", "tags", "character_profession", "setting_location"]:
+        started = time.perf_counter()
+        completer = book_filter.get_completer(column)
+        build_time = time.perf_counter() - started
+
+        sample = normalize(completer.values[len(completer.values) // 2])
+        for length in (1, 3, len(sample) - 1):
+            prefix = sample[:length]
+            completer.cache.clear()
+            started = time.perf_counter()
+            completions = book_filter.complete(column, prefix)
+            first_time = (time.perf_counter() - started) * 1e6
+            repeat_time = _median_time(lambda: book_filter.complete(column, prefix), repeats) * 1000
+            assert completions, prefix
+            print(f"{column:<24}{len(completer.values):>10}{build_time:>16.2f}{prefix!r:>22}"
+                  f"{first_time:>14.0f}{repeat_time:>14.0f}")
+
+
+class _LikedBooks:
+    """Отзывы пользователя для рекомендателя: все книги оценены на 5"""
+
+    def __init__(self, book_ids: List[int]):
+        self.book_ids = book_ids
+
+    def get_user_reviews(self, username: str):
+        return [(book_id, {"rating": 5}) for book_id in self.book_ids]
+
+
+def _reference_similar_books(books_df: pd.DataFrame, book_id: int, exclude_ids: set, limit: int) -> List[Dict]:
+    """Прежняя построчная оценка схожести (iterrows и множества) — эталон ранжирования"""
+    target = books_df[books_df["id"] == book_id].iloc[0]
+    similar_books = []
+    for _, book in books_df.iterrows():
+        if book["id"] in exclude_ids:
+            continue
+        score = 0
+        score += 3 if book["main_genre"] == target["main_genre"] else 0
+        score += 2 if book["sub_genre"] == target["sub_genre"] else 0
+        score += 1 if book["author"] == target["author"] else 0
+        score += len(set(book["mood"]) & set(target["mood"])) * 0.5
+        score += len(set(book["plot_tropes"]) & set(target["plot_tropes"])) * 0.3
+        if score > 0:
+            similar_books.append({"id": book["id"], "rating": book["rating"], "similarity_score": score})
+    similar_books.sort(key=lambda x: (x["similarity_score"], x["rating"]), reverse=True)
+    return similar_books[:limit]
+
+
+def recommend_report(n_books: int, n_liked: int):
+    """Оценка схожести в SimpleRecommender: построчный цикл, матричный проход и отбор кандидатов"""
+    books_df = make_synthetic_catalog(n_books, with_descriptions=False)
+    liked = [int(book_id) for book_id in np.random.default_rng(5).choice(books_df["id"], n_liked, replace=False)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "books.jsonl")
+        write_catalog(books_df, path)
+        db = BookDatabase(path)
+        full_scan = SimpleRecommender(db, _LikedBooks(liked), candidate_cap=None)
+        full_scan.get_recommendations("reader")  # матрицы атрибутов строятся при первом вызове
+        full_scan.results.clear()  # замеряется расчет, а не кэш готовых рекомендаций
+        started = time.perf_counter()
+        full_scan.get_recommendations("reader")
+        vectorized_time = time.perf_counter() - started
+
+        recommender = SimpleRecommender(db, _LikedBooks(liked))
+        recommender.get_recommendations("reader")
+        recommender.results.clear()
+        started = time.perf_counter()
+        recommendations = recommender.get_recommendations("reader")
+        candidates_time = time.perf_counter() - started
+        started = time.perf_counter()
+        recommender.get_recommendations("reader")
+        cached_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    liked = recommender._get_books_with_good_reviews("reader")  # тот же порядок обхода
+    expected, seen_ids = [], set(liked)
+    for book_id in liked:
+        similar_books = _reference_similar_books(books_df, book_id, seen_ids, limit=5)
+        expected.extend(book for book in similar_books if book["id"] not in {b["id"] for b in expected})
+        seen_ids.update(book["id"] for book in similar_books)
+    reference_time = time.perf_counter() - started
+
+    same = [book["id"] for book in recommendations] == [book["id"] for book in expected[:len(recommendations)]]
+    print(f"{n_books} книг, {n_liked} понравившихся: цикл {reference_time:.2f} с, "
+          f"матрицы {vectorized_time * 1000:.1f} мс ({reference_time / vectorized_time:.0f}x), "
+          f"кандидаты из постингов {candidates_time * 1000:.1f} мс; "
+          f"ранжирование совпадает: {'да' if same else 'нет'}; из кэша {cached_time * 1e6:.0f} мкс")
+
+
+def ann_report(n_books: int, n_queries: int, probes: List[int], tables: int, bits: Optional[int]):
+    """LSH против точной оценки SimpleRecommender._find_similar_books: полнота@10 и задержка.
+
+    Оценки дискретны и часто равны, поэтому полнота учитывает равенства: доля
+    найденных книг с оценкой не ниже 10-й точной.
+    """
+    books_df = make_synthetic_catalog(n_books, with_descriptions=False)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "books.jsonl")
+        write_catalog(books_df, path)
+        del books_df  # каталог в памяти больше не нужен: на миллионе книг это гигабайты
+        # Списковые атрибуты читаются из файла каталога при построении индекса
+        _ann_report(BookDatabase(path), n_queries, probes, tables, bits)
+
+
+def _ann_report(db: BookDatabase, n_queries: int, probes: List[int], tables: int, bits: Optional[int]):
+    n_books = len(db.books)
+    # Эталон — точное ранжирование: полный проход без отбора кандидатов
+    recommender = SimpleRecommender(db, None, neighbors_dir=None, collaborative_dir=None, candidate_cap=None)
+
+    for column, _ in RECOMMENDER_WEIGHTS.lists:
+        db.get_attribute_matrix(column)  # чтение списков из файла каталога не входит в построение
+
+    started = time.perf_counter()
+    # Векторы по формуле рекомендателя: приближенный и точный поиск ранжируют одну оценку
+    index = LSHIndex.build(db, RECOMMENDER_WEIGHTS, tables, bits)
+    print(f"{n_books} книг: индекс ({index.tables} таблиц × {index.bits} бит) построен за "
+          f"{time.perf_counter() - started:.1f} с, {index.memory_usage() / 2**20:.0f} МБ")
+
+    queries = [int(book_id) for book_id in np.random.default_rng(3).choice(db.books["id"], n_queries, replace=False)]
+    exact, exact_times = {}, []
+    for book_id in queries:
+        started = time.perf_counter()
+        exact[book_id] = recommender._find_similar_books(book_id, set(), 10)
+        exact_times.append((time.perf_counter() - started) * 1000)
+    print(f"Точная оценка: {np.median(exact_times):.1f} мс на запрос\n")
+
+    print(f"{'Пробы':>6}{'Полнота@10':>12}{'Кандидатов':>12}{'Задержка, мс':>14}{'Ускорение':>11}")
+    for probe_count in probes:
+        recalls, timings, candidates = [], [], []
+        for book_id in queries:
+            started = time.perf_counter()
+            _, scores = index.search(book_id, 10, probe_count)
+            timings.append((time.perf_counter() - started) * 1000)
+            candidates.append(len(index.candidates(*index.vector(book_id), probe_count)))
+            if exact[book_id]:
+                # Оценки индекса считаются во float32
+                kth = exact[book_id][-1]["similarity_score"] - 1e-4
+                recalls.append(min(int(np.sum(scores >= kth)), len(exact[book_id])) / len(exact[book_id]))
+        print(f"{probe_count:>6}{np.mean(recalls):>12.3f}{int(np.median(candidates)):>12}"
+              f"{np.median(timings):>14.2f}{np.median(exact_times) / np.median(timings):>10.0f}x")
+
+    books = [db.get_book_details(book_id) for book_id in queries]
+    started = time.perf_counter()
+    for book in books:
+        index.remove(book["id"])
+        index.add(book)
+    print(f"\nУдаление и добавление книги: {(time.perf_counter() - started) * 1000 / len(queries):.2f} мс")
+
+
+def collaborative_report(n_users: int, n_books: int, n_ratings: int):
+    """Обучение коллаборативной модели: время и пиковая память каждого этапа
+    (tracemalloc замедляет циклы Python, поэтому сборка матрицы под ним дольше)"""
+    rng = np.random.default_rng(11)
+    # Популярность книг и активность читателей — степенные распределения
+    books = (rng.pareto(1.2, n_ratings) * n_books / 50).astype(np.int64) % n_books
+    users = (rng.pareto(1.5, n_ratings) * n_users / 20).astype(np.int64) % n_users
+    ratings = rng.choice([1, 2, 3, 4, 5], n_ratings, p=[0.05, 0.1, 0.2, 0.35, 0.3])
+    n_lists = n_ratings // 4
+    list_names = rng.choice(["read", "reading", "planned", "dropped", "favorites"], n_lists)
+    events = list(zip([f"user{user}" for user in users], books.tolist(), ratings.tolist()))
+    list_events = list(zip([f"user{user}" for user in users[:n_lists]], list_names.tolist(),
+                           rng.integers(0, n_books, n_lists).tolist()))
+
+    stages = [
+        ("матрица CSR", lambda: Interactions.from_events(np.arange(n_books), events, list_events)),
+        ("item-item", lambda: item_neighbors(interactions)),
+        (f"ALS ({ALS_FACTORS} факторов, {ALS_ITERATIONS} итераций)", lambda: train_als(interactions)),
+    ]
+    print(f"{n_ratings} оценок + {n_lists} книг в списках, {n_users} читателей, {n_books} книг\n")
+    print(f"{'Этап':<34}{'Время, с':>10}{'Пик памяти, МБ':>18}")
+    interactions = None
+    for name, stage in stages:
+        tracemalloc.start()
+        started = time.perf_counter()
+        result = stage()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if interactions is None:
+            interactions = result
+        print(f"{name:<34}{elapsed:>10.1f}{peak / 2**20:>18.0f}")
+    print(f"\nВзаимодействий: {interactions.nnz}, пользователей с ними: {interactions.n_users}")
+
+
+def descriptions_report(n_books: int, components: int, chunk_size: int, vocabulary_size: int):
+    """Векторы описаний: время проходов и пиковая память процесса.
+
+    Описания порождаются порциями (слова по закону Ципфа), каталог целиком
+    в памяти не собирается — как при потоковом чтении большого файла.
+    """
+    words = np.array([f"слово{i}" for i in range(vocabulary_size)], dtype=object)
+    frequencies = 1 / np.arange(1, vocabulary_size + 1)
+    frequencies /= frequencies.sum()
+
+    def chunks():
+        rng = np.random.default_rng(5)
+        for start in range(0, n_books, chunk_size):
+            size = min(chunk_size, n_books - start)
+            lengths = rng.integers(20, 80, size=size)
+            codes = rng.choice(vocabulary_size, int(lengths.sum()), p=frequencies)
+            offsets = np.concatenate([[0], np.cumsum(lengths)])
+            yield (list(range(start + 1, start + size + 1)),
+                   [" ".join(words[codes[offsets[i]:offsets[i + 1]]]) for i in range(size)])
+
+    def peak_rss() -> float:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # Linux: КБ
+
+    print(f"{n_books} описаний, словарь {vocabulary_size} слов, порции по {chunk_size}\n")
+    print(f"{'Этап':<28}{'Время, с':>10}{'Пик RSS, МБ':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        build_tfidf(chunks, directory)
+        print(f"{'TF-IDF (два прохода)':<28}{time.perf_counter() - started:>10.1f}{peak_rss():>14.0f}")
+        if components:
+            started = time.perf_counter()
+            build_svd(directory, components)
+            print(f"{f'SVD ({components} измерений)':<28}{time.perf_counter() - started:>10.1f}{peak_rss():>14.0f}")
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            f.write("{}")
+
+        vectors = DescriptionVectors.load(directory)
+        rng = np.random.default_rng(6)
+        queries = rng.integers(0, vectors.n_rows, size=20)
+        candidates = rng.integers(0, vectors.n_rows, size=(len(queries), 100))
+        started = time.perf_counter()
+        for query, others in zip(queries, candidates):
+            vectors.similarities(query, others)
+        print(f"\nКосинус со 100 кандидатами: {(time.perf_counter() - started) / len(queries) * 1000:.2f} мс")
+        if vectors.vectors is not None:
+            excluded = np.zeros(vectors.n_rows, dtype=bool)
+            started = time.perf_counter()
+            for query in queries[:5]:
+                vectors.most_similar(query, excluded, 20)
+            print(f"Top-20 по всему каталогу: {(time.perf_counter() - started) / 5 * 1000:.1f} мс")
+        print(f"Ненулевых элементов TF-IDF: {len(vectors.indices)}, терминов: {vectors.n_terms}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарки LIBRO")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    memory_parser = commands.add_parser("memory", help="Память каталога: object против категорий")
+    memory_parser.add_argument("--books", type=int, default=500_000)
+
+    filters_parser = commands.add_parser("filters", help="Задержка фильтров: битмап-индекс против просмотра")
+    filters_parser.add_argument("--books", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    filters_parser.add_argument("--repeats", type=int, default=20)
+
+    search_parser = commands.add_parser("search", help="Полнотекстовый поиск: построение и задержка запросов")
+    search_parser.add_argument("--books", type=int, default=500_000)
+    search_parser.add_argument("--repeats", type=int, default=10)
+
+    fuzzy_parser = commands.add_parser("fuzzy", help="Поиск с опечатками: триграммы против перебора")
+    fuzzy_parser.add_argument("--books", type=int, default=100_000)
+    fuzzy_parser.add_argument("--queries", type=int, default=20)
+
+    autocomplete_parser = commands.add_parser("autocomplete", help="Автодополнение: задержка top-K по префиксу")
+    autocomplete_parser.add_argument("--books", type=int, default=500_000)
+    autocomplete_parser.add_argument("--repeats", type=int, default=100)
+
+    recommend_parser = commands.add_parser("recommend", help="Рекомендации: матричная оценка против цикла")
+    recommend_parser.add_argument("--books", type=int, default=20_000)
+    recommend_parser.add_argument("--liked", type=int, default=5)
+
+    ann_parser = commands.add_parser("ann", help="Приближенный поиск похожих книг: полнота и задержка")
+    ann_parser.add_argument("--books", type=int, default=500_000)
+    ann_parser.add_argument("--queries", type=int, default=50)
+    ann_parser.add_argument("--probes", type=int, nargs="+", default=[1, 2, 4, 8])
+    ann_parser.add_argument("--tables", type=int, default=ANN_TABLES)
+    ann_parser.add_argument("--bits", type=int, default=None, help="По умолчанию — по размеру каталога")
+
+    descriptions_parser = commands.add_parser("descriptions", help="Векторы описаний: потоковое построение")
+    descriptions_parser.add_argument("--books", type=int, default=1_000_000)
+    descriptions_parser.add_argument("--components", type=int, default=128, help="0 — без SVD")
+    descriptions_parser.add_argument("--chunk-size", type=int, default=20_000)
+    descriptions_parser.add_argument("--vocabulary", type=int, default=50_000)
+
+    collaborative_parser = commands.add_parser("collaborative", help="Коллаборативная модель: обучение")
+    collaborative_parser.add_argument("--users", type=int, default=200_000)
+    collaborative_parser.add_argument("--books", type=int, default=50_000)
+    collaborative_parser.add_argument("--ratings", type=int, default=2_000_000)
+
+    args = parser.parse_args()
+    if args.command == "memory":
+        memory_report(args.books)
+    elif args.command == "filters":
+        filter_report(args.books, args.repeats)
+    elif args.command == "search":
+        search_report(args.books, args.repeats)
+    elif args.command == "fuzzy":
+        fuzzy_report(args.books, args.queries)
+    elif args.command == "autocomplete":
+        autocomplete_report(args.books, args.repeats)
+    elif args.command == "recommend":
+        recommend_report(args.books, args.liked)
+    elif args.command == "ann":
+        ann_report(args.books, args.queries, args.probes, args.tables, args.bits)
+    elif args.command == "descriptions":
+        descriptions_report(args.books, args.components, args.chunk_size, args.vocabulary)
+    elif args.command == "collaborative":
+        collaborative_report(args.users, args.books, args.ratings)
\ No newline at end of file
@@ -1,13 +1,85 @@
+import copy
+import numpy as np
 import pandas as pd
 from typing import Dict, List, Optional
+from multi_hot import MultiHotMatrix
+from filter_index import SCALAR_FILTER_COLUMNS, FilterIndex, top_k
+from query_planner import QueryPlanner
+from ttl_cache import TTLCache
+from text_search import TextIndex
+from autocomplete import PrefixIndex
+from database import add_age_interval_columns, age_option_points, parse_age_interval
+
+# Списковые атрибуты: фильтр «любое из» по multi-hot матрицам
+LIST_FILTER_COLUMNS = ["plot_tropes", "mood", "tags", "themes", "style"]
+
+# Фасеты героя и сеттинга: учитываются только книги, у которых заполнены все атрибуты группы
+CHARACTER_COLUMNS = ["character_age", "character_gender", "character_profession"]
+SETTING_COLUMNS = ["setting_location", "setting_time_period"]
+
+# Точки слайдера возраста, если ни у одной книги возраст не разобран
+DEFAULT_AGE_OPTIONS = [18, 20, 25, 30, 35, 40, 45, 50]
+
+# Кэш результатов и опций фильтров: число наборов фильтров и срок жизни записи (секунды)
+FILTER_CACHE_SIZE = 256
+FILTER_CACHE_TTL = 600
+
+# Сколько вариантов автодополнения отдается виджету вместо полного списка опций
+AUTOCOMPLETE_LIMIT = 20
 
 class BookFilter:
-    """Класс для фильтрации книг с иерархией фильтров"""
+    """Класс для фильтрации книг с иерархией фильтров.
+    
+    После создания не изменяется, поэтому один экземпляр на версию каталога
+    разделяют все сессии; одинаковые запросы разных пользователей берутся из кэша.
     
-    def __init__(self, books_df: pd.DataFrame):
+    С хранилищем SQLite фильтры, счетчики опций и автодополнение значений
+    считаются запросами к базе: битмап-индекс и multi-hot матрицы не строятся.
+    """
+    
+    def __init__(self, books_df: pd.DataFrame, storage=None,
+                 attribute_matrices: Optional[Dict[str, MultiHotMatrix]] = None,
+                 text_index: Optional[TextIndex] = None):
         self.books_df = books_df.copy()
-        self.current_filters = {}
-        self.filter_hierarchy = self._create_filter_hierarchy()
+        self.storage = storage  # SQLiteStorage: фильтрация индексированными запросами
+        self.text_index = text_index  # полнотекстовый поиск; документы — те же позиции, что в books_df
+        # id книги → позиция в books_df (-1 — нет в каталоге): перевод результата запроса к SQLite
+        self._positions_by_id = self._build_positions_by_id() if storage is not None else None
+        if "age_min" not in self.books_df.columns:
+            add_age_interval_columns(self.books_df)
+        
+        self.attribute_matrices: Dict[str, MultiHotMatrix] = {}
+        self.index: Optional[FilterIndex] = None
+        self.planner: Optional[QueryPlanner] = None
+        if storage is None:
+            # Матрицы должны быть построены по тем же строкам, что и books_df
+            self.attribute_matrices = dict(attribute_matrices or {})
+            for column in LIST_FILTER_COLUMNS:
+                if column not in self.attribute_matrices and column in self.books_df.columns:
+                    self.attribute_matrices[column] = MultiHotMatrix(self.books_df[column])
+            # Битмап-индекс по значениям атрибутов: фильтры и счетчики опций
+            self.index = FilterIndex(self.books_df, self.attribute_matrices)
+            self.planner = QueryPlanner(self.index, self._scan_mask)  # порядок условий по селективности
+        # Точки слайдера для каждого различного значения возраста, считаются один раз
+        self._age_options: Dict[str, List[int]] = {}
+        
+        self.filter_hierarchy = self._create_filter_hierarchy()  # шаблон: опции без выбранных фильтров
+        
+        # {нормализованные фильтры: позиции книг} и {нормализованные фильтры: иерархия с опциями}
+        self.result_cache = TTLCache(FILTER_CACHE_SIZE, FILTER_CACHE_TTL)
+        self.options_cache = TTLCache(FILTER_CACHE_SIZE, FILTER_CACHE_TTL)
+        
+        # {колонка: PrefixIndex} строятся при первом обращении;
+        # {(колонка, нормализованные фильтры): веса значений по счетчикам опций}
+        self._completers: Dict[str, PrefixIndex] = {}
+        self.completion_weights = TTLCache(FILTER_CACHE_SIZE, FILTER_CACHE_TTL)
+    
+    def _build_positions_by_id(self) -> np.ndarray:
+        """Массив позиций, индексированный id книги"""
+        ids = self.books_df["id"].to_numpy(dtype=np.int64)
+        positions_by_id = np.full(int(ids.max()) + 1 if len(ids) else 0, -1, dtype=np.int32)
+        positions_by_id[ids] = np.arange(len(ids), dtype=np.int32)
+        return positions_by_id
     
     def _create_filter_hierarchy(self) -> Dict:
         """Создание иерархии фильтров"""
@@ -16,6 +88,7 @@ class BookFilter:
                 "label": "Основной жанр",
                 "type": "select",
                 "options": sorted(self.books_df["main_genre"].unique()),
+                "counts": self._facet_counts({})["main_genre"],
                 "dependencies": {}
             },
             "sub_genre": {
@@ -84,160 +157,276 @@ class BookFilter:
             }
         }
     
-    def update_filter_options(self, selected_filters: Dict):
-        """Обновление доступных опций фильтров на основе выбранных значений"""
-        filtered_df = self.books_df.copy()
+    def get_filter_options(self, selected_filters: Dict) -> Dict:
+        """Иерархия фильтров с доступными опциями и числом книг для каждой опции.
         
-        # Применяем уже выбранные фильтры
-        for key, value in selected_filters.items():
-            if value and key in filtered_df.columns:
-                if isinstance(value, list):
-                    filtered_df = filtered_df[filtered_df[key].apply(
-                        lambda x: any(v in (x if isinstance(x, list) else []) for v in value)
-                    )]
-                else:
-                    filtered_df = filtered_df[filtered_df[key] == value]
+        Результат общий для всех сессий (из кэша) — изменять его нельзя.
+        """
+        return self.options_cache.get_or_compute(
+            self.normalize_filters(selected_filters),
+            lambda: self._build_filter_options(selected_filters)
+        )
+    
+    def _build_filter_options(self, selected_filters: Dict) -> Dict:
+        """Расчет опций фильтров для выбранных значений"""
+        filter_hierarchy = copy.deepcopy(self.filter_hierarchy)
+        
+        facets = self._facet_counts(selected_filters)
         
         # Обновляем опции для зависимых фильтров
         if "main_genre" in selected_filters and selected_filters["main_genre"]:
-            self.filter_hierarchy["sub_genre"]["options"] = sorted(
-                filtered_df["sub_genre"].dropna().unique()
-            )
-        
-        # Обновляем опции для характеристик героя
-        character_df = filtered_df[["character_age", "character_gender", "character_profession"]].dropna()
+            self._set_options(filter_hierarchy["sub_genre"], facets["sub_genre"])
         
         # Обновляем опции для возраста (теперь это будет список чисел для слайдера)
-        age_options = self._extract_age_options(character_df["character_age"])
-        self.filter_hierarchy["character"]["children"]["character_age"]["options"] = age_options
-        
-        self.filter_hierarchy["character"]["children"]["character_gender"]["options"] = sorted(
-            character_df["character_gender"].unique()
-        )
-        self.filter_hierarchy["character"]["children"]["character_profession"]["options"] = sorted(
-            character_df["character_profession"].unique()
-        )
+        character = filter_hierarchy["character"]["children"]
+        age_options = set()
+        for age in facets["character_age"]:
+            if age not in self._age_options:
+                self._age_options[age] = age_option_points(*parse_age_interval(age))
+            age_options.update(self._age_options[age])
+        character["character_age"]["options"] = sorted(age_options) or DEFAULT_AGE_OPTIONS
+        self._set_options(character["character_gender"], facets["character_gender"])
+        self._set_options(character["character_profession"], facets["character_profession"])
         
         # Обновляем опции для сеттинга
-        setting_df = filtered_df[["setting_location", "setting_time_period"]].dropna()
-        self.filter_hierarchy["setting"]["children"]["setting_location"]["options"] = sorted(
-            setting_df["setting_location"].unique()
-        )
-        self.filter_hierarchy["setting"]["children"]["setting_time_period"]["options"] = sorted(
-            setting_df["setting_time_period"].unique()
-        )
+        setting = filter_hierarchy["setting"]["children"]
+        self._set_options(setting["setting_location"], facets["setting_location"])
+        self._set_options(setting["setting_time_period"], facets["setting_time_period"])
         
-        # Обновляем опции для сюжета
-        all_tropes = set()
-        all_moods = set()
+        # Обновляем опции для сюжета (значения, встречающиеся у отфильтрованных книг)
+        plot = filter_hierarchy["plot"]["children"]
+        self._set_options(plot["plot_tropes"], facets["plot_tropes"])
+        self._set_options(plot["mood"], facets["mood"])
         
-        for tropes in filtered_df["plot_tropes"]:
-            if isinstance(tropes, list):
-                all_tropes.update(tropes)
+        return filter_hierarchy
+    
+    def _facet_counts(self, selected_filters: Dict) -> Dict[str, Dict]:
+        """Число книг для каждого значения фасетов при выбранных фильтрах.
+        
+        Герой и сеттинг учитываются только у книг, где заполнены все их атрибуты.
+        Из выбранных фильтров применяются условия по колонкам каталога.
+        """
+        conditions = {}
+        for key, value in selected_filters.items():
+            if value and (key in LIST_FILTER_COLUMNS or key in self.books_df.columns):
+                conditions[key] = value
         
-        for moods in filtered_df["mood"]:
-            if isinstance(moods, list):
-                all_moods.update(moods)
+        if self.storage is not None:
+            if any(isinstance(value, list) for key, value in conditions.items() if key not in LIST_FILTER_COLUMNS):
+                # В скалярной колонке списков нет: ни одна книга не подходит
+                return {column: {} for column in ["main_genre", "sub_genre", "plot_tropes", "mood"]
+                        + CHARACTER_COLUMNS + SETTING_COLUMNS}
+            facets = self.storage.facet_counts(conditions, ["main_genre", "sub_genre", "plot_tropes", "mood"])
+            facets.update(self.storage.facet_counts(conditions, CHARACTER_COLUMNS, CHARACTER_COLUMNS))
+            facets.update(self.storage.facet_counts(conditions, SETTING_COLUMNS, SETTING_COLUMNS))
+            return facets
         
-        self.filter_hierarchy["plot"]["children"]["plot_tropes"]["options"] = sorted(all_tropes)
-        self.filter_hierarchy["plot"]["children"]["mood"]["options"] = sorted(all_moods)
+        bitmap = self.index.all_rows()
+        for key, value in conditions.items():
+            if key in LIST_FILTER_COLUMNS:
+                bitmap &= np.packbits(self._list_mask(key, value))
+            elif isinstance(value, list):
+                # В скалярной колонке списков нет: ни одна книга не подходит
+                bitmap[:] = 0
+            elif key in self.index.values:
+                bitmap &= self.index.equals(key, value)
+            else:
+                bitmap &= np.packbits(self._equals(self.books_df[key], value).to_numpy())
+        mask = self.index.to_mask(bitmap)
+        
+        # По одному подсчету на колонку
+        facets = self.index.facet_counts(mask, ["main_genre", "sub_genre", "plot_tropes", "mood"])
+        facets.update(self.index.facet_counts(mask & self.index.present(CHARACTER_COLUMNS), CHARACTER_COLUMNS))
+        facets.update(self.index.facet_counts(mask & self.index.present(SETTING_COLUMNS), SETTING_COLUMNS))
+        return facets
+    
+    @staticmethod
+    def _set_options(node: Dict, counts: Dict):
+        """Опции фильтра по алфавиту и число книг для каждой"""
+        node["options"] = sorted(counts)
+        node["counts"] = counts
+    
+    @staticmethod
+    def normalize_filters(filters: Dict) -> tuple:
+        """Ключ кэша: пустые условия отброшены, ключи отсортированы, списки — без учета порядка"""
+        return tuple(sorted(
+            (key, frozenset(value) if isinstance(value, list) else value)
+            for key, value in filters.items() if value
+        ))
     
     def apply_filters(self, filters: Dict) -> pd.DataFrame:
         """Применение фильтров к данным"""
-        filtered_df = self.books_df.copy()
-        
-        for key, value in filters.items():
-            if value:
-                if key == "min_rating":  # Особый случай для минимального рейтинга
-                    filtered_df = filtered_df[filtered_df["rating"] >= value]
-                
-                # Обработка диапазона возраста
-                elif key == "character_age_range":
-                    min_age, max_age = value
-                    # Фильтруем книги, где возраст героя находится в диапазоне
-                    filtered_df = filtered_df[filtered_df["character_age"].apply(
-                        lambda x: self._is_age_in_range(x, min_age, max_age)
-                    )]
-                
-                elif isinstance(value, list) and value:
-                    if key in ["plot_tropes", "mood", "tags", "themes", "style"]:
-                        # Для списковых полей
-                        filtered_df = filtered_df[filtered_df[key].apply(
-                            lambda x: any(v in (x if isinstance(x, list) else []) for v in value)
-                        )]
-                    else:
-                        filtered_df = filtered_df[filtered_df[key].isin(value)]
-                
-                elif not isinstance(value, list):
-                    filtered_df = filtered_df[filtered_df[key] == value]
-        
-        return filtered_df
-
-    def _is_age_in_range(self, age_str: str, min_age: int, max_age: int) -> bool:
-        """Проверяет, находится ли возраст в диапазоне"""
-        if pd.isna(age_str):
-            return False
-        
-        # Парсим строку с возрастом (например "20-30", "30-40", "40-50")
-        try:
-            if "-" in str(age_str):
-                # Формат "20-30" или "30-40"
-                parts = str(age_str).split("-")
-                age_min = int(parts[0].strip())
-                age_max = int(parts[1].strip())
-                # Проверяем пересечение диапазонов
-                return not (age_max < min_age or age_min > max_age)
-            elif "+" in str(age_str):
-                # Формат "40+"
-                age_min = int(str(age_str).replace("+", "").strip())
-                return age_min <= max_age
-            else:
-                # Одиночный возраст
-                age = int(str(age_str).strip())
-                return min_age <= age <= max_age
-        except (ValueError, AttributeError):
-            return False
+        return self.books_df.iloc[self.filter_positions(filters)]
+    
+    def filter_positions(self, filters: Dict) -> np.ndarray:
+        """Позиции подходящих книг в books_df (из общего кэша, только для чтения)"""
+        return self.result_cache.get_or_compute(
+            self.normalize_filters(filters),
+            lambda: self._filter_positions(filters)
+        )
+    
+    def search_positions(self, filters: Dict, query: str = "") -> np.ndarray:
+        """Позиции книг по фильтрам и текстовому запросу: пересечение результата фильтров
+        с найденными книгами (по возрастанию позиции)"""
+        positions = self.filter_positions(filters)
+        if not query or self.text_index is None:
+            return positions
+        return positions[self.text_index.match(query)[positions] > 0]
+    
+    def get_page(self, filters: Dict, limit: int, sort_by: Optional[str] = None,
+                 descending: bool = True, query: str = "") -> pd.DataFrame:
+        """Первые limit книг результата; строки DataFrame создаются только для них.
+        
+        Без sort_by — по релевантности запросу (без запроса — в порядке каталога),
+        иначе частичная сортировка top-K по колонке.
+        """
+        positions = self.search_positions(filters, query)
+        if sort_by is None:
+            if query and self.text_index is not None:
+                scores = self.text_index.match(query)
+                return self.books_df.iloc[positions[top_k(scores[positions], limit)]]
+            return self.books_df.iloc[positions[:limit]]
+        
+        values = pd.to_numeric(self.books_df[sort_by], errors="coerce").to_numpy(dtype=np.float64)
+        return self.books_df.iloc[positions[top_k(values[positions], limit, descending)]]
+    
+    def summarize(self, filters: Dict, query: str = "") -> Dict:
+        """Сводка по результату фильтра без создания строк: число книг, средний рейтинг,
+        число жанров и авторов, диапазон лет издания"""
+        positions = self.search_positions(filters, query)
+        return {
+            "count": len(positions),
+            "mean_rating": self.books_df["rating"].iloc[positions].mean(),
+            "genres": self._count_distinct("main_genre", positions),
+            "authors": self._count_distinct("author", positions),
+            "year_min": self.books_df["year"].iloc[positions].min(),
+            "year_max": self.books_df["year"].iloc[positions].max(),
+        }
+    
+    def _count_distinct(self, column: str, positions: np.ndarray) -> int:
+        """Число различных значений колонки (пропуск считается значением, как в Series.unique)"""
+        values = self.books_df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes = values.cat.codes.to_numpy()[positions]
+            return int(np.count_nonzero(np.bincount(codes + 1, minlength=len(values.cat.categories) + 1)))
+        return len(pd.unique(values.to_numpy()[positions]))
+    
+    def _filter_positions(self, filters: Dict) -> np.ndarray:
+        """Позиции подходящих книг в books_df (по возрастанию)"""
+        if self.storage is not None:
+            book_ids = self.storage.filter_book_ids(filters)
+            book_ids = book_ids[book_ids < len(self._positions_by_id)]
+            positions = self._positions_by_id[book_ids]
+            positions = np.sort(positions[positions != -1])
+        else:
+            positions = self.planner.execute(filters)
+        
+        positions = positions.astype(np.int32)
+        positions.flags.writeable = False  # массив разделяют все сессии
+        return positions
     
-    def _extract_age_options(self, age_series) -> List[int]:
-        """Извлекает все возможные возрасты из строковых значений"""
-        ages = set()
-        
-        for age_str in age_series:
-            if pd.isna(age_str):
-                continue
-            
-            age_str = str(age_str)
-            
-            if "-" in age_str:
-                # Формат "20-30"
-                try:
-                    parts = age_str.split("-")
-                    start = int(parts[0].strip())
-                    end = int(parts[1].strip())
-                    # Добавляем начало и конец диапазона
-                    ages.add(start)
-                    ages.add(end)
-                    # Добавляем середину для лучшего представления
-                    ages.add((start + end) // 2)
-                except:
-                    pass
-            elif "+" in age_str:
-                # Формат "40+"
-                try:
-                    base_age = int(age_str.replace("+", ""))
-                    ages.add(base_age)
-                    ages.add(base_age + 10)  # Добавляем верхнюю границу
-                except:
-                    pass
+    def explain(self, filters: Dict) -> str:
+        """План фильтра: порядок условий, оценка селективности и число книг после каждого шага"""
+        lines = [f"Всего книг: {len(self.books_df)}"]
+        if self.storage is not None:
+            lines.append("Фильтрация выполняется запросом к SQLite:")
+            lines.extend(f"  {detail}" for detail in self.storage.explain_filter(filters))
+            return "\n".join(lines)
+        for step in self.planner.explain(filters):
+            rows = "не выполнялся" if step["rows"] is None else f"осталось {step['rows']}"
+            lines.append(f"{step['step']}. {step['filter']} = {step['value']!r}: "
+                         f"оценка {step['estimate']}, {rows}")
+        return "\n".join(lines)
+    
+    def get_completer(self, column: str) -> PrefixIndex:
+        """Автодополнение значений колонки: названия (вес — рейтинг), авторы и значения
+        фасетов (вес — число книг)"""
+        completer = self._completers.get(column)
+        if completer is None:
+            if column == "title":
+                ratings = pd.to_numeric(self.books_df["rating"], errors="coerce").to_numpy(dtype=np.float64)
+                completer = PrefixIndex(self.books_df["title"].astype(str), np.nan_to_num(ratings))
+            elif self.storage is not None and (column in LIST_FILTER_COLUMNS or column in SCALAR_FILTER_COLUMNS):
+                counts = self.storage.facet_counts({}, [column])[column]
+                completer = PrefixIndex(list(counts), list(counts.values()))
+            elif self.index is not None and column in self.index.list_values:
+                completer = PrefixIndex(self.index.list_values[column].vocabulary, self.index.postings[column].counts)
+            elif self.index is not None and column in self.index.values:
+                # Код 0 в постингах — пропуск, значения начинаются с кода 1
+                completer = PrefixIndex(self.index.values[column], self.index.postings[column].counts[1:])
+            elif column in self.books_df.columns:
+                counts = self.books_df[column].value_counts()
+                completer = PrefixIndex(counts.index.astype(str), counts.to_numpy())
             else:
-                # Одиночный возраст
-                try:
-                    ages.add(int(age_str))
-                except:
-                    pass
-        
-        # Сортируем и возвращаем
-        return sorted(ages) if ages else [18, 20, 25, 30, 35, 40, 45, 50]  # Дефолтные значения
+                raise KeyError(column)
+            self._completers[column] = completer
+        return completer
+    
+    def complete(self, column: str, prefix: str, limit: int = AUTOCOMPLETE_LIMIT,
+                 selected_filters: Optional[Dict] = None) -> List[str]:
+        """Top-K значений колонки с префиксом (по словам), самые частые первыми.
+        
+        С selected_filters веса — счетчики опций из get_filter_options: предлагаются
+        только значения, доступные при выбранных фильтрах.
+        """
+        completer = self.get_completer(column)
+        if selected_filters is None:
+            return [value for value, _ in completer.complete(prefix, limit)]
+        
+        weights = self.completion_weights.get_or_compute(
+            (column, self.normalize_filters(selected_filters)),
+            lambda: completer.weights_for(self._option_counts(self.get_filter_options(selected_filters), column))
+        )
+        return [value for value, _ in completer.complete(prefix, limit, weights)]
+    
+    @staticmethod
+    def _option_counts(filter_hierarchy: Dict, column: str) -> Dict:
+        """Счетчики опций колонки из иерархии фильтров"""
+        for key, node in filter_hierarchy.items():
+            if key == column:
+                return node.get("counts", {})
+            if column in node.get("children", {}):
+                return node["children"][column].get("counts", {})
+        raise KeyError(column)
+    
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Счетчики кэшей результатов и опций"""
+        return {"results": self.result_cache.stats(), "options": self.options_cache.stats()}
+    
+    def _scan_mask(self, key: str, value) -> np.ndarray:
+        """Маска книг для одного условия фильтра полным просмотром колонки"""
+        if key == "min_rating":
+            return (self.books_df["rating"] >= value).to_numpy()
+        
+        if key == "character_age_range":
+            min_age, max_age = value
+            return ((self.books_df["age_min"] <= max_age) & (self.books_df["age_max"] >= min_age)).to_numpy()
+        
+        if key in LIST_FILTER_COLUMNS:
+            return self._list_mask(key, value)
+        
+        if isinstance(value, list):
+            return self.books_df[key].isin(value).to_numpy()
+        
+        return self._equals(self.books_df[key], value).to_numpy()
+    
+    def _list_mask(self, key: str, value) -> np.ndarray:
+        """Маска книг для спискового атрибута: «любое из» по multi-hot матрице
+        (в горячей проекции books_df списковых колонок нет)"""
+        if not isinstance(value, list):
+            # Список не равен отдельному значению: ни одна книга не подходит
+            return np.zeros(len(self.books_df), dtype=bool)
+        return self.attribute_matrices[key].any_of(value)
+
+    @staticmethod
+    def _equals(column: pd.Series, value) -> pd.Series:
+        """Сравнение колонки со значением; категориальные колонки сравниваются по целочисленным кодам"""
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            categories = column.cat.categories
+            if value not in categories:
+                return pd.Series(False, index=column.index)
+            return column.cat.codes == categories.get_loc(value)
+        return column == value
 
     def get_filter_description(self, filters: Dict) -> str:
         """Получение текстового описания примененных фильтров"""
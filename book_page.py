@@ -1,18 +1,29 @@
 import streamlit as st
 import pandas as pd
-from typing import Dict, List
+from typing import Dict, List, Tuple
 import json
 import os
+from sqlite_storage import ReviewsView
 
 class BookPageManager:
     """Менеджер для отображения детальных страниц книг"""
     
-    def __init__(self, book_db, auth_manager, lists_manager):
+    def __init__(self, book_db, auth_manager, lists_manager, storage=None, profiles=None):
         self.book_db = book_db
         self.auth_manager = auth_manager
         self.lists_manager = lists_manager
+        self.profiles = profiles  # профили вкуса (taste_profiles.py); None — без профилей
         self.reviews_file = "book_reviews.json"
-        self.reviews = self._load_reviews()
+        self.storage = storage
+        self.user_versions: Dict[str, int] = {}  # {username: счетчик новых отзывов пользователя}
+        
+        if storage is not None:
+            # Отзывы хранятся в SQLite, JSON импортируется один раз
+            if storage.is_empty("reviews"):
+                storage.import_reviews(self._load_reviews())
+            self.reviews = ReviewsView(storage)
+        else:
+            self.reviews = self._load_reviews()
     
     def _load_reviews(self) -> Dict:
         """Загрузка отзывов из файла"""
@@ -26,19 +37,20 @@ class BookPageManager:
     
     def _save_reviews(self):
         """Сохранение отзывов в файл"""
+        if self.storage is not None:
+            return  # SQLite сохраняет изменения сразу
+        
         with open(self.reviews_file, 'w', encoding='utf-8') as f:
             json.dump(self.reviews, f, ensure_ascii=False, indent=2)
     
     def get_book_details(self, book_id: int) -> Dict:
         """Получение детальной информации о книге"""
-        book_df = self.book_db.books
-        book = book_df[book_df["id"] == book_id]
+        # Описание и списковые атрибуты подгружаются из холодного хранилища через LRU-кэш
+        book_data = self.book_db.get_book_details(book_id)
         
-        if book.empty:
+        if book_data is None:
             return None
         
-        book_data = book.iloc[0].to_dict()
-        
         # Добавляем отзывы
         book_data["reviews"] = self.get_book_reviews(book_id)
         
@@ -85,6 +97,18 @@ class BookPageManager:
         
         return book_reviews
     
+    def get_user_reviews(self, username: str) -> List[Tuple[int, Dict]]:
+        """Получение всех отзывов пользователя в виде пар (book_id, отзыв)"""
+        if self.storage is not None:
+            return self.storage.get_user_reviews(username)
+        
+        user_reviews = []
+        for book_id_str, reviews in self.reviews.items():
+            for review in reviews:
+                if review["username"] == username:
+                    user_reviews.append((int(book_id_str), review))
+        return user_reviews
+    
     def get_review_stats(self, book_id: int) -> Dict:
         """Получение статистики отзывов"""
         reviews = self.get_book_reviews(book_id)
@@ -114,11 +138,10 @@ class BookPageManager:
     
     def add_review(self, book_id: int, username: str, rating: int, text: str):
         """Добавление нового отзыва"""
-        if str(book_id) not in self.reviews:
-            self.reviews[str(book_id)] = []
+        book_reviews = self.reviews.get(str(book_id), [])
         
         new_review = {
-            "id": len(self.reviews[str(book_id)]) + 1,
+            "id": len(book_reviews) + 1,
             "username": username,
             "rating": rating,
             "text": text,
@@ -126,12 +149,26 @@ class BookPageManager:
             "likes": 0
         }
         
-        self.reviews[str(book_id)].append(new_review)
-        self._save_reviews()
+        if self.storage is not None:
+            self.storage.add_review(book_id, new_review)
+        else:
+            self.reviews.setdefault(str(book_id), []).append(new_review)
+            self._save_reviews()
+        if self.profiles is not None:
+            self.profiles.on_review(username, book_id, rating)
+        # Счетчик меняется после записи: кэш не сохранит результат по старым данным под новым ключом
+        self.user_versions[username] = self.user_versions.get(username, 0) + 1
         return new_review
     
+    def get_user_version(self, username: str) -> int:
+        """Счетчик отзывов, добавленных пользователем: по нему сбрасываются кэши рекомендаций"""
+        return self.user_versions.get(username, 0)
+    
     def like_review(self, book_id: int, review_id: int):
         """Лайк отзыва"""
+        if self.storage is not None:
+            return self.storage.like_review(book_id, review_id)
+        
         book_reviews = self.reviews.get(str(book_id), [])
         for review in book_reviews:
             if review["id"] == review_id:
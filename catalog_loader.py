@@ -0,0 +1,241 @@
+import bisect
+import json
+import os
+import sys
+from typing import Dict, Iterator, List, Optional
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow необязателен: без него читается только JSONL
+    pa = None
+    pq = None
+
+# Файлы каталога в порядке предпочтения: колоночные форматы быстрее JSONL
+CATALOG_FILES = ["books.parquet", "books.arrow", "books.jsonl"]
+
+PARQUET_EXTENSIONS = (".parquet",)
+ARROW_EXTENSIONS = (".arrow", ".feather", ".ipc")
+JSONL_EXTENSIONS = (".jsonl",)
+
+
+def find_catalog_file(directory: str = ".") -> Optional[str]:
+    """Поиск файла каталога в каталоге приложения"""
+    for file_name in CATALOG_FILES:
+        path = os.path.join(directory, file_name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+class CatalogLoader:
+    """Загрузчик каталога книг из Parquet / Arrow IPC / JSONL с чтением по колонкам"""
+
+    def __init__(self, path: str, columns: List[str], list_columns: List[str]):
+        self.path = path
+        self.columns = columns  # схема каталога (поля dataclass Book)
+        self.list_columns = list_columns
+        self.format = self._detect_format(path)
+        self._arrow_table = None  # Arrow IPC открывается через memory map один раз
+        self._line_offsets = None  # JSONL: смещения строк для чтения отдельных книг
+        self._row_group_starts = None  # Parquet: номер первой строки каждой группы строк
+
+    def _detect_format(self, path: str) -> str:
+        """Определение формата по расширению файла"""
+        extension = os.path.splitext(path)[1].lower()
+        if extension in JSONL_EXTENSIONS:
+            return "jsonl"
+
+        if extension in PARQUET_EXTENSIONS:
+            file_format = "parquet"
+        elif extension in ARROW_EXTENSIONS:
+            file_format = "arrow"
+        else:
+            raise ValueError(f"Неизвестный формат каталога: {path}")
+
+        if pa is None:
+            raise ImportError(f"Для чтения {path} нужен pyarrow")
+        return file_format
+
+    def read_columns(self, columns: List[str]) -> pd.DataFrame:
+        """Чтение только указанных колонок каталога"""
+        if self.format == "jsonl":
+            data = self._read_jsonl_columns(columns)
+        else:
+            data = self._read_arrow_columns(columns)
+
+        return pd.DataFrame(data, columns=columns)
+
+    def iter_columns(self, columns: List[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+        """Потоковое чтение колонок порциями по chunk_size книг (весь каталог в памяти не собирается)"""
+        if self.format == "jsonl":
+            data = {column: [] for column in columns}
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    for column in columns:
+                        data[column].append(record.get(column))
+                    if len(data[columns[0]]) >= chunk_size:
+                        yield self._chunk_frame(data, columns)
+                        data = {column: [] for column in columns}
+            if data[columns[0]]:
+                yield self._chunk_frame(data, columns)
+            return
+
+        if self.format == "parquet":
+            parquet_file = pq.ParquetFile(self.path)
+            present = [column for column in columns if column in parquet_file.schema_arrow.names]
+            batches = parquet_file.iter_batches(batch_size=chunk_size, columns=present)
+        else:
+            table = self._open_arrow_table()
+            present = [column for column in columns if column in table.column_names]
+            batches = table.select(present).to_batches(max_chunksize=chunk_size)
+        for batch in batches:
+            data = {column: batch.column(present.index(column)).to_pylist() if column in present
+                    else [None] * batch.num_rows for column in columns}
+            yield self._chunk_frame(data, columns)
+
+    def _chunk_frame(self, data: Dict[str, list], columns: List[str]) -> pd.DataFrame:
+        return pd.DataFrame({column: self._normalize_column(column, values) for column, values in data.items()},
+                            columns=columns)
+
+    def read_rows(self, positions: List[int], columns: List[str]) -> List[Dict]:
+        """Чтение отдельных книг (по позициям в каталоге) без загрузки колонок целиком"""
+        if self.format == "jsonl":
+            records = self._read_jsonl_rows(positions, columns)
+        elif self.format == "arrow":
+            table = self._open_arrow_table()
+            present = [column for column in columns if column in table.column_names]
+            records = table.take(positions).select(present).to_pylist()
+        else:
+            records = self._read_parquet_rows(positions, columns)
+
+        return [{column: self._normalize_column(column, [record.get(column)])[0] for column in columns}
+                for record in records]
+
+    def _read_jsonl_rows(self, positions: List[int], columns: List[str]) -> List[Dict]:
+        """Чтение строк JSONL по смещениям (индекс смещений строится один раз)"""
+        if self._line_offsets is None:
+            offsets = []
+            with open(self.path, 'rb') as f:
+                offset = f.tell()
+                for line in iter(f.readline, b""):
+                    if line.strip():
+                        offsets.append(offset)
+                    offset = f.tell()
+            self._line_offsets = offsets
+
+        records = []
+        with open(self.path, 'rb') as f:
+            for position in positions:
+                f.seek(self._line_offsets[position])
+                record = json.loads(f.readline().decode('utf-8'))
+                records.append({column: record.get(column) for column in columns})
+        return records
+
+    def _read_parquet_rows(self, positions: List[int], columns: List[str]) -> List[Dict]:
+        """Чтение строк Parquet: читается только группа строк, в которой лежит книга"""
+        parquet_file = pq.ParquetFile(self.path)
+        if self._row_group_starts is None:
+            starts = [0]
+            for index in range(parquet_file.num_row_groups):
+                starts.append(starts[-1] + parquet_file.metadata.row_group(index).num_rows)
+            self._row_group_starts = starts
+
+        present = [column for column in columns if column in parquet_file.schema_arrow.names]
+        records = []
+        for position in positions:
+            group = bisect.bisect_right(self._row_group_starts, position) - 1
+            table = parquet_file.read_row_group(group, columns=present)
+            records.append(table.slice(position - self._row_group_starts[group], 1).to_pylist()[0])
+        return records
+
+    def _open_arrow_table(self):
+        """Открытие Arrow IPC файла без копирования в память"""
+        if self._arrow_table is None:
+            source = pa.memory_map(self.path, "r")
+            self._arrow_table = pa.ipc.open_file(source).read_all()
+        return self._arrow_table
+
+    def _read_arrow_columns(self, columns: List[str]) -> Dict[str, list]:
+        """Чтение колонок из Parquet / Arrow IPC с приведением к схеме Book"""
+        if self.format == "parquet":
+            available = pq.read_schema(self.path).names
+            present = [column for column in columns if column in available]
+            table = pq.read_table(self.path, columns=present)
+        else:
+            table = self._open_arrow_table()
+            present = [column for column in columns if column in table.column_names]
+            table = table.select(present)
+
+        data = {}
+        for column in columns:
+            if column in present:
+                # to_pylist: списковые колонки должны остаться списками Python, а не массивами
+                values = table.column(column).to_pylist()
+            else:
+                values = [None] * table.num_rows
+            data[column] = self._normalize_column(column, values)
+        return data
+
+    def _read_jsonl_columns(self, columns: List[str]) -> Dict[str, list]:
+        """Чтение колонок из JSONL (одна книга на строку)"""
+        data = {column: [] for column in columns}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                for column in columns:
+                    data[column].append(record.get(column))
+
+        return {column: self._normalize_column(column, values) for column, values in data.items()}
+
+    def _normalize_column(self, column: str, values: list) -> list:
+        """Пустые списковые атрибуты заменяются на [] как в dataclass Book"""
+        if column in self.list_columns:
+            return [value if isinstance(value, list) else [] for value in values]
+        return values
+
+
+def write_catalog(books_df: pd.DataFrame, path: str):
+    """Сохранение каталога в Parquet / Arrow IPC / JSONL (по расширению файла)"""
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in JSONL_EXTENSIONS:
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in books_df.to_dict("records"):
+                record = {key: (None if not isinstance(value, list) and pd.isna(value) else value)
+                          for key, value in record.items()}
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return
+
+    if pa is None:
+        raise ImportError(f"Для записи {path} нужен pyarrow")
+
+    table = pa.Table.from_pandas(books_df, preserve_index=False)
+    if extension in PARQUET_EXTENSIONS:
+        pq.write_table(table, path)
+    elif extension in ARROW_EXTENSIONS:
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    else:
+        raise ValueError(f"Неизвестный формат каталога: {path}")
+
+
+if __name__ == "__main__":
+    # Конвертация каталога: python catalog_loader.py books.jsonl books.parquet
+    if len(sys.argv) != 3:
+        print("Использование: python catalog_loader.py <исходный файл> <целевой файл>")
+        sys.exit(1)
+
+    from database import BOOK_COLUMNS, LIST_COLUMNS
+
+    source_loader = CatalogLoader(sys.argv[1], BOOK_COLUMNS, LIST_COLUMNS)
+    write_catalog(source_loader.read_columns(BOOK_COLUMNS), sys.argv[2])
+    print(f"Каталог сохранен в {sys.argv[2]}")
\ No newline at end of file
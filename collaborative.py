@@ -0,0 +1,416 @@
+"""Коллаборативная фильтрация: item-item по скорректированному косинусу и неявная ALS.
+
+Обучается офлайн по оценкам из отзывов и по спискам пользователей
+(«Прочитано», «Любимые», «Брошено» ...). Все операции — над разреженной
+матрицей «пользователь × книга» в формате CSR массивами NumPy, блоками
+ограниченного размера. Результат — соседи книг и факторы книг в .npy,
+которые приложение открывает через memory map. Запуск:
+    python collaborative.py --catalog books.jsonl --out collaborative --factors 32
+"""
+import argparse
+import json
+import os
+from typing import Iterable, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from multi_hot import _ranges
+
+CF_DIR = "collaborative"
+
+# Item-item: соседей на книгу, сжатие схожести по числу общих читателей, пар на блок
+CF_NEIGHBORS_K = 50
+CF_SHRINKAGE = 10.0
+PAIR_BLOCK = 2_000_000
+
+# ALS: размерность факторов, итерации, шаги сопряженных градиентов на итерацию
+ALS_FACTORS = 32
+ALS_ITERATIONS = 10
+ALS_CG_STEPS = 3
+ALS_REGULARIZATION = 0.1
+ALS_ALPHA = 10.0  # уверенность = 1 + ALS_ALPHA × сила сигнала
+
+# Память на блок произведений по взаимодействиям (взаимодействия × факторы, float32)
+ALS_BLOCK_BYTES = 64 * 2**20
+
+# Сигналы: (предпочтение, сила). Низкая оценка и «Брошено» — уверенное «не нравится»
+RATING_SIGNALS = {5: (1.0, 1.0), 4: (1.0, 0.75), 3: (1.0, 0.25), 2: (0.0, 0.5), 1: (0.0, 1.0)}
+LIST_SIGNALS = {
+    "favorites": (1.0, 1.0),
+    "read": (1.0, 0.5),
+    "reading": (1.0, 0.5),
+    "planned": (1.0, 0.25),
+    "dropped": (0.0, 0.5),
+}
+
+# При выдаче вклад оцененной книги в item-item — отклонение оценки от середины шкалы
+RATING_MIDPOINT = 3.0
+
+
+class Interactions:
+    """Матрица «пользователь × книга» (CSR, строки по пользователям, книги — позиции каталога).
+
+    Для каждой пары хранятся средняя оценка (NaN — оценки нет, только список),
+    предпочтение (0..1) и суммарная сила сигналов.
+    """
+
+    def __init__(self, users: List[str], n_items: int, indptr: np.ndarray, items: np.ndarray,
+                 ratings: np.ndarray, preference: np.ndarray, strength: np.ndarray):
+        self.users = users
+        self.n_items = n_items
+        self.indptr = indptr
+        self.items = items
+        self.ratings = ratings
+        self.preference = preference
+        self.strength = strength
+
+    @property
+    def n_users(self) -> int:
+        return len(self.users)
+
+    @property
+    def nnz(self) -> int:
+        return len(self.items)
+
+    def user_of_entry(self) -> np.ndarray:
+        return np.repeat(np.arange(self.n_users), np.diff(self.indptr))
+
+    @classmethod
+    def from_events(cls, book_ids: np.ndarray, ratings: Iterable[Tuple[str, int, int]] = (),
+                    list_books: Iterable[Tuple[str, str, int]] = ()) -> "Interactions":
+        """Сборка из событий: оценки (username, book_id, rating) и списки (username, list_name, book_id).
+
+        book_ids — id книг каталога по позициям; книги не из каталога, неизвестные
+        оценки и списки пропускаются. Повторы пары складываются.
+        """
+        user_codes, event_users, event_books, event_ratings, event_signals = {}, [], [], [], []
+        for username, book_id, rating in ratings:
+            signal = RATING_SIGNALS.get(rating)
+            if signal is not None:
+                event_users.append(user_codes.setdefault(username, len(user_codes)))
+                event_books.append(book_id)
+                event_ratings.append(rating)
+                event_signals.append(signal)
+        for username, list_name, book_id in list_books:
+            signal = LIST_SIGNALS.get(list_name)
+            if signal is not None:
+                event_users.append(user_codes.setdefault(username, len(user_codes)))
+                event_books.append(book_id)
+                event_ratings.append(np.nan)
+                event_signals.append(signal)
+
+        n_items = len(book_ids)
+        users = np.asarray(event_users, dtype=np.int64)
+        items = pd.Index(book_ids).get_indexer(np.asarray(event_books, dtype=np.int64))
+        rating_values = np.asarray(event_ratings, dtype=np.float64)
+        signals = np.asarray(event_signals, dtype=np.float64).reshape(-1, 2)
+        known = items >= 0
+        users, items, rating_values, signals = users[known], items[known], rating_values[known], signals[known]
+
+        # Пары (пользователь, книга): уникальные ключи сразу упорядочены по пользователю и книге
+        keys, inverse = np.unique(users * n_items + items, return_inverse=True)
+        strength = np.bincount(inverse, signals[:, 1], minlength=len(keys))
+        preference = np.bincount(inverse, signals[:, 0] * signals[:, 1], minlength=len(keys)) / strength
+        rated = ~np.isnan(rating_values)
+        rating_counts = np.bincount(inverse[rated], minlength=len(keys))
+        rating_sums = np.bincount(inverse[rated], rating_values[rated], minlength=len(keys))
+        with np.errstate(invalid="ignore"):
+            mean_ratings = rating_sums / rating_counts  # 0 / 0 = NaN: оценок нет
+
+        n_users = len(user_codes)
+        indptr = np.zeros(n_users + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // max(n_items, 1), minlength=n_users), out=indptr[1:])
+        return cls(list(user_codes), n_items, indptr, (keys % max(n_items, 1)).astype(np.int32),
+                   mean_ratings.astype(np.float32), preference.astype(np.float32), strength.astype(np.float32))
+
+    def transposed(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Матрица по книгам: indptr, пользователи и номера взаимодействий (порядок в CSR по пользователям)"""
+        order = np.argsort(self.items, kind="stable")
+        indptr = np.zeros(self.n_items + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.items, minlength=self.n_items), out=indptr[1:])
+        return indptr, self.user_of_entry()[order], order
+
+
+def _row_blocks(indptr: np.ndarray, max_entries: int) -> List[Tuple[int, int]]:
+    """Последовательные блоки строк CSR, в каждом не больше max_entries элементов (но не меньше строки)"""
+    blocks, start, n_rows = [], 0, len(indptr) - 1
+    while start < n_rows:
+        stop = int(np.searchsorted(indptr, indptr[start] + max_entries, side="right")) - 1
+        stop = min(max(stop, start + 1), n_rows)
+        blocks.append((start, stop))
+        start = stop
+    return blocks
+
+
+def item_neighbors(interactions: Interactions, k: int = CF_NEIGHBORS_K,
+                   shrinkage: float = CF_SHRINKAGE) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-K соседей книг по скорректированному косинусу: позиции (int32, -1 — пусто) и схожесть (float32).
+
+    Оценки центрируются средним пользователя; схожесть — косинус центрированных
+    столбцов, умноженный на n / (n + shrinkage) (n — общие читатели). Совместные
+    оценки считаются блоками книг: для книги перебираются строки ее читателей,
+    пары суммируются по ключу — стоимость пропорциональна числу пар, а не книг².
+    """
+    rated = ~np.isnan(interactions.ratings)
+    users = interactions.user_of_entry()[rated]
+    items = interactions.items[rated].astype(np.int64)
+    values = interactions.ratings[rated].astype(np.float64)
+    n_items = interactions.n_items
+    user_means = (np.bincount(users, values, minlength=interactions.n_users)
+                  / np.maximum(np.bincount(users, minlength=interactions.n_users), 1))
+    values = values - user_means[users]
+    # Нулевые отклонения не влияют на скалярные произведения
+    nonzero = values != 0
+    users, items, values = users[nonzero], items[nonzero], values[nonzero]
+
+    user_indptr = np.zeros(interactions.n_users + 1, dtype=np.int64)
+    np.cumsum(np.bincount(users, minlength=interactions.n_users), out=user_indptr[1:])
+    row_lengths = np.diff(user_indptr)
+    order = np.argsort(items, kind="stable")
+    item_indptr = np.zeros(n_items + 1, dtype=np.int64)
+    np.cumsum(np.bincount(items, minlength=n_items), out=item_indptr[1:])
+    item_users, item_values = users[order], values[order]
+    norms = np.sqrt(np.bincount(items, values ** 2, minlength=n_items))
+
+    neighbor_positions = np.full((n_items, k), -1, dtype=np.int32)
+    neighbor_similarities = np.zeros((n_items, k), dtype=np.float32)
+    # Число пар книги — сумма длин строк ее читателей
+    pair_indptr = np.zeros(n_items + 1, dtype=np.int64)
+    np.cumsum(np.bincount(items, row_lengths[users], minlength=n_items).astype(np.int64), out=pair_indptr[1:])
+
+    for block_start, block_stop in _row_blocks(pair_indptr, PAIR_BLOCK):
+        entries = np.arange(item_indptr[block_start], item_indptr[block_stop])
+        if not len(entries):
+            continue
+        entry_users = item_users[entries]
+        lengths = row_lengths[entry_users]
+        other = _ranges(user_indptr[entry_users], lengths)
+        local = np.repeat(np.repeat(np.arange(block_stop - block_start), np.diff(item_indptr[block_start:block_stop + 1])),
+                          lengths)
+        products = np.repeat(item_values[entries], lengths) * values[other]
+        other_items = items[other]
+        keep = other_items != local + block_start
+        pair_keys, inverse = np.unique(local[keep] * n_items + other_items[keep], return_inverse=True)
+        dots = np.bincount(inverse, products[keep], minlength=len(pair_keys))
+        common = np.bincount(inverse, minlength=len(pair_keys))
+
+        rows, columns = pair_keys // n_items, pair_keys % n_items
+        similarities = dots / (norms[rows + block_start] * norms[columns]) * (common / (common + shrinkage))
+        positive = similarities > 0
+        rows, columns, similarities = rows[positive], columns[positive], similarities[positive]
+
+        # Ранг внутри строки после сортировки по убыванию схожести (при равенстве — по позиции)
+        ranked = np.lexsort((columns, -similarities, rows))
+        rows, columns, similarities = rows[ranked], columns[ranked], similarities[ranked]
+        row_starts = np.searchsorted(rows, rows, side="left")
+        rank = np.arange(len(rows)) - row_starts
+        top = rank < k
+        neighbor_positions[rows[top] + block_start, rank[top]] = columns[top]
+        neighbor_similarities[rows[top] + block_start, rank[top]] = similarities[top]
+    return neighbor_positions, neighbor_similarities
+
+
+def _weighted_row_sums(indptr: np.ndarray, columns: np.ndarray, weights: np.ndarray,
+                       factors: np.ndarray, vectors: Optional[np.ndarray] = None) -> np.ndarray:
+    """Для каждой строки CSR: Σ w · y_j (vectors=None) или Σ w · (y_j · v_row) · y_j; y = factors[columns]"""
+    n_rows, n_factors = len(indptr) - 1, factors.shape[1]
+    result = np.zeros((n_rows, n_factors), dtype=np.float32)
+    max_entries = max(1, ALS_BLOCK_BYTES // (4 * n_factors))
+    for start, stop in _row_blocks(indptr, max_entries):
+        lengths = np.diff(indptr[start:stop + 1])
+        nonempty = np.flatnonzero(lengths)
+        if not len(nonempty):
+            continue
+        entries = slice(indptr[start], indptr[stop])
+        block_factors = factors[columns[entries]]
+        block_weights = weights[entries]
+        if vectors is not None:
+            rows = np.repeat(np.arange(start, stop), lengths)
+            block_weights = block_weights * np.einsum("ij,ij->i", block_factors, vectors[rows])
+        offsets = (indptr[start:stop] - indptr[start])[nonempty]
+        result[start + nonempty] = np.add.reduceat(block_factors * block_weights[:, None], offsets, axis=0)
+    return result
+
+
+def _conjugate_gradient(solution: np.ndarray, factors: np.ndarray, indptr: np.ndarray, columns: np.ndarray,
+                        confidence: np.ndarray, preference: np.ndarray, regularization: float,
+                        steps: int = ALS_CG_STEPS) -> np.ndarray:
+    """Шаг ALS для всех строк сразу: несколько итераций сопряженных градиентов для систем
+    (YᵀY + Yᵀ(C − I)Y + λI) x = Yᵀ C p, начиная с текущего решения"""
+    gram = factors.T @ factors + regularization * np.eye(factors.shape[1], dtype=np.float32)
+
+    def product(vectors: np.ndarray) -> np.ndarray:
+        return vectors @ gram + _weighted_row_sums(indptr, columns, confidence - 1, factors, vectors)
+
+    x = solution.copy()
+    residual = _weighted_row_sums(indptr, columns, confidence * preference, factors) - product(x)
+    direction = residual.copy()
+    residual_norm = np.einsum("ij,ij->i", residual, residual)
+    for _ in range(steps):
+        step_product = product(direction)
+        curvature = np.einsum("ij,ij->i", direction, step_product)
+        alpha = np.divide(residual_norm, curvature, out=np.zeros_like(residual_norm), where=curvature > 1e-12)
+        x += alpha[:, None] * direction
+        residual -= alpha[:, None] * step_product
+        new_norm = np.einsum("ij,ij->i", residual, residual)
+        beta = np.divide(new_norm, residual_norm, out=np.zeros_like(new_norm), where=residual_norm > 1e-12)
+        direction = residual + beta[:, None] * direction
+        residual_norm = new_norm
+    return x
+
+
+def train_als(interactions: Interactions, factors: int = ALS_FACTORS, iterations: int = ALS_ITERATIONS,
+              regularization: float = ALS_REGULARIZATION, alpha: float = ALS_ALPHA,
+              seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Неявная ALS (Hu, Koren, Volinsky): факторы пользователей и книг (float32).
+
+    Каждая половина итерации решает системы всех пользователей (или всех книг)
+    сопряженными градиентами; произведения с Yᵀ(C − I)Y считаются по ненулевым
+    элементам блоками, поэтому время и память линейны по числу взаимодействий.
+    """
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(0, 0.01, (interactions.n_users, factors)).astype(np.float32)
+    item_factors = rng.normal(0, 0.01, (interactions.n_items, factors)).astype(np.float32)
+
+    confidence = (1 + alpha * interactions.strength).astype(np.float32)
+    preference = interactions.preference
+    item_indptr, item_users, order = interactions.transposed()
+    item_confidence, item_preference = confidence[order], preference[order]
+
+    for _ in range(iterations):
+        user_factors = _conjugate_gradient(user_factors, item_factors, interactions.indptr, interactions.items,
+                                           confidence, preference, regularization)
+        item_factors = _conjugate_gradient(item_factors, user_factors, item_indptr, item_users,
+                                           item_confidence, item_preference, regularization)
+    return user_factors, item_factors
+
+
+class CollaborativeModel:
+    """Обученная модель: соседи книг (item-item) и факторы книг (ALS); строка i — позиция i каталога"""
+
+    def __init__(self, row_ids: np.ndarray, neighbor_positions: np.ndarray, neighbor_similarities: np.ndarray,
+                 item_factors: np.ndarray, regularization: float = ALS_REGULARIZATION, alpha: float = ALS_ALPHA):
+        self.row_ids = row_ids  # id книги каждой строки: проверка соответствия каталогу
+        self.neighbor_positions = neighbor_positions
+        self.neighbor_similarities = neighbor_similarities
+        self.item_factors = item_factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self._gram = None
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.row_ids)
+
+    @classmethod
+    def train(cls, interactions: Interactions, row_ids: np.ndarray, k: int = CF_NEIGHBORS_K,
+              factors: int = ALS_FACTORS, iterations: int = ALS_ITERATIONS,
+              regularization: float = ALS_REGULARIZATION, alpha: float = ALS_ALPHA) -> "CollaborativeModel":
+        neighbor_positions, neighbor_similarities = item_neighbors(interactions, k)
+        _, item_factors = train_als(interactions, factors, iterations, regularization, alpha)
+        return cls(np.asarray(row_ids, dtype=np.int64), neighbor_positions, neighbor_similarities,
+                   item_factors, regularization, alpha)
+
+    def matches_catalog(self, book_ids: np.ndarray) -> bool:
+        """Строки модели — начало текущего каталога (книги только дописываются в конец)"""
+        return self.n_rows <= len(book_ids) and np.array_equal(self.row_ids, book_ids[:self.n_rows])
+
+    def item_item_scores(self, user: Interactions) -> np.ndarray:
+        """Σ схожесть × (оценка − середина шкалы) по спискам соседей оцененных пользователем книг"""
+        scores = np.zeros(self.n_rows, dtype=np.float64)
+        rated = ~np.isnan(user.ratings) & (user.items < self.n_rows)
+        items = user.items[rated]
+        if not len(items):
+            return scores
+        positions = np.asarray(self.neighbor_positions[items], dtype=np.int64)
+        contributions = self.neighbor_similarities[items] * (user.ratings[rated] - RATING_MIDPOINT)[:, None]
+        filled = positions >= 0
+        np.add.at(scores, positions[filled], contributions[filled])
+        return scores
+
+    def als_scores(self, user: Interactions) -> np.ndarray:
+        """Предсказания ALS: вектор пользователя решается заново по его текущим взаимодействиям
+        (fold-in), поэтому новые отзывы и пользователи учитываются без переобучения"""
+        known = user.items < self.n_rows
+        if not np.any(known):
+            return np.zeros(self.n_rows, dtype=np.float64)
+        if self._gram is None:
+            factors = np.asarray(self.item_factors, dtype=np.float64)
+            self._gram = factors.T @ factors
+
+        user_factors = np.asarray(self.item_factors[user.items[known]], dtype=np.float64)
+        confidence = 1 + self.alpha * user.strength[known].astype(np.float64)
+        preference = user.preference[known].astype(np.float64)
+        system = (self._gram + (user_factors.T * (confidence - 1)) @ user_factors
+                  + self.regularization * np.eye(len(self._gram)))
+        vector = np.linalg.solve(system, user_factors.T @ (confidence * preference))
+        return np.asarray(self.item_factors @ vector.astype(np.float32), dtype=np.float64)
+
+    def save(self, directory: str):
+        """Сохранение массивов .npy (запись во временные файлы и атомарная замена)"""
+        os.makedirs(directory, exist_ok=True)
+        arrays = {"row_ids": self.row_ids, "neighbors": self.neighbor_positions,
+                  "similarities": self.neighbor_similarities, "item_factors": self.item_factors}
+        for name, array in arrays.items():
+            path = os.path.join(directory, f"{name}.npy")
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(path + ".tmp", path)
+        with open(os.path.join(directory, "model.json"), "w", encoding="utf-8") as f:
+            json.dump({"regularization": self.regularization, "alpha": self.alpha}, f)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["CollaborativeModel"]:
+        """Модель из каталога (memory map); None, если ее нет"""
+        meta_path = os.path.join(directory, "model.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = [np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                  for name in ("row_ids", "neighbors", "similarities", "item_factors")]
+        return cls(*arrays, regularization=meta["regularization"], alpha=meta["alpha"])
+
+
+def load_events(reviews_file: str = "book_reviews.json", lists_file: str = "user_lists.json",
+                storage=None) -> Tuple[List[Tuple[str, int, int]], List[Tuple[str, str, int]]]:
+    """Оценки и списки всех пользователей из SQLite или из JSON-файлов приложения"""
+    if storage is not None:
+        return storage.get_all_ratings(), storage.get_all_list_books()
+
+    ratings, list_books = [], []
+    if os.path.exists(reviews_file):
+        with open(reviews_file, encoding="utf-8") as f:
+            for book_id, reviews in json.load(f).items():
+                ratings.extend((review["username"], int(book_id), review["rating"]) for review in reviews)
+    if os.path.exists(lists_file):
+        with open(lists_file, encoding="utf-8") as f:
+            for username, lists_dict in json.load(f).items():
+                for list_name, list_data in lists_dict.items():
+                    list_books.extend((username, list_name, book_id) for book_id in list_data.get("book_ids", []))
+    return ratings, list_books
+
+
+if __name__ == "__main__":
+    import time
+    from database import BookDatabase
+    from sqlite_storage import SQLiteStorage
+
+    parser = argparse.ArgumentParser(description="Обучение коллаборативной модели рекомендаций")
+    parser.add_argument("--catalog", default=None, help="Файл каталога (по умолчанию — найденный рядом)")
+    parser.add_argument("--sqlite", default=os.environ.get("LIBRO_SQLITE_PATH"),
+                        help="База SQLite (по умолчанию — JSON-файлы отзывов и списков)")
+    parser.add_argument("--out", default=CF_DIR)
+    parser.add_argument("--k", type=int, default=CF_NEIGHBORS_K)
+    parser.add_argument("--factors", type=int, default=ALS_FACTORS)
+    parser.add_argument("--iterations", type=int, default=ALS_ITERATIONS)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    storage = SQLiteStorage(args.sqlite) if args.sqlite else None
+    db = BookDatabase(args.catalog, storage=storage)
+    book_ids = db.books["id"].to_numpy()
+    interactions = Interactions.from_events(book_ids, *load_events(storage=storage))
+    model = CollaborativeModel.train(interactions, book_ids, args.k, args.factors, args.iterations)
+    model.save(args.out)
+    print(f"Модель по {interactions.nnz} взаимодействиям ({interactions.n_users} пользователей, "
+          f"{len(book_ids)} книг) сохранена в {args.out} за {time.perf_counter() - started:.1f} с")
\ No newline at end of file
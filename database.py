@@ -1,8 +1,14 @@
 import pandas as pd
+import numpy as np
 import json
-from typing import Dict, List, Optional
-from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
+from dataclasses import asdict, dataclass, field, fields
+from functools import lru_cache
 import streamlit as st
+from catalog_loader import CatalogLoader, find_catalog_file
+from multi_hot import MultiHotMatrix
+from text_search import TextIndex
+from fuzzy_search import TrigramIndex
 
 @dataclass
 class Book:
@@ -49,596 +55,306 @@ class Review:
     created_at: str
     likes: int = 0
 
+# Схема каталога совпадает с полями dataclass Book
+BOOK_COLUMNS = [book_field.name for book_field in fields(Book)]
+LIST_COLUMNS = ["tags", "plot_tropes", "mood", "themes", "style"]
+
+# Горячая проекция каталога: карточка книги и скалярные атрибуты для фильтров.
+# Загружается при старте и используется поиском, фильтрами и рекомендациями.
+CARD_COLUMNS = ["id", "title", "author", "main_genre", "sub_genre", "rating", "year", "pages", "cover_image"]
+FACET_COLUMNS = [
+    "character_age", "character_profession", "character_gender",
+    "setting_time_period", "setting_location", "setting_type", "pacing"
+]
+HOT_COLUMNS = CARD_COLUMNS + FACET_COLUMNS
+
+# Холодные колонки: описание и списковые атрибуты. Описание читается по одной книге
+# для страницы книги, списки — один раз при построении multi-hot матриц.
+COLD_COLUMNS = ["description"] + LIST_COLUMNS
+
+# Сколько детальных записей книг держать в LRU-кэше
+COLD_CACHE_SIZE = 256
+
+# Поля полнотекстового поиска
+TEXT_COLUMNS = ["title", "author", "description", "tags"]
+
+# Часто повторяющиеся строковые колонки хранятся как категории (словарь + целочисленные коды)
+CATEGORICAL_COLUMNS = [
+    "main_genre", "sub_genre", "author",
+    "character_gender", "character_profession",
+    "setting_location", "setting_time_period", "setting_type",
+    "pacing"
+]
+
+def encode_categorical_columns(books_df: pd.DataFrame,
+                               code_tables: Optional[Dict[str, pd.Index]] = None) -> Dict[str, pd.Index]:
+    """Словарное кодирование строковых колонок каталога (изменяет books_df на месте).
+    
+    Таблица кодов стабильна: известные значения сохраняют свои коды,
+    новые значения дописываются в конец словаря.
+    """
+    code_tables = dict(code_tables or {})
+    
+    for column in CATEGORICAL_COLUMNS:
+        if column not in books_df.columns:
+            continue
+        
+        known = code_tables.get(column, pd.Index([], dtype=object))
+        values = books_df[column].astype(object)
+        new_values = sorted(set(values.dropna().unique()) - set(known))
+        categories = known.append(pd.Index(new_values, dtype=object))
+        
+        books_df[column] = pd.Categorical(values, categories=categories)
+        code_tables[column] = categories
+    
+    return code_tables
+
+def parse_age_interval(age) -> Tuple[float, float]:
+    """Интервал возраста героя из строки каталога: «30-40», «40+» (без верхней границы), «17».
+    
+    Пустые и неразобранные значения дают (nan, nan): такие книги не попадают ни в один диапазон.
+    """
+    if pd.isna(age):
+        return np.nan, np.nan
+    
+    age_str = str(age)
+    try:
+        if "-" in age_str:
+            parts = age_str.split("-")
+            return float(int(parts[0].strip())), float(int(parts[1].strip()))
+        if "+" in age_str:
+            return float(int(age_str.replace("+", "").strip())), np.inf
+        age_value = float(int(age_str.strip()))
+        return age_value, age_value
+    except ValueError:
+        return np.nan, np.nan
+
+def add_age_interval_columns(books_df: pd.DataFrame):
+    """Числовые колонки age_min / age_max (изменяет books_df на месте).
+    
+    Каждое различное значение character_age разбирается один раз.
+    """
+    codes, values = pd.factorize(books_df["character_age"])
+    # Последняя строка таблицы — для пропусков (код -1)
+    bounds = np.array([parse_age_interval(value) for value in values] + [(np.nan, np.nan)], dtype=np.float64)
+    books_df["age_min"] = bounds[codes, 0]
+    books_df["age_max"] = bounds[codes, 1]
+
+def age_option_points(age_min: float, age_max: float) -> List[int]:
+    """Точки слайдера возраста для интервала: границы и середина, для «40+» — 40 и 50"""
+    if np.isnan(age_min):
+        return []
+    if np.isinf(age_max):
+        return [int(age_min), int(age_min) + 10]
+    return sorted({int(age_min), int(age_max), (int(age_min) + int(age_max)) // 2})
+
 class BookDatabase:
     """База данных книг и отзывов"""
     
-    def __init__(self):
-        self.books = self._create_sample_books()
+    def __init__(self, catalog_path: Optional[str] = None, storage=None):
+        self.storage = storage  # SQLiteStorage: каталог и поиск по id в SQLite
+        
+        if storage is None or storage.is_empty("books"):
+            catalog_path = catalog_path or find_catalog_file()
+            if catalog_path is None:
+                raise FileNotFoundError("Файл каталога книг не найден (books.parquet / books.arrow / books.jsonl)")
+            self.loader = CatalogLoader(catalog_path, BOOK_COLUMNS, LIST_COLUMNS)
+        
+        if storage is not None:
+            # Каталог импортируется в SQLite один раз, дальше колонки читаются из базы
+            if storage.is_empty("books"):
+                storage.import_books(self.loader.read_columns(BOOK_COLUMNS))
+            self.loader = storage
+        
+        self._added_books: List[Dict] = []  # книги, добавленные в файловый каталог во время работы
+        self.books = self._load_books(HOT_COLUMNS)  # горячая проекция каталога
+        self._catalog_rows = len(self.books)  # строк во внешнем файле каталога
+        self.catalog_version = 0  # меняется вместе с каталогом: по версии пересобираются общие индексы
+        self.code_tables = encode_categorical_columns(self.books)  # {колонка: значения по кодам}
+        add_age_interval_columns(self.books)  # возраст героя разбирается один раз при загрузке
         self.reviews = self._create_sample_reviews()
         self.user_lists = {}  # {username: {list_name: [book_ids]}}
+        self._id_index = self._build_id_index()  # {book_id: позиция строки в self.books}
+        self._attribute_matrices = {}  # {списковая колонка: MultiHotMatrix}, строятся при первом обращении
+        self._text_index: Optional[TextIndex] = None  # полнотекстовый индекс, строится при первом поиске
+        self._fuzzy_index: Optional[TrigramIndex] = None  # триграммы названий и авторов для подсказок
+        
+        # Детальные записи (описание и списки) читаются по одной книге через LRU-кэш
+        self._get_cold_record = lru_cache(maxsize=COLD_CACHE_SIZE)(self._load_cold_record)
+
+    def get_code(self, column: str, value) -> int:
+        """Целочисленный код значения категориальной колонки (-1, если значения нет в словаре)"""
+        categories = self.code_tables.get(column)
+        if categories is None or value not in categories:
+            return -1
+        return categories.get_loc(value)
+
+    def _build_id_index(self) -> Dict[int, int]:
+        """Построение индекса первичного ключа: id книги → позиция строки"""
+        return {int(book_id): position for position, book_id in enumerate(self.books["id"])}
+
+    def get_position(self, book_id: int) -> Optional[int]:
+        """Позиция книги в каталоге (строка DataFrame и матриц атрибутов)"""
+        return self._id_index.get(int(book_id))
+
+    def get_attribute_matrix(self, column: str) -> MultiHotMatrix:
+        """Multi-hot матрица спискового атрибута (tags, plot_tropes, mood, themes, style)"""
+        if column not in LIST_COLUMNS:
+            raise KeyError(column)
+        
+        if column not in self._attribute_matrices:
+            # Списки читаются один раз и хранятся только внутри матрицы
+            self._attribute_matrices[column] = MultiHotMatrix(self._load_books([column])[column])
+        return self._attribute_matrices[column]
+
+    def get_attribute_matrices(self) -> Dict[str, MultiHotMatrix]:
+        """Multi-hot матрицы всех списковых атрибутов"""
+        return {column: self.get_attribute_matrix(column) for column in LIST_COLUMNS}
+
+    def get_text_index(self) -> TextIndex:
+        """Полнотекстовый индекс по названию, автору, описанию и тегам (документ — позиция книги)"""
+        if self._text_index is None:
+            self._text_index = TextIndex(self._load_books(TEXT_COLUMNS).to_dict("records"))
+        return self._text_index
+
+    def get_fuzzy_index(self) -> TrigramIndex:
+        """Триграммный индекс различных названий и авторов (поиск с опечатками)"""
+        if self._fuzzy_index is None:
+            self._fuzzy_index = TrigramIndex(list(self.books["title"]) + list(self.code_tables["author"]))
+        return self._fuzzy_index
+
+    def suggest_titles_authors(self, query: str, limit: int = 5) -> List[str]:
+        """«Возможно, вы имели в виду»: названия и авторы, близкие к запросу с опечатками"""
+        return [text for text, _ in self.get_fuzzy_index().suggest(query, limit)]
+
+    def get_attribute_values(self, book_id: int, column: str) -> List[str]:
+        """Значения спискового атрибута книги (например, теги для карточки)"""
+        position = self.get_position(book_id)
+        if position is None:
+            return []
+        return self.get_attribute_matrix(column).row_terms(position)
+
+    def get_book(self, book_id: int) -> Optional[Dict]:
+        """Получение карточки книги по id через индекс, без просмотра всей таблицы"""
+        if self.storage is not None:
+            books = self.storage.get_books([book_id], HOT_COLUMNS)
+            return books[0] if books else None
+        
+        position = self._id_index.get(int(book_id))
+        if position is None:
+            return None
+        return self.books.iloc[position].to_dict()
+
+    def get_books(self, book_ids: List[int]) -> List[Dict]:
+        """Пакетное получение карточек книг по списку id (порядок сохраняется, неизвестные id пропускаются)"""
+        if self.storage is not None:
+            return self.storage.get_books(book_ids, HOT_COLUMNS)
+        
+        positions = [self._id_index[int(book_id)] for book_id in book_ids
+                     if int(book_id) in self._id_index]
+        if not positions:
+            return []
+        return self.books.iloc[positions].to_dict("records")
+
+    def get_book_details(self, book_id: int) -> Optional[Dict]:
+        """Полная запись книги: карточка из горячей проекции + описание и списки из холодного хранилища"""
+        book = self.get_book(book_id)
+        if book is None:
+            return None
+        
+        book.update(self._get_cold_record(int(book_id)))
+        return book
+
+    def _load_cold_record(self, book_id: int) -> Dict:
+        """Чтение холодных колонок одной книги (результат кэшируется в LRU)"""
+        if self.storage is not None:
+            return self.storage.get_books([book_id], COLD_COLUMNS)[0]
+        
+        position = self.get_position(book_id)
+        if position >= self._catalog_rows:
+            added = self._added_books[position - self._catalog_rows]
+            return {column: added[column] for column in COLD_COLUMNS}
+        return self.loader.read_rows([position], COLD_COLUMNS)[0]
+
+    def add_book(self, book: Book) -> int:
+        """Добавление книги в каталог; возвращает id книги.
+        
+        Книга дописывается в конец каталога (следующая позиция), поэтому уже
+        построенные матрицы атрибутов и полнотекстовый индекс дополняются без
+        перестройки. Новая версия каталога пересобирает общий движок фильтров.
+        В файловом режиме книга хранится только в памяти процесса.
+        """
+        record = asdict(book)
+        if not record["id"]:
+            record["id"] = int(self.books["id"].max()) + 1 if len(self.books) else 1
+        if int(record["id"]) in self._id_index:
+            raise ValueError(f"Книга с id {record['id']} уже есть в каталоге")
+        
+        if self.storage is not None:
+            self.storage.import_books(pd.DataFrame([record], columns=BOOK_COLUMNS))
+        else:
+            self._added_books.append(record)
+        
+        # Новая строка кодируется теми же таблицами кодов, новые значения дописываются в словари
+        row = pd.DataFrame([record], columns=HOT_COLUMNS)
+        self.code_tables = encode_categorical_columns(row, self.code_tables)
+        books = self.books.copy()
+        for column, categories in self.code_tables.items():
+            if column in books.columns:
+                books[column] = books[column].cat.set_categories(categories)
+        add_age_interval_columns(row)
+        self.books = pd.concat([books, row], ignore_index=True)
+        
+        self._id_index[int(record["id"])] = len(self.books) - 1
+        self._attribute_matrices = {
+            column: matrix.appended([record[column]]) for column, matrix in self._attribute_matrices.items()
+        }
+        if self._text_index is not None:
+            self._text_index.add_document({column: record[column] for column in TEXT_COLUMNS})
+        if self._fuzzy_index is not None:
+            self._fuzzy_index.add([record["title"], record["author"]])
+        self.catalog_version += 1
+        return int(record["id"])
 
     def get_user_reviews_from_manager(self, username: str, book_page_manager) -> pd.DataFrame:
         """Получение отзывов пользователя из book_page_manager"""
-        all_reviews = book_page_manager.reviews  # Это словарь {book_id: [reviews]}
-        
         user_reviews_list = []
-        for book_id, reviews in all_reviews.items():
-            for review in reviews:
-                if review["username"] == username:
-                    # Добавляем информацию о книге
-                    book_info = self.books[self.books["id"] == int(book_id)]
-                    if not book_info.empty:
-                        book_title = book_info.iloc[0]["title"]
-                        book_author = book_info.iloc[0]["author"]
-                    else:
-                        book_title = f"Книга ID: {book_id}"
-                        book_author = "Неизвестный автор"
-                    
-                    user_reviews_list.append({
-                        "id": review["id"],
-                        "book_id": int(book_id),
-                        "username": review["username"],
-                        "rating": review["rating"],
-                        "text": review["text"],
-                        "created_at": review["date"],
-                        "likes": review.get("likes", 0),
-                        "book_title": book_title,
-                        "book_author": book_author
-                    })
+        for book_id, review in book_page_manager.get_user_reviews(username):
+            # Добавляем информацию о книге
+            book_info = self.get_book(book_id)
+            if book_info is not None:
+                book_title = book_info["title"]
+                book_author = book_info["author"]
+            else:
+                book_title = f"Книга ID: {book_id}"
+                book_author = "Неизвестный автор"
+            
+            user_reviews_list.append({
+                "id": review["id"],
+                "book_id": book_id,
+                "username": review["username"],
+                "rating": review["rating"],
+                "text": review["text"],
+                "created_at": review["date"],
+                "likes": review.get("likes", 0),
+                "book_title": book_title,
+                "book_author": book_author
+            })
         
         return pd.DataFrame(user_reviews_list)
     
-    def _create_sample_books(self) -> pd.DataFrame:
-        """Создание демонстрационной базы книг с иерархией жанров"""
-        base_image_path = "images/"
-        books_data = [
-        {
-            "id": 1,
-            "title": "Мастер и Маргарита",
-            "author": "Михаил Булгаков",
-            "main_genre": "Классика",
-            "sub_genre": "Магический реализм",
-            "rating": 4.8,
-            "year": 1966,
-            "pages": 480,
-            "description": "Жарким майским вечером председатель правления МАССОЛИТ Михаил Берлиоз и молодой поэт Иван Бездомный отправились на Патриаршие пруды, чтобы обсудить: существовал ли Иисус Христос. Беседой литераторов заинтересовался некий импозантный гражданин-иностранец. Профессор Воланд стал уверять новых знакомых, что лично присутствовал на допросе бродяги Иешуа Га-Ноцри, который проводил Понтий Пилат.\
-            Александр Берлиоз и Иван Бездомный сочли собеседника сумасшедшим. А зря. Ведь через несколько часов Берлиоз попал под трамвай, а Иван отправился в сумасшедший дом, где и познакомился с мастером – возлюбленным Маргариты, будущей королевой бала у сатаны. Поэт узнает, что именно из-за романа о Понтии Пилате мастер оказался в сумасшедшем доме, а сама рукопись принесла писателю страшные несчастья…\
-            Тем временем Воланд со свитой весьма необычным образом исследуют, как изменились москвичи за последние годы. Это исследование надолго останется в памяти тех, кому довелось столкнуться с происками дьявола и его помощников, обладающих специфическим чувством юмора и особым взглядом на справедливость и милосердие…",
-            "cover_image": f"{base_image_path}book_1.png",
-            "tags": ["мистика", "Москва", "дьявол", "любовь", "сатира"],
-            "character_age": "30-40",
-            "character_gender": "оба пола",
-            "character_profession": "писатель",
-            "setting_time_period": "1930-е годы",
-            "setting_location": "Москва",
-            "setting_type": "город",
-            "plot_tropes": ["договор с дьяволом", "борьба добра и зла"],
-            "mood": ["мистическое", "философское"],
-            "pacing": "неравномерный",
-            "themes": ["добро и зло", "творчество"],
-            "style": ["сложный", "символический"]
-        },
-        {
-            "id": 2,
-            "title": "Сто лет одиночества",
-            "author": "Габриэль Гарсия Маркес",
-            "main_genre": "Классика",
-            "sub_genre": "Магический реализм",
-            "rating": 4.6,
-            "year": 1967,
-            "pages": 416,
-            "description": "Странная, поэтичная, причудливая история города Макондо, затерянного где-то в джунглях, – от сотворения до упадка.\
-            История рода Буэндиа – семьи, в которой чудеса столь повседневны, что на них даже не обращают внимания.\
-            Клан Буэндиа порождает святых и грешников, революционеров, героев и предателей, лихих авантюристов – и женщин, слишком прекрасных для обычной жизни.\
-            В нем кипят необычайные страсти, и происходят невероятные события.\
-            Однако эти невероятные события снова и снова становятся своеобразным «волшебным зеркалом», сквозь которое слушателю является подлинная история Латинской Америки…",
-            "cover_image": f"{base_image_path}book_2.jpg",
-            "tags": ["семейная сага", "магия", "одиночество", "Латинская Америка"],
-            "character_age": "40 - 50",
-            "character_gender": "мужчина",
-            "character_profession": "разные",
-            "setting_time_period": "XIX-XX века",
-            "setting_location": "Колумбия",
-            "setting_type": "изолированный город",
-            "plot_tropes": ["семейная сага", "цикличность", "пророчество"],
-            "mood": ["поэтическое", "мифическое"],
-            "pacing": "плавный",
-            "themes": ["одиночество", "время", "любовь"],
-            "style": ["магический реализм", "поэтический"]
-        },
-        {
-            "id": 3,
-            "title": "Убийство в Восточном экспрессе",
-            "author": "Агата Кристи",
-            "main_genre": "Детектив",
-            "sub_genre": "Классический детектив",
-            "rating": 4.8,
-            "year": 1934,
-            "pages": 256,
-            "description": "Трансъевропейский экспресс оказывается в снежном плену на пути следования из Стамбула в Кале. Сильный снегопад вынуждает машиниста остановить поезд в поле. Между тем в одном из купе обнаруживают тело убитого американца. За расследование убийства берётся необычный пассажир, знаменитый бельгийский детектив Эркюль Пуаро.",
-            "cover_image": f"{base_image_path}book_3.jpg",
-            "tags": ["поезд", "убийство", "расследование", "Пуаро"],
-            "character_age": "40-50",
-            "character_gender": "мужчина",
-            "character_profession": "детектив",
-            "setting_time_period": "1930-е годы",
-            "setting_location": "Поезд",
-            "setting_type": "поезд",
-            "plot_tropes": ["закрытое пространство", "расследование"],
-            "mood": ["интригующее", "логическое"],
-            "pacing": "средний",
-            "themes": ["правосудие", "логика", "преступление"],
-            "style": ["классический", "детективный"]
-        },
-        {
-            "id": 4,
-            "title": "Десять негритят",
-            "author": "Агата Кристи",
-            "main_genre": "Детектив",
-            "sub_genre": "Детектив-головоломка",
-            "rating": 4.9,
-            "year": 1939,
-            "pages": 320,
-            "description": "Некто приглашает десять гостей в особняк, расположенный на уединённом острове. Эти люди незнакомы друг с другом, у них нет ничего общего: разные профессии, социальный статус и жизненный опыт. Впрочем, главному режиссёру последующих событий известно, что у каждого из них в биографии есть страницы, о которых они предпочли бы забыть. Однако прошлое настигает их в образе невидимого убийцы, вершащего свой суд на преступниками, которые сумели избежать правосудия. Гости особняка один за другим погибают, повторяя судьбу героев известной считалочки про десять негритят… «И никого не стало».",
-            "cover_image": f"{base_image_path}book_4.jpg",
-            "tags": ["остров", "убийство", "тайна", "изоляция"],
-            "character_age": "20-40",
-            "character_gender": "оба пола",
-            "character_profession": "разные",
-            "setting_time_period": "1930-е годы",
-            "setting_location": "Остров",
-            "setting_type": "изолированный остров",
-            "plot_tropes": ["закрытое пространство", "поэтапные убийства"],
-            "mood": ["зловещее", "параноидальное"],
-            "pacing": "нарастающий",
-            "themes": ["вина", "возмездие", "смерть"],
-            "style": ["классический", "напряженный"]
-        },
-        {
-            "id": 5,
-            "title": "1984",
-            "author": "Джордж Оруэлл",
-            "main_genre": "Антиутопия",
-            "sub_genre": "Политическая проза",
-            "rating": 4.6,
-            "year": 1949,
-            "pages": 320,
-            "description": "Лондон, 1984-й год. Бывшая Великобритания является крупной провинцией Океании – государства с жесточайшим тоталитарным строем. Его жители лишены не только основных гражданских прав, но и какой бы то ни было индивидуальности. В партийном обществе, возглавляемом невидимым, но всевидящим Большим Братом, царят пуританские взгляды, запрещающие половые связи и любовные отношения, а также мощная пропаганда ненависти по отношению к внешним врагам – государствам Евразии и Остазии.\
-            Уинстон Смит, работающий в Министерстве Правды, ощущает глубинное внутреннее сопротивление политике партии, к которой принадлежит. Он сомневается абсолютно во всем и, чтобы разобраться в своих чувствах, начинает вести личный дневник, что уже само по себе является преступлением. А вскоре Уинстон осмеливается пойти на куда более опасный шаг, поддавшись романтическим чувствам к сотруднице по имени Джулия.",
-            "cover_image": f"{base_image_path}book_5.jpg",
-            "tags": ["тоталитаризм", "контроль", "бунт", "будущее"],
-            "character_age": "30-40",
-            "character_gender": "мужчина",
-            "character_profession": "госслужащий",
-            "setting_time_period": "Будущее",
-            "setting_location": "Лондон",
-            "setting_type": "город-государство",
-            "plot_tropes": ["тотальный контроль", "бунт личности"],
-            "mood": ["мрачное", "тревожное"],
-            "pacing": "напряженный",
-            "themes": ["свобода и контроль", "истина и ложь"],
-            "style": ["холодный", "аллегорический"]
-        },
-        {
-            "id": 6,
-            "title": "О дивный новый мир",
-            "author": "Олдос Хаксли",
-            "main_genre": "Антиутопия",
-            "sub_genre": "Научная фантастика",
-            "rating": 4.5,
-            "year": 1932,
-            "pages": 288,
-            "description": "«О дивный новый мир» – изысканная и остроумная антиутопия о генетически программируемом «обществе потребления», в котором разворачивается трагическая история Дикаря – «Гамлета» этого мира.",
-            "cover_image": f"{base_image_path}book_6.jpg",
-            "tags": ["будущее", "генетика", "контроль", "удовольствие"],
-            "character_age": "20-30",
-            "character_gender": "мужчина",
-            "character_profession": "специалист",
-            "setting_time_period": "Будущее",
-            "setting_location": "Лондон",
-            "setting_type": "футуристическое общество",
-            "plot_tropes": ["идеальное общество", "диссидент", "прогресс"],
-            "mood": ["ироничное", "тревожное"],
-            "pacing": "размеренный",
-            "themes": ["свобода воли", "технологии", "счастье"],
-            "style": ["сатирический", "философский"]
-        },
-        {
-            "id": 7,
-            "title": "Дюна",
-            "author": "Фрэнк Герберт",
-            "main_genre": "Фантастика",
-            "sub_genre": "Планетарный роман",
-            "rating": 4.7,
-            "year": 1965,
-            "pages": 704,
-            "description": "Действие романа происходит в далеком будущем, посреди разросшейся феодальной межгалактической империи, где планетарные вотчины контролируются благородными семействами, верными Императорскому дому Коррино.\
-            В центре повествования – молодой Пол Атрейдес, наследник герцога Лето Атрейдеса. Семья переезжает на планету Арракис, единственный во вселенной источник пряностей-меланжа. Автор создает масштабное полотно, где отображены сложные политические, религиозные, экологические, технологические вопросы. Здесь тесно переплетаются судьбы самого Пола, его семьи, коренных жителей Арракиса, Императора, могущественных гильдий и орденов. Великое противостояние сильных мира сего ведет к глобальным переменам, которые затронут все человечество.",
-            "cover_image": f"{base_image_path}book_7.jpg",
-            "tags": ["космос", "политика", "пустыня", "мессия", "экология"],
-            "character_age": "20-30",
-            "character_gender": "мужчина",
-            "character_profession": "наследник",
-            "setting_time_period": "Будущее",
-            "setting_location": "Другая планета",
-            "setting_type": "пустынная планета",
-            "plot_tropes": ["мессианский сюжет", "политический заговор"],
-            "mood": ["эпическое", "философское"],
-            "pacing": "медленный",
-            "themes": ["власть и религия", "экология", "судьба"],
-            "style": ["эпический", "политический"]
-        },
-        {
-            "id": 8,
-            "title": "Автостопом по галактике",
-            "author": "Дуглас Адамс",
-            "main_genre": "Фантастика",
-            "sub_genre": "Космическая комедия",
-            "rating": 4.7,
-            "year": 1979,
-            "pages": 224,
-            "description": "Дом Артура Дента пытаются снести, чтоб построить новую трассу. Артур пытается остановить снос, но тут выясняется, что его друг – пришелец с другой планеты, а Землю вот-вот уничтожат, чтобы построить гиперпространственную магистраль. Давно ставшая культовой смешная, сатирическая и глубокая книга с иллюстрациями британского иллюстратора Криса Ридделла.",
-            "cover_image": f"{base_image_path}book_8.jpg",
-            "tags": ["космос", "комедия", "путешествия", "абсурд"],
-            "character_age": "20-30",
-            "character_gender": "мужчина",
-            "character_profession": "низший клерк",
-            "setting_time_period": "Будущее",
-            "setting_location": "Космос",
-            "setting_type": "космические корабли",
-            "plot_tropes": ["неудачливый герой", "космические приключения"],
-            "mood": ["абсурдное", "ироничное"],
-            "pacing": "быстрый",
-            "themes": ["абсурдность бытия", "технологии", "дружба"],
-            "style": ["ироничный", "абсурдистский"]
-        },
-        {
-            "id": 9,
-            "title": "Гарри Поттер и философский камень",
-            "author": "Джоан Роулинг",
-            "main_genre": "Фэнтези",
-            "sub_genre": "Героическое фэнтези",
-            "rating": 4.9,
-            "year": 1997,
-            "pages": 400,
-            "description": "«Гарри Поттер и философский камень» — первая книга фэнтезийной саги Джоан Роулинг, рассказывающая о сироте Гарри Поттере, который в свой 11-й день рождения узнаёт, что он волшебник, и отправляется в Школу Чародейства и Волшебства Хогвартс, где обретает друзей, учится магии и раскрывает тайну загадочного камня, который пытается украсть возродившийся злой волшебник Волан-де-Морт, убивший родителей Гарри",
-            "cover_image": f"{base_image_path}book_9.jpg",
-            "tags": ["волшебство", "школа", "дружба", "сирота"],
-            "character_age": "0-18",
-            "character_gender": "мужчина",
-            "character_profession": "ученик",
-            "setting_time_period": "1990-е годы",
-            "setting_location": "Школа магии",
-            "setting_type": "магическая школа",
-            "plot_tropes": ["избранный герой", "тайное происхождение"],
-            "mood": ["приключенческое", "чудесное"],
-            "pacing": "динамичный",
-            "themes": ["добро против зла", "дружба", "взросление"],
-            "style": ["увлекательный", "детальный"]
-        },
-        {
-            "id": 10,
-            "title": "Властелин колец: Братство кольца",
-            "author": "Дж. Р. Р. Толкин",
-            "main_genre": "Фэнтези",
-            "sub_genre": "Эпическое фэнтези",
-            "rating": 4.9,
-            "year": 1954,
-            "pages": 432,
-            "description": "«Властелин колец: Братство кольца» — это начало эпической фэнтези-саги о хоббите Фродо Бэггинсе, которому предстоит уничтожить Кольцо Всевластья, выкованное Тёмным Властелином Сауроном, чтобы спасти Средиземье от порабощения, отправившись в опасное путешествие в Мордор вместе с разношёрстным Братством эльфов, гномов, людей и хоббитов, где главное — борьба добра и зла и испытание дружбы",
-            "cover_image": f"{base_image_path}book_10.png",
-            "tags": ["кольцо", "путешествие", "битвы", "Средиземье"],
-            "character_age": "20-30",
-            "character_gender": "мужчина",
-            "character_profession": "хоббит",
-            "setting_time_period": "Мифическое прошлое",
-            "setting_location": "Вымышленный мир",
-            "setting_type": "вымышленный мир",
-            "plot_tropes": ["опасное путешествие", "борьба добра и зла"],
-            "mood": ["эпическое", "героическое", "мрачное"],
-            "pacing": "медленный",
-            "themes": ["дружба", "жертва", "власть", "война"],
-            "style": ["эпический", "мифологический"]
-        },
-        {
-            "id": 11,
-            "title": "Три товарища",
-            "author": "Эрих Мария Ремарк",
-            "main_genre": "Классика",
-            "sub_genre": "Военная проза",
-            "rating": 4.7,
-            "year": 1936,
-            "pages": 480,
-            "description": "Трое друзей - Робби, отчаянный автогонщик Кестер и 'последний романтик' Лени прошли Первую мировую войну. Вернувшись в гражданскую жизнь, они основали небольшую автомастерскую. И хотя призраки прошлого преследуют их, они не унывают - ведь что может быть лучше дружбы, крепкой и верной, ради которой можно отдать последнее? Наверное, лишь только любовь, не знающая границ и пределов. Прекрасная и грустная Пат, нежная возлюбленная Робби, рассеивает мрак бессмысленности его существования. Однако обретенному счастью угрожают отголоски все той же войны - существующие уже не только в памяти и сознании героев, а суровым образом воплотившиеся в реальность...",
-            "cover_image": f"{base_image_path}book_11.jpg",
-            "tags": ["дружба", "любовь", "потеря", "война"],
-            "character_age": "30-40",
-            "character_gender": "мужчина",
-            "character_profession": "автомеханик",
-            "setting_time_period": "1920-е годы",
-            "setting_location": "Германия",
-            "setting_type": "город",
-            "plot_tropes": ["верная дружба", "любовь после потерь"],
-            "mood": ["меланхолическое", "трогательное"],
-            "pacing": "размеренный",
-            "themes": ["посттравматический синдром", "верность"],
-            "style": ["лиричный", "психологический"]
-        },
-        {
-            "id": 12,
-            "title": "Над пропастью во ржи",
-            "author": "Джером Д. Сэлинджер",
-            "main_genre": "Классика",
-            "sub_genre": "Роман воспитания",
-            "rating": 4.3,
-            "year": 1951,
-            "pages": 240,
-            "description": "Мальчика зовут Холден Колфилд, и живет он в повести «Над пропастью во ржи», до сих пор боготворимой миллионами «непонятых» подростков.\
-            Холден наделен «абсолютным нравственным слухом» — он мгновенно различает фальшь, с него словно содрана кожа, обнажены нервные окончания, его сверхчувствительность — особого рода радар, улавливающий то, мимо чего спокойно проходят другие. Но он не ангел и не «дитя цветов», а трудный подросток во всей красе: со своими переживаниями, волнениями и талантами, но и со всеми тараканами тоже. К тому же у Холдена есть еще и странная, но очень трогательная мечта...",
-            "cover_image": f"{base_image_path}book_12.jpg",
-            "tags": ["подросток", "бунт", "одиночество"],
-            "character_age": "0-18",
-            "character_gender": "мужчина",
-            "character_profession": "школьник",
-            "setting_time_period": "1940-е годы",
-            "setting_location": "Нью-Йорк",
-            "setting_type": "город",
-            "plot_tropes": ["бунт подростка", "поиск себя"],
-            "mood": ["бунтарское", "одинокое"],
-            "pacing": "средний",
-            "themes": ["взросление", "лицемерие", "изоляция"],
-            "style": ["исповедальный", "разговорный"]
-        },
-        {
-            "id": 13,
-            "title": "Портрет Дориана Грея",
-            "author": "Оскар Уайльд",
-            "main_genre": "Классика",
-            "sub_genre": "Философский роман",
-            "rating": 4.6,
-            "year": 1890,
-            "pages": 320,
-            "description": "Главный герой романа, красавец Дориан, — фигура двойственная, неоднозначная. Тонкий эстет и романтик становится безжалостным преступником. Попытка сохранить свою необычайную красоту и молодость оборачивается провалом. Вместо героя стареет его портрет — но это не может продолжаться вечно, и смерть Дориана расставляет все по своим местам.\
-            Роман Оскара Уайльда продолжает быть очень актуальным и сегодня — разве погоня за вечной молодостью порой не оборачивается потерей своего истинного лица?",
-            "cover_image": f"{base_image_path}book_13.jpg",
-            "tags": ["красота", "разврат", "портрет", "договор"],
-            "character_age": "20-30",
-            "character_gender": "мужчина",
-            "character_profession": "аристократ",
-            "setting_time_period": "Викторианская эпоха",
-            "setting_location": "Лондон",
-            "setting_type": "город",
-            "plot_tropes": ["договор с дьяволом", "двойник", "падение"],
-            "mood": ["декадентское", "мрачное", "эстетское"],
-            "pacing": "средний",
-            "themes": ["красота и разложение", "мораль", "искусство"],
-            "style": ["эстетский", "афористичный"]
-        },
-        {
-            "id": 14,
-            "title": "Метро 2033",
-            "author": "Дмитрий Глуховский",
-            "main_genre": "Постапокалипсис",
-            "sub_genre": "Научная фантастика",
-            "rating": 4.5,
-            "year": 2005,
-            "pages": 384,
-            "description": "Постапокалиптический роман о выживании в московской подземке. Ядерная война уничтожила почти все человечество, выжившие скрываются в метро. Москва стала одним из центров скоплений людей, но об организованном выживании речи не идет. Часть станций пришла в негодность сразу после войны, другие поделены между группировками. Каждый выживает, как может, в суровых условиях подземного мрака.\
-            Но что еще хуже: в этом мраке обитают «черные» – мутанты, а в спертом воздухе витают пожирающие аномалии. Главный герой Артем попадает в эпицентр необъяснимых событий. Вместе с друзьями он отправляется в путь по опасным тоннелям, где смерть настигает буквально из ниоткуда. Тем, кто останется в живых, предстоит выяснить загадку черных и, возможно, спасти человечество.",
-            "cover_image": f"{base_image_path}book_14.jpg",
-            "tags": ["постапокалипсис", "метро", "мутанты"],
-            "character_age": "20-30",
-            "character_gender": "мужчина",
-            "character_profession": "военный",
-            "setting_time_period": "Будущее",
-            "setting_location": "Москва",
-            "setting_type": "метро",
-            "plot_tropes": ["путешествие героя", "выживание"],
-            "mood": ["мрачное", "гнетущее"],
-            "pacing": "напряженный",
-            "themes": ["выживание", "страх", "человечность"],
-            "style": ["атмосферный", "жесткий"]
-        },
-        {
-            "id": 15,
-            "title": "Старик и море",
-            "author": "Эрнест Хемингуэй",
-            "main_genre": "Классика",
-            "sub_genre": "Повесть",
-            "rating": 4.4,
-            "year": 1952,
-            "pages": 128,
-            "description": "«Старик и море». Повесть посвящена «трагическому стоицизму»: перед жестокостью мира человек, даже проигрывая, должен сохранять мужество и достоинство.\
-            Автобиографическая повесть «Зеленые холмы Африки» – одно из произведений, заложивших основу мифа о «папе Хэме» – смелом до безумия авантюристе-интеллектуале, любимце женщин, искателе сильных ощущений и новых впечатлений.",
-            "cover_image": f"{base_image_path}book_15.jpg",
-            "tags": ["рыбак", "море", "борьба", "одиночество"],
-            "character_age": "50-60",
-            "character_gender": "мужчина",
-            "character_profession": "рыбак",
-            "setting_time_period": "1940-е годы",
-            "setting_location": "Куба",
-            "setting_type": "море",
-            "plot_tropes": ["борьба с природой", "нравственная победа"],
-            "mood": ["суровое", "философское"],
-            "pacing": "медленный",
-            "themes": ["человек и природа", "упорство", "достоинство"],
-            "style": ["лаконичный", "символический"]
-        },
-        {
-            "id": 16,
-            "title": "Анна Каренина",
-            "author": "Лев Толстой",
-            "main_genre": "Классика",
-            "sub_genre": "Роман",
-            "rating": 4.7,
-            "year": 1877,
-            "pages": 864,
-            "description": "Классика актуальна в любую историческую эпоху, потому что в ней затронуты темы, близкие лично каждому человеку. И автору не обязательно давать прямые ответы на животрепещущие вопросы; даже лучше эту возможность предоставить читателю. Толстой и не дает их. Напротив, афористично введя нас в курс дела единственным предложением «Все счастливые семьи похожи друг на друга, каждая несчастливая семья несчастлива по-своему», тут же все смешивает, даже не подбирая особых слов: «Все смешалось в доме Облонских». А дальше — дело читателя пройти всеми тропками сюжета с ношей собственного жизненного опыта и самому отыскать эти ответы. У каждого они разные. И это классика.",
-            "cover_image": f"{base_image_path}book_16.png",
-            "tags": ["любовь", "измена", "общество", "трагедия"],
-            "character_age": "20-30",
-            "character_gender": "женщина",
-            "character_profession": "аристократка",
-            "setting_time_period": "XIX век",
-            "setting_location": "Россия",
-            "setting_type": "город и деревня",
-            "plot_tropes": ["любовный треугольник", "падение женщины"],
-            "mood": ["трагическое", "драматическое"],
-            "pacing": "размеренный",
-            "themes": ["любовь и долг", "семья", "общество"],
-            "style": ["психологический", "реалистичный"]
-        },
-        {
-            "id": 17,
-            "title": "Улисс",
-            "author": "Джеймс Джойс",
-            "main_genre": "Модернизм",
-            "sub_genre": "Роман",
-            "rating": 4.2,
-            "year": 1922,
-            "pages": 730,
-            "description": "Джеймс Джойс (1882—1941) — великий ирландский писатель, классик и одновременно разрушитель классики с ее канонами, человек, которому более, чем кому-либо, обязаны своим рождением новые литературные школы и направления XX века. Роман «Улисс» (1922) — главное произведение писателя, определившее пути развития искусства прозы и не раз признанное лучшим, значительнейшим романом за всю историю этого жанра.\
-            По замыслу автора, «Улисс» — рассказ об одном дне, прожитом одним обывателем из одного некрупного европейского городка, — вместил в себя всю литературу со всеми ее стилями и техниками письма и выразил все, что искусство способно сказать о человеке.",
-            "cover_image": f"{base_image_path}book_17.jpg",
-            "tags": ["Дублин", "один день", "сознание", "сложный"],
-            "character_age": "30-40",
-            "character_gender": "мужчина",
-            "character_profession": "агент по рекламе",
-            "setting_time_period": "1900-е года",
-            "setting_location": "Дублин",
-            "setting_type": "город",
-            "plot_tropes": ["один день жизни", "аллюзии"],
-            "mood": ["абсурдное", "рефлексивное"],
-            "pacing": "медленный",
-            "themes": ["обыденность", "память", "искусство"],
-            "style": ["поток сознания", "экспериментальный"]
-        },
-        {
-            "id": 18,
-            "title": "Шерлок Холмс. Собака Баскервилей",
-            "author": "Артур Конан Дойл",
-            "main_genre": "Детектив",
-            "sub_genre": "Классический детектив",
-            "rating": 4.8,
-            "year": 1902,
-            "pages": 256,
-            "description": "Английский врач и писатель сэр Артур Конан Дойль известен всему миру как непревзойденный мастер детективного жанра, автор множества произведений о гениальном сыщике Шерлоке Холмсе и его верном друге докторе Ватсоне. Классические переводы этих рассказов и романов, делавшиеся давно и множеством разных переводчиков, страдают известными недостатками: расхождения, пропуски, откровенные ошибки. Вашему вниманию предлагается заключительный том (роман «Собака Баскервилей», сборники «Его прощальный поклон» и «Архив Шерлока Холмса») из давно готовившегося четырехтомника с полным переводом всего холмсовского канона. Это воистину уникальное издание: все произведения цикла переведены заново Людмилой Бриловой и Сергеем Сухаревым — мастерами, чьи переводы Кадзуо Исигуро и Рэя Брэдбери, Фрэнсиса Скотта Фицджеральда и Чарльза Паллисера, Томаса Де Квинси, Германа Мелвилла и других давно стали классическими. При этом в каждый том включено множество дополнительных материалов: предисловия к ранним публикациям, воспоминания Конан Дойля, касающиеся тех или иных произведений, некоторые интервью писателя. Плюс каждый том снабжен обширнейшими комментариями и богато иллюстрирован лучшими классическими рисунками.\
-            В данную книгу включен полный комплект иллюстраций, сопровождавших исходную публикацию в журнале «Стрэнд» романа «Собака Баскервилей» и всех рассказов из обоих сборников, — иллюстраций Сидни Пэджета, Уолтера Пэджета, Гилберта Холидея и других художников.",
-            "cover_image": f"{base_image_path}book_18.jpg",
-            "tags": ["Холмс", "расследование", "призрак", "деревня"],
-            "character_age": "40-50",
-            "character_gender": "мужчина",
-            "character_profession": "детектив",
-            "setting_time_period": "Викторианская эпоха",
-            "setting_location": "Англия",
-            "setting_type": "сельская местность",
-            "plot_tropes": ["семейное проклятие", "расследование"],
-            "mood": ["загадочное", "готическое"],
-            "pacing": "средний",
-            "themes": ["логика против суеверий", "наследство"],
-            "style": ["классический", "атмосферный"]
-        },
-        {
-            "id": 19,
-            "title": "Колыбель для кошки",
-            "author": "Курт Воннегут",
-            "main_genre": "Научная фантастика",
-            "sub_genre": "Сатира",
-            "rating": 4.4,
-            "year": 1963,
-            "pages": 288,
-            "description": "Послушайте — когда-то, две жены тому назад, двести пятьдесят тысяч сигарет тому назад, три тысячи литров спиртного назад… Тогда, когда все были молоды… Послушайте — мир вращался, богатые изнывали от глупости и скуки, бедным оставалось одно — быть СВОБОДНЫМИ и УМНЫМИ. Правда была неправдоподобнее всякого вымысла. Женщины были злы и красивы, а мужчины — несчастны и полны глупых надежд. И крутилась, крутилась жизнь, запутывалась все сильнее — как дикая, странная игра под названием «КОЛЫБЕЛЬ ДЛЯ КОШКИ»…",
-            "cover_image": f"{base_image_path}book_19.jpg",
-            "tags": ["сатира", "конец света", "наука", "религия"],
-            "character_age": "30-40",
-            "character_gender": "мужчина",
-            "character_profession": "журналист",
-            "setting_time_period": "Холодная война",
-            "setting_location": "Вымышленная страна",
-            "setting_type": "островное государство",
-            "plot_tropes": ["опасное изобретение", "сатира на общество"],
-            "mood": ["ироничное", "циничное", "абсурдное"],
-            "pacing": "быстрый",
-            "themes": ["наука и мораль", "религия", "абсурд войны"],
-            "style": ["сатирический", "черный юмор"]
-        },
-        {
-            "id": 20,
-            "title": "Атлант расправил плечи",
-            "author": "Айн Рэнд",
-            "main_genre": "Философский роман",
-            "sub_genre": "Антиутопия",
-            "rating": 4.5,
-            "year": 1957,
-            "pages": 1168,
-            "description": "К власти в США приходят социалисты и правительство берет курс на «равные возможности», считая справедливым за счет талантливых и состоятельных сделать богатыми никчемных и бесталанных.\
-            Гонения на бизнес приводят к разрушению экономики, к тому же один за другим при загадочных обстоятельствах начинают исчезать талантливые люди и лучшие предприниматели.\
-            Главные герои романа стальной король Хэнк Риарден и вице-президент железнодорожной компании Дагни Таггерт тщетно пытаются противостоять трагическим событиям. Вместо всеобщего процветания общество погружается в апатию и хаос.",
-            "cover_image": f"{base_image_path}book_20.jpg",
-            "tags": ["капитализм", "индивидуализм", "забастовка", "антиутопия", "бизнес"],
-            "character_age": "30-40",
-            "character_gender": "оба пола",
-            "character_profession": "промышленники",
-            "setting_time_period": "1950-е годы",
-            "setting_location": "США",
-            "setting_type": "индустриальное",
-            "plot_tropes": ["забастовка гениев", "крушение системы"],
-            "mood": ["дидактическое", "интеллектуальное"],
-            "pacing": "медленный",
-            "themes": ["индивидуализм", "разум", "свобода"],
-            "style": ["риторический", "идейный"]
-        },
-        {
-            "id": 21,
-            "title": "Тайна Эдвина Друда",
-            "author": "Чарльз Диккенс",
-            "main_genre": "Детектив",
-            "sub_genre": "Готический детектив",
-            "rating": 4.3,
-            "year": 1870,
-            "pages": 288,
-            "description": "Последний, неоконченный роман Диккенса. В тихом соборном городе Клойстерхэм опекун Эдвин Друд и его друг Невил Ландлесс влюблены в одну девушку. Между молодыми людьми вспыхивает ссора, а вскоре Эдвин Друд таинственно исчезает в бурную рождественскую ночь. Город полнится слухами о проклятии, тяготеющем над семьей Друдов, а местный чудак-священник, мистер Криспаркл, начинает собственное расследование.",
-            "cover_image": f"{base_image_path}book_21.jpg",
-            "tags": ["неоконченный роман", "проклятие", "соборный город", "исчезновение"],
-            "character_age": "20-30",
-            "character_gender": "мужчина",
-            "character_profession": "аристократ",
-            "setting_time_period": "Викторианская эпоха",
-            "setting_location": "Англия",
-            "setting_type": "город",
-            "plot_tropes": ["семейное проклятие", "таинственное исчезновение", "неоконченный роман"],
-            "mood": ["загадочное", "мрачное", "готическое"],
-            "pacing": "средний",
-            "themes": ["тайна", "религия", "фатум"],
-            "style": ["классический", "незавершенный"]
-    },
-    {
-            "id": 22,
-            "title": "Падение дома Ашеров",
-            "author": "Эдгар Аллан По",
-            "main_genre": "Ужасы",
-            "sub_genre": "Готическая проза",
-            "rating": 4.6,
-            "year": 1839,
-            "pages": 64,
-            "description": "Рассказ о роковой болезни леди Мадлен и её брата Родерика Ашера, последних отпрысков древнего и угасающего рода. Наследственная болезнь — лишь внешнее проявление глубокого духовного и физического вырождения, настоящего проклятия, тяготеющего над семьей и её мрачным родовым поместьем. Друг детства Родерика становится свидетелем ужасающей кульминации этого проклятия.",
-            "cover_image": f"{base_image_path}book_22.jpg",
-            "tags": ["готика", "ужасы", "проклятие", "вырождение", "поместье"],
-            "character_age": "30-40",
-            "character_gender": "мужчина",
-            "character_profession": "аристократ",
-            "setting_time_period": "Викторианская эпоха",
-            "setting_location": "Англия",
-            "setting_type": "замок/поместье",
-            "plot_tropes": ["семейное проклятие", "вырождение рода", "живой дом"],
-            "mood": ["гнетущее", "декадентское", "ужасающее"],
-            "pacing": "нарастающий",
-            "themes": ["безумие", "смерть", "изоляция", "наследственность"],
-            "style": ["поэтичный", "атмосферный", "мрачный"]
-        }   
-    ]
+    def _load_books(self, columns: List[str]) -> pd.DataFrame:
+        """Загрузка колонок каталога из внешнего файла (с книгами, добавленными во время работы)"""
+        books_df = self.loader.read_columns(columns)
+        if self._added_books:
+            books_df = pd.concat([books_df, pd.DataFrame(self._added_books, columns=columns)], ignore_index=True)
+        return books_df
     
-        return pd.DataFrame(books_data)
+    def iter_columns(self, columns: List[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+        """Потоковое чтение колонок каталога порциями, в порядке позиций (с добавленными книгами)"""
+        yield from self.loader.iter_columns(columns, chunk_size)
+        for start in range(0, len(self._added_books), chunk_size):
+            yield pd.DataFrame(self._added_books[start:start + chunk_size], columns=columns)
     
     def _create_sample_reviews(self) -> pd.DataFrame:
         """Создание демонстрационных отзывов"""
@@ -675,8 +391,8 @@ class BookDatabase:
             "character_professions": sorted(books_df["character_profession"].dropna().unique()),
             "settings": sorted(books_df["setting_location"].dropna().unique()),
             "time_periods": sorted(books_df["setting_time_period"].dropna().unique()),
-            "moods": sorted(set([m for moods in books_df["mood"] for m in moods])),
-            "tropes": sorted(set([t for tropes in books_df["plot_tropes"] for t in tropes]))
+            "moods": self.get_attribute_matrix("mood").present_terms(),
+            "tropes": self.get_attribute_matrix("plot_tropes").present_terms()
         }
     
     def get_reviews_for_user(self, username: str) -> pd.DataFrame:
@@ -0,0 +1,339 @@
+"""Векторы описаний книг: TF-IDF и, при желании, усеченное SVD до плотных векторов.
+
+Строится офлайн потоково: описания читаются из каталога порциями и целиком в
+памяти не собираются (частоты терминов — первый проход, строки TF-IDF пишутся
+на диск вторым). Матрица хранится массивами .npy (CSR), плотные векторы —
+отдельным файлом; приложение открывает их через memory map. Запуск:
+    python description_vectors.py --catalog books.jsonl --out description_vectors --components 128
+"""
+import argparse
+import json
+import math
+import os
+import tempfile
+from collections import Counter
+from typing import Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from filter_index import top_k
+from text_search import STOP_WORDS, TOKEN_PATTERN, stem
+
+DESCRIPTION_DIR = "description_vectors"
+
+# Книг в порции потокового чтения
+CHUNK_SIZE = 20_000
+
+# Словарь: термин хотя бы в MIN_DF описаниях и не больше чем в MAX_DF_RATIO из них
+MIN_DF = 2
+MAX_DF_RATIO = 0.5
+MAX_FEATURES = 200_000
+
+# Усеченное SVD (рандомизированное): запас измерений и итерации уточнения подпространства
+SVD_OVERSAMPLES = 16
+SVD_ITERATIONS = 2
+
+# Частые слова описаний без смысловой нагрузки (в дополнение к служебным словам поиска)
+DESCRIPTION_STOP_WORDS = STOP_WORDS | frozenset({
+    "он", "она", "оно", "они", "его", "ее", "их", "ему", "ей", "им", "это", "этот", "эта", "эти",
+    "тот", "та", "те", "так", "там", "тут", "все", "всё", "весь", "уже", "еще", "был", "была",
+    "было", "были", "быть", "есть", "при", "под", "над", "про", "через", "когда", "который",
+    "которая", "которое", "которые", "свой", "своей", "своих", "только", "даже", "чтобы", "себя",
+})
+
+# Порции (id книг, описания): фабрика вызывается заново на каждый проход
+ChunkSource = Callable[[], Iterable[Tuple[Sequence[int], Sequence[str]]]]
+
+
+def description_terms(text) -> List[str]:
+    """Термины описания: слова без стоп-слов, со стеммингом"""
+    if not isinstance(text, str):
+        return []
+    return [stem(token) for token in TOKEN_PATTERN.findall(text.lower().replace("ё", "е"))
+            if token not in DESCRIPTION_STOP_WORDS]
+
+
+def catalog_chunks(book_db, chunk_size: int = CHUNK_SIZE) -> ChunkSource:
+    """Порции описаний каталога в порядке позиций"""
+    def chunks():
+        for chunk in book_db.iter_columns(["id", "description"], chunk_size):
+            yield chunk["id"].tolist(), chunk["description"].tolist()
+    return chunks
+
+
+def _open_array(directory: str, name: str, dtype, shape) -> np.ndarray:
+    return np.lib.format.open_memmap(os.path.join(directory, f"{name}.npy.tmp"), mode="w+", dtype=dtype, shape=shape)
+
+
+def _commit_array(directory: str, name: str, array: np.ndarray):
+    """Сброс на диск и атомарная замена прежнего файла"""
+    array.flush()
+    path = os.path.join(directory, f"{name}.npy")
+    os.replace(path + ".tmp", path)
+
+
+def _row_blocks(indptr: np.ndarray, max_entries: int) -> Iterator[Tuple[int, int]]:
+    """Последовательные блоки строк CSR, в каждом не больше max_entries элементов (но не меньше строки)"""
+    start, n_rows = 0, len(indptr) - 1
+    while start < n_rows:
+        stop = int(np.searchsorted(indptr, indptr[start] + max_entries, side="right")) - 1
+        stop = min(max(stop, start + 1), n_rows)
+        yield start, stop
+        start = stop
+
+
+def build_tfidf(source: ChunkSource, directory: str, min_df: int = MIN_DF, max_df_ratio: float = MAX_DF_RATIO,
+                max_features: int = MAX_FEATURES) -> int:
+    """TF-IDF описаний в directory: словарь, idf, CSR (indptr, indices, data) и id книг строк.
+
+    Вес термина — (1 + ln tf) · idf, строки нормированы по длине (L2), поэтому
+    скалярное произведение строк — косинус. Возвращает число книг.
+    """
+    os.makedirs(directory, exist_ok=True)
+    # 1. Документная частота терминов
+    document_frequency: Counter = Counter()
+    n_docs = 0
+    for _, texts in source():
+        for text in texts:
+            document_frequency.update(set(description_terms(text)))
+        n_docs += len(texts)
+
+    max_df = max(min_df, int(max_df_ratio * n_docs))
+    terms = [term for term, df in document_frequency.items() if min_df <= df <= max_df]
+    terms = sorted(sorted(terms), key=document_frequency.__getitem__, reverse=True)[:max_features]
+    vocabulary = {term: code for code, term in enumerate(terms)}
+    idf = np.array([math.log((1 + n_docs) / (1 + document_frequency[term])) + 1 for term in terms], dtype=np.float32)
+    del document_frequency
+
+    # 2. Строки TF-IDF дописываются в сырые файлы, затем копируются в .npy через memory map
+    indptr = _open_array(directory, "indptr", np.int64, (n_docs + 1,))
+    indptr[0] = 0
+    row_ids = _open_array(directory, "row_ids", np.int64, (n_docs,))
+    row, nnz = 0, 0
+    with tempfile.TemporaryDirectory(dir=directory) as scratch:
+        indices_path, data_path = os.path.join(scratch, "indices.bin"), os.path.join(scratch, "data.bin")
+        with open(indices_path, "wb") as indices_file, open(data_path, "wb") as data_file:
+            for book_ids, texts in source():
+                chunk_indices, chunk_data, chunk_lengths = [], [], []
+                for text in texts:
+                    codes = [vocabulary[term] for term in description_terms(text) if term in vocabulary]
+                    codes, counts = np.unique(np.asarray(codes, dtype=np.int32), return_counts=True)
+                    weights = (1 + np.log(counts)).astype(np.float32) * idf[codes]
+                    norm = np.linalg.norm(weights)
+                    chunk_indices.append(codes)
+                    chunk_data.append(weights / norm if norm > 0 else weights)
+                    chunk_lengths.append(len(codes))
+                row_ids[row:row + len(texts)] = book_ids
+                indptr[row + 1:row + len(texts) + 1] = nnz + np.cumsum(chunk_lengths)
+                if chunk_indices:
+                    indices_file.write(np.concatenate(chunk_indices).astype(np.int32).tobytes())
+                    data_file.write(np.concatenate(chunk_data).astype(np.float32).tobytes())
+                row += len(texts)
+                nnz += int(np.sum(chunk_lengths))
+
+        for name, path, dtype in (("indices", indices_path, np.int32), ("data", data_path, np.float32)):
+            array = _open_array(directory, name, dtype, (nnz,))
+            if nnz:
+                raw = np.memmap(path, dtype=dtype, mode="r", shape=(nnz,))
+                for start in range(0, nnz, 16 * CHUNK_SIZE):
+                    array[start:start + 16 * CHUNK_SIZE] = raw[start:start + 16 * CHUNK_SIZE]
+                del raw
+            _commit_array(directory, name, array)
+
+    _commit_array(directory, "indptr", indptr)
+    _commit_array(directory, "row_ids", row_ids)
+    np.save(os.path.join(directory, "idf.npy"), idf)
+    with open(os.path.join(directory, "vocabulary.json"), "w", encoding="utf-8") as f:
+        json.dump(terms, f, ensure_ascii=False)
+    return n_docs
+
+
+def _block_product(indptr: np.ndarray, indices: np.ndarray, data: np.ndarray,
+                   start: int, stop: int, right: np.ndarray) -> np.ndarray:
+    """Блок строк [start, stop) разреженной матрицы, умноженный на плотную матрицу right"""
+    lengths = np.diff(indptr[start:stop + 1])
+    result = np.zeros((stop - start, right.shape[1]), dtype=np.float64)
+    nonempty = np.flatnonzero(lengths)
+    if len(nonempty):
+        entries = slice(indptr[start], indptr[stop])
+        weighted = right[indices[entries]] * data[entries, None]
+        result[nonempty] = np.add.reduceat(weighted, (indptr[start:stop] - indptr[start])[nonempty], axis=0)
+    return result
+
+
+def build_svd(directory: str, components: int, iterations: int = SVD_ITERATIONS, seed: int = 0,
+              block_entries: int = 2**18):
+    """Плотные векторы описаний (float32, L2-нормированные) рандомизированным усеченным SVD.
+
+    Подпространство правых сингулярных векторов уточняется на стороне словаря
+    (термины × измерения), а матрица описаний читается блоками строк — в памяти
+    только блок и матрицы размера словаря.
+    """
+    indptr, indices, data = (np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                             for name in ("indptr", "indices", "data"))
+    n_docs, n_terms = len(indptr) - 1, len(np.load(os.path.join(directory, "idf.npy")))
+    size = min(components + SVD_OVERSAMPLES, n_terms)
+    basis = np.random.default_rng(seed).standard_normal((n_terms, size))
+
+    for _ in range(iterations):
+        # basis ← orth(Aᵀ A basis): один проход по строкам
+        product = np.zeros((n_terms, size))
+        for start, stop in _row_blocks(indptr, block_entries):
+            block = _block_product(indptr, indices, data, start, stop, basis)
+            entries = slice(indptr[start], indptr[stop])
+            rows = np.repeat(np.arange(stop - start), np.diff(indptr[start:stop + 1]))
+            # Aᵀ блока: вклады строк в термины через сортировку по термину
+            order = np.argsort(indices[entries], kind="stable")
+            terms = np.asarray(indices[entries])[order]
+            contributions = block[rows[order]] * np.asarray(data[entries])[order, None]
+            if len(terms):
+                boundaries = np.flatnonzero(np.r_[True, terms[1:] != terms[:-1]])
+                product[terms[boundaries]] += np.add.reduceat(contributions, boundaries, axis=0)
+        basis, _ = np.linalg.qr(product)
+
+    # Малое SVD через матрицу Грама проекций: A·basis = U S Wᵀ
+    gram = np.zeros((basis.shape[1], basis.shape[1]))
+    for start, stop in _row_blocks(indptr, block_entries):
+        block = _block_product(indptr, indices, data, start, stop, basis)
+        gram += block.T @ block
+    eigenvalues, eigenvectors = np.linalg.eigh(gram)
+    rotation = basis @ eigenvectors[:, np.argsort(eigenvalues)[::-1][:components]]
+
+    vectors = _open_array(directory, "vectors", np.float32, (n_docs, rotation.shape[1]))
+    for start, stop in _row_blocks(indptr, block_entries):
+        block = _block_product(indptr, indices, data, start, stop, rotation)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        vectors[start:stop] = np.divide(block, norms, out=np.zeros_like(block), where=norms > 0)
+    _commit_array(directory, "vectors", vectors)
+
+
+def build(source: ChunkSource, directory: str = DESCRIPTION_DIR, components: Optional[int] = None):
+    """TF-IDF и (если задано components) плотные векторы; метаданные пишутся последними"""
+    meta_path = os.path.join(directory, "meta.json")
+    if os.path.exists(meta_path):
+        os.remove(meta_path)  # недостроенные векторы не загружаются
+    n_docs = build_tfidf(source, directory)
+    if components:
+        build_svd(directory, components)
+    elif os.path.exists(os.path.join(directory, "vectors.npy")):
+        os.remove(os.path.join(directory, "vectors.npy"))
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"n_docs": n_docs, "components": components}, f)
+
+
+class DescriptionVectors:
+    """Векторы описаний (memory map): строка i — книга в позиции i каталога на момент построения"""
+
+    def __init__(self, row_ids: np.ndarray, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray,
+                 n_terms: int, vectors: Optional[np.ndarray] = None):
+        self.row_ids = row_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.n_terms = n_terms
+        self.vectors = vectors  # плотные векторы SVD (None — только TF-IDF)
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.row_ids)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["DescriptionVectors"]:
+        """Векторы из каталога; None, если их нет или построение не завершено"""
+        if not os.path.exists(os.path.join(directory, "meta.json")):
+            return None
+        arrays = [np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                  for name in ("row_ids", "indptr", "indices", "data")]
+        n_terms = len(np.load(os.path.join(directory, "idf.npy"), mmap_mode="r"))
+        vectors_path = os.path.join(directory, "vectors.npy")
+        vectors = np.load(vectors_path, mmap_mode="r") if os.path.exists(vectors_path) else None
+        return cls(*arrays, n_terms=n_terms, vectors=vectors)
+
+    def matches_catalog(self, book_ids: np.ndarray) -> bool:
+        """Строки — начало текущего каталога (книги только дописываются в конец)"""
+        return self.n_rows <= len(book_ids) and np.array_equal(self.row_ids, book_ids[:self.n_rows])
+
+    def similarities(self, position: int, others: np.ndarray) -> np.ndarray:
+        """Косинус описания книги position с описаниями книг others (книги после построения — 0)"""
+        others = np.asarray(others, dtype=np.int64)
+        result = np.zeros(len(others), dtype=np.float64)
+        known = others < self.n_rows
+        if position >= self.n_rows or not np.any(known):
+            return result
+        if self.vectors is not None:
+            result[known] = self.vectors[others[known]] @ self.vectors[position]
+            return result
+
+        query = np.zeros(self.n_terms, dtype=np.float64)
+        query[self.indices[self.indptr[position]:self.indptr[position + 1]]] = \
+            self.data[self.indptr[position]:self.indptr[position + 1]]
+        rows = others[known]
+        lengths = self.indptr[rows + 1] - self.indptr[rows]
+        offsets = np.cumsum(lengths) - lengths
+        entries = np.repeat(self.indptr[rows] - offsets, lengths) + np.arange(int(lengths.sum()))
+        products = self.data[entries] * query[self.indices[entries]]
+        result[known] = np.bincount(np.repeat(np.arange(len(rows)), lengths), products, minlength=len(rows))
+        return result
+
+    def centroid_scores(self, positions: Sequence[int], weights: Sequence[float], size: int,
+                        block_entries: int = 2**18) -> np.ndarray:
+        """Косинус описаний всех книг (size — размер каталога) со взвешенной суммой описаний книг positions"""
+        positions = np.asarray(positions, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float64)
+        known = positions < self.n_rows
+        positions, weights = positions[known], weights[known]
+        result = np.zeros(size, dtype=np.float64)
+        if not len(positions):
+            return result
+        
+        if self.vectors is not None:
+            centroid = weights @ np.asarray(self.vectors[positions], dtype=np.float64)
+        else:
+            centroid = np.zeros(self.n_terms, dtype=np.float64)
+            for position, weight in zip(positions, weights):
+                entries = slice(self.indptr[position], self.indptr[position + 1])
+                centroid[self.indices[entries]] += weight * self.data[entries]
+        norm = np.linalg.norm(centroid)
+        if norm == 0:
+            return result
+        centroid /= norm
+        
+        if self.vectors is not None:
+            block_rows = max(1, block_entries // max(self.vectors.shape[1], 1))
+            for start in range(0, self.n_rows, block_rows):
+                result[start:start + block_rows] = self.vectors[start:start + block_rows] @ centroid
+        else:
+            for start, stop in _row_blocks(self.indptr, block_entries):
+                result[start:stop] = _block_product(self.indptr, self.indices, self.data, start, stop,
+                                                    centroid[:, None])[:, 0]
+        return result
+
+    def most_similar(self, position: int, excluded: np.ndarray, limit: int,
+                     block_rows: int = 65536) -> np.ndarray:
+        """Позиции книг с самыми близкими описаниями (только для плотных векторов; иначе пусто)"""
+        if self.vectors is None or position >= self.n_rows:
+            return np.zeros(0, dtype=np.int64)
+        query = np.asarray(self.vectors[position], dtype=np.float32)
+        scores = np.empty(self.n_rows, dtype=np.float32)
+        for start in range(0, self.n_rows, block_rows):
+            scores[start:start + block_rows] = self.vectors[start:start + block_rows] @ query
+        candidates = np.flatnonzero((scores > 0) & ~excluded[:self.n_rows])
+        candidates = candidates[candidates != position]
+        return candidates[top_k(scores[candidates], limit)]
+
+
+if __name__ == "__main__":
+    import time
+    from database import BookDatabase
+    from sqlite_storage import SQLiteStorage
+
+    parser = argparse.ArgumentParser(description="Построение векторов описаний книг (TF-IDF, SVD)")
+    parser.add_argument("--catalog", default=None, help="Файл каталога (по умолчанию — найденный рядом)")
+    parser.add_argument("--sqlite", default=os.environ.get("LIBRO_SQLITE_PATH"))
+    parser.add_argument("--out", default=DESCRIPTION_DIR)
+    parser.add_argument("--components", type=int, default=None, help="Размерность SVD (по умолчанию — без SVD)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    db = BookDatabase(args.catalog, storage=SQLiteStorage(args.sqlite) if args.sqlite else None)
+    build(catalog_chunks(db, args.chunk_size), args.out, args.components)
+    print(f"Векторы описаний {len(db.books)} книг сохранены в {args.out} за {time.perf_counter() - started:.1f} с")
\ No newline at end of file
@@ -0,0 +1,307 @@
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, Iterable, List, Optional
+from multi_hot import MultiHotMatrix
+
+# Скалярные атрибуты, для значений которых строятся битмапы
+SCALAR_FILTER_COLUMNS = [
+    "main_genre", "sub_genre",
+    "character_age", "character_gender", "character_profession",
+    "setting_location", "setting_time_period", "setting_type",
+    "pacing"
+]
+
+# Значение хранится битмапом (n/8 байт), если встречается хотя бы у 1/32 книг,
+# иначе — отсортированным массивом позиций (4 байта на книгу), как контейнеры roaring
+DENSE_FRACTION = 1 / 32
+
+# Шаг корзин рейтинга: для каждой границы хранится битмап «рейтинг >= граница»
+RATING_BUCKET_STEP = 0.5
+
+# Число единичных битов в каждом байте
+_POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.int64)
+
+
+def pack_positions(positions: np.ndarray, n_rows: int) -> np.ndarray:
+    """Упакованный битмап из уникальных позиций книг"""
+    positions = np.asarray(positions, dtype=np.int64)
+    # Позиции уникальны, поэтому сумма битов внутри байта равна их OR
+    weights = np.right_shift(128, positions & 7)
+    packed = np.bincount(positions >> 3, weights=weights, minlength=(n_rows + 7) // 8)
+    return packed.astype(np.uint8)
+
+
+def top_k(values: np.ndarray, k: int, descending: bool = True) -> np.ndarray:
+    """Индексы k лучших значений по порядку без полной сортировки (np.partition).
+
+    При равных значениях порядок исходный, NaN идут последними — поэтому
+    первые k элементов не меняются при увеличении k («показать еще»).
+    """
+    keys = np.asarray(values, dtype=np.float64)
+    keys = -keys if descending else keys.copy()
+    keys[np.isnan(keys)] = np.inf
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    if k < len(keys):
+        kth = np.partition(keys, k - 1)[k - 1]
+        better = np.flatnonzero(keys < kth)
+        tied = np.flatnonzero(keys == kth)[:k - len(better)]
+        candidates = np.concatenate((better, tied))
+    else:
+        candidates = np.arange(len(keys))
+    return candidates[np.lexsort((candidates, keys[candidates]))]
+
+
+class FacetPostings:
+    """Постинги значений одного атрибута: позиции книг по коду значения.
+
+    Частые значения дополнительно хранятся готовыми битмапами, редкие
+    превращаются в битмап из массива позиций при запросе.
+    """
+
+    def __init__(self, codes: np.ndarray, rows: np.ndarray, n_values: int, n_rows: int):
+        self.n_rows = n_rows
+        order = np.argsort(codes, kind="stable")
+        self.rows = np.asarray(rows, dtype=np.int32)[order]
+        self.counts = np.bincount(codes, minlength=n_values)
+        self.indptr = np.concatenate(([0], np.cumsum(self.counts)))
+
+        dense_count = max(1, int(n_rows * DENSE_FRACTION))
+        self.bitmaps: Dict[int, np.ndarray] = {
+            int(code): pack_positions(self.positions(code), n_rows)
+            for code in np.flatnonzero(self.counts >= dense_count)
+        }
+
+    def positions(self, code: int) -> np.ndarray:
+        """Позиции книг со значением code"""
+        return self.rows[self.indptr[code]:self.indptr[code + 1]]
+
+    def union(self, codes: Iterable[int]) -> np.ndarray:
+        """Битмап книг, у которых есть хотя бы одно из значений"""
+        result = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+        sparse = []
+        for code in set(codes):
+            if code in self.bitmaps:
+                result |= self.bitmaps[code]
+            else:
+                sparse.append(self.positions(code))
+
+        if sparse:
+            # У списковых атрибутов одна книга может встречаться в постингах разных значений
+            positions = sparse[0] if len(sparse) == 1 else np.unique(np.concatenate(sparse))
+            result |= pack_positions(positions, self.n_rows)
+        return result
+
+    def memory_usage(self) -> int:
+        """Объем постингов и битмапов в байтах"""
+        return self.rows.nbytes + self.indptr.nbytes + sum(bitmap.nbytes for bitmap in self.bitmaps.values())
+
+
+class FilterIndex:
+    """Инвертированный битмап-индекс каталога для фильтров поиска.
+
+    Для каждого значения скалярного атрибута, каждого значения спискового
+    атрибута и каждой корзины рейтинга хранятся позиции книг (строки books_df).
+    Фильтр собирается операциями AND/OR над упакованными битмапами
+    (np.packbits: бит на книгу).
+    """
+
+    def __init__(self, books_df: pd.DataFrame, attribute_matrices: Dict[str, MultiHotMatrix],
+                 columns: Optional[Iterable[str]] = None):
+        self.n_rows = len(books_df)
+        self.n_bytes = (self.n_rows + 7) // 8
+        self.values: Dict[str, pd.Index] = {}  # {колонка: значения по кодам}
+        self.codes: Dict[str, np.ndarray] = {}  # {колонка: код значения каждой книги, 0 — пропуск}
+        self.postings: Dict[str, FacetPostings] = {}
+
+        columns = SCALAR_FILTER_COLUMNS if columns is None else columns
+        rows = np.arange(self.n_rows, dtype=np.int32)
+        for column in columns:
+            if column not in books_df.columns:
+                continue
+            codes, values = self._factorize(books_df[column])
+            # Код 0 — пропущенное значение, коды значений сдвинуты на единицу
+            self.values[column] = values
+            self.codes[column] = (codes + 1).astype(np.int32)
+            self.postings[column] = FacetPostings(self.codes[column], rows, len(values) + 1, self.n_rows)
+
+        self.list_values: Dict[str, MultiHotMatrix] = {}
+        for column, matrix in attribute_matrices.items():
+            self.list_values[column] = matrix
+            self.postings[column] = FacetPostings(matrix.indices, matrix.row_of_entry,
+                                                  matrix.n_terms, self.n_rows)
+
+        self._build_rating_buckets(books_df["rating"])
+        # Интервалы возраста есть, если каталог разобран add_age_interval_columns
+        age_min = books_df["age_min"] if "age_min" in books_df.columns else pd.Series(dtype=np.float64)
+        age_max = books_df["age_max"] if "age_max" in books_df.columns else pd.Series(dtype=np.float64)
+        self._build_age_intervals(age_min, age_max)
+
+    @staticmethod
+    def _factorize(column: pd.Series):
+        """Коды значений колонки (-1 для пропусков) и сами значения по кодам"""
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            return column.cat.codes.to_numpy(dtype=np.int64), column.cat.categories
+        codes, values = pd.factorize(column)
+        return codes.astype(np.int64), pd.Index(values)
+
+    def _build_rating_buckets(self, ratings: pd.Series):
+        """Книги, отсортированные по рейтингу, и битмапы «рейтинг >= граница корзины»"""
+        ratings = pd.to_numeric(ratings, errors="coerce").to_numpy(dtype=np.float64)
+        self.ratings = ratings  # рейтинг каждой книги для проверки кандидатов
+        rated = np.flatnonzero(~np.isnan(ratings))
+        order = np.argsort(ratings[rated], kind="stable")
+        self.rating_rows = rated[order].astype(np.int32)
+        self.sorted_ratings = ratings[rated][order]
+
+        self.rating_thresholds = np.zeros(0)
+        self.rating_bitmaps = []
+        if len(self.sorted_ratings):
+            low = np.floor(self.sorted_ratings[0] / RATING_BUCKET_STEP) * RATING_BUCKET_STEP
+            self.rating_thresholds = np.arange(low, self.sorted_ratings[-1] + RATING_BUCKET_STEP,
+                                               RATING_BUCKET_STEP)
+            self.rating_bitmaps = [pack_positions(self._rating_positions(threshold), self.n_rows)
+                                   for threshold in self.rating_thresholds]
+
+    def _build_age_intervals(self, age_min: pd.Series, age_max: pd.Series):
+        """Интервальный индекс возраста: книги, отсортированные по нижней границе"""
+        age_min = self.age_min = age_min.to_numpy(dtype=np.float64)
+        age_max = self.age_max = age_max.to_numpy(dtype=np.float64)
+        parsed = np.flatnonzero(~np.isnan(age_min))
+        order = np.argsort(age_min[parsed], kind="stable")
+        self.age_rows = parsed[order].astype(np.int32)
+        self.sorted_age_min = age_min[self.age_rows]
+        self.age_max_by_min = age_max[self.age_rows]
+
+    def age_overlap(self, min_age: float, max_age: float) -> np.ndarray:
+        """Книги, интервал возраста героя которых пересекается с [min_age, max_age]"""
+        # Нижняя граница <= max_age — префикс отсортированного массива, верхняя проверяется векторно
+        stop = np.searchsorted(self.sorted_age_min, max_age, side="right")
+        overlaps = self.age_max_by_min[:stop] >= min_age
+        return pack_positions(self.age_rows[:stop][overlaps], self.n_rows)
+
+    def _rating_positions(self, min_rating: float, below: Optional[float] = None) -> np.ndarray:
+        """Позиции книг с min_rating <= рейтинг (< below)"""
+        start = np.searchsorted(self.sorted_ratings, min_rating, side="left")
+        stop = len(self.sorted_ratings) if below is None else \
+            np.searchsorted(self.sorted_ratings, below, side="left")
+        return self.rating_rows[start:stop]
+
+    def has_column(self, column: str) -> bool:
+        return column in self.postings
+
+    def all_rows(self) -> np.ndarray:
+        """Битмап всех книг"""
+        return np.packbits(np.ones(self.n_rows, dtype=bool))
+
+    def to_mask(self, bitmap: np.ndarray) -> np.ndarray:
+        """Булева маска по строкам books_df"""
+        return np.unpackbits(bitmap, count=self.n_rows).astype(bool)
+
+    def to_positions(self, bitmap: np.ndarray) -> np.ndarray:
+        """Позиции книг из битмапа (по возрастанию)"""
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.n_rows))
+
+    @staticmethod
+    def count(bitmap: np.ndarray) -> int:
+        """Число книг в битмапе"""
+        return int(_POPCOUNT[bitmap].sum())
+
+    def value_code(self, column: str, value) -> Optional[int]:
+        """Код значения скалярной колонки (None, если такого значения нет; пропуск ни с чем не равен)"""
+        values = self.values[column]
+        if not self._is_missing(value) and value in values:
+            return values.get_loc(value) + 1
+        return None
+
+    def value_codes(self, column: str, values: Iterable) -> List[int]:
+        """Коды значений для isin: неизвестные пропускаются, пропуск совпадает с пропуском"""
+        known = self.values[column]
+        return sorted({0 if self._is_missing(value) else known.get_loc(value) + 1
+                       for value in values if self._is_missing(value) or value in known})
+
+    def equals(self, column: str, value) -> np.ndarray:
+        """Книги, у которых значение колонки равно value (пропуски не совпадают ни с чем)"""
+        code = self.value_code(column, value)
+        return self.postings[column].union([] if code is None else [code])
+
+    def isin(self, column: str, values: Iterable) -> np.ndarray:
+        """Книги, у которых значение колонки входит в values (как Series.isin)"""
+        return self.postings[column].union(self.value_codes(column, values))
+
+    def where(self, column: str, predicate: Callable[[object], bool]) -> np.ndarray:
+        """Книги, у которых значение колонки удовлетворяет predicate.
+
+        Предикат вычисляется по одному разу для каждого различного значения,
+        а не для каждой книги.
+        """
+        codes = [code + 1 for code, value in enumerate(self.values[column]) if predicate(value)]
+        return self.postings[column].union(codes)
+
+    def any_of(self, column: str, terms: Iterable[str]) -> np.ndarray:
+        """Книги, у которых в списковом атрибуте есть хотя бы одно из значений"""
+        return self.postings[column].union(self.list_values[column].term_codes(terms))
+
+    def at_least_rating(self, min_rating: float) -> np.ndarray:
+        """Книги с рейтингом >= min_rating: битмап корзины плюс остаток до ее границы"""
+        bucket = np.searchsorted(self.rating_thresholds, min_rating, side="left")
+        if bucket == len(self.rating_thresholds):
+            return pack_positions(self._rating_positions(min_rating), self.n_rows)
+
+        bitmap = self.rating_bitmaps[bucket].copy()
+        remainder = self._rating_positions(min_rating, below=self.rating_thresholds[bucket])
+        if len(remainder):
+            bitmap |= pack_positions(remainder, self.n_rows)
+        return bitmap
+
+    def count_rating_at_least(self, min_rating: float) -> int:
+        """Число книг с рейтингом >= min_rating"""
+        return len(self.sorted_ratings) - int(np.searchsorted(self.sorted_ratings, min_rating, side="left"))
+
+    def count_age_below(self, max_age: float) -> int:
+        """Число книг с нижней границей возраста <= max_age (оценка сверху для пересечения)"""
+        return int(np.searchsorted(self.sorted_age_min, max_age, side="right"))
+
+    def contains(self, bitmap: np.ndarray, positions: np.ndarray) -> np.ndarray:
+        """Маска: какие из позиций отмечены в битмапе"""
+        return ((bitmap[positions >> 3] >> (7 - (positions & 7))) & 1).astype(bool)
+
+    def present(self, columns: Iterable[str]) -> np.ndarray:
+        """Маска книг, у которых заполнены все указанные колонки"""
+        mask = np.ones(self.n_rows, dtype=bool)
+        for column in columns:
+            mask &= self.codes[column] > 0
+        return mask
+
+    def facet_counts(self, mask: np.ndarray, columns: Iterable[str]) -> Dict[str, Dict[object, int]]:
+        """Число книг из маски для каждого значения каждой колонки.
+
+        Кандидаты выбираются один раз, дальше на колонку — один bincount
+        по кодам; значения без книг в результат не попадают.
+        """
+        positions = np.flatnonzero(mask)
+        facets = {}
+        for column in columns:
+            if column in self.list_values:
+                counts = self.list_values[column].term_counts(mask)
+                labels = self.list_values[column].vocabulary
+            else:
+                counts = np.bincount(self.codes[column][positions],
+                                     minlength=len(self.values[column]) + 1)[1:]  # без пропусков
+                labels = self.values[column]
+            facets[column] = {labels[code]: int(counts[code]) for code in np.flatnonzero(counts)}
+        return facets
+
+    @staticmethod
+    def _is_missing(value) -> bool:
+        return not isinstance(value, (list, tuple)) and pd.isna(value)
+
+    def memory_usage(self) -> int:
+        """Объем индекса в байтах"""
+        return (sum(postings.memory_usage() for postings in self.postings.values())
+                + sum(codes.nbytes for codes in self.codes.values())
+                + self.ratings.nbytes + self.rating_rows.nbytes + self.sorted_ratings.nbytes
+                + self.age_min.nbytes + self.age_max.nbytes
+                + sum(bitmap.nbytes for bitmap in self.rating_bitmaps)
+                + self.age_rows.nbytes + self.sorted_age_min.nbytes + self.age_max_by_min.nbytes)
\ No newline at end of file
@@ -0,0 +1,123 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from multi_hot import MultiHotMatrix
+from filter_index import top_k
+
+# Одна правка строки (вставка, удаление, замена) меняет не больше трех триграмм слова
+TRIGRAMS_PER_EDIT = 3
+
+# Сколько кандидатов с наибольшим числом общих триграмм проверяется расстоянием Левенштейна
+CANDIDATE_LIMIT = 100
+
+WORD_PATTERN = re.compile(r"[0-9a-zа-я]+")
+
+
+def normalize(text) -> str:
+    """Нижний регистр, «ё» → «е», только буквы и цифры через пробел"""
+    if not isinstance(text, str):
+        return ""
+    return " ".join(WORD_PATTERN.findall(text.lower().replace("ё", "е")))
+
+
+def trigrams(text: str) -> List[str]:
+    """Триграммы слов строки; слово дополняется пробелами («  ab», « ab», «ab »), как в pg_trgm"""
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return sorted(grams)
+
+
+def levenshtein(a: str, b: str, max_distance: Optional[int] = None) -> int:
+    """Расстояние Левенштейна; с max_distance счет обрывается и возвращается max_distance + 1"""
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+def match_distance(query: str, text: str, max_distance: Optional[int] = None) -> int:
+    """Расстояние от запроса до строки целиком или до любых подряд идущих слов строки
+    (столько же слов, сколько в запросе): «булгков» близко к «Михаил Булгаков». Строки нормализованы."""
+    words = text.split()
+    n_words = len(query.split())
+    variants = {text} | {" ".join(words[i:i + n_words]) for i in range(len(words) - n_words + 1)}
+    return min(levenshtein(query, variant, max_distance) for variant in variants)
+
+
+def default_max_distance(query: str) -> int:
+    """Допустимое число опечаток: одна на каждые четыре символа запроса, не меньше одной"""
+    return max(1, len(query) // 4)
+
+
+class TrigramIndex:
+    """Индекс триграмм для поиска строк с опечатками (названия и авторы).
+
+    Кандидаты — строки с достаточным числом общих триграмм, найденные по
+    постингам multi-hot матрицы «строка × триграмма»; только они ранжируются
+    расстоянием Левенштейна, поэтому весь словарь не просматривается.
+    """
+
+    def __init__(self, strings: Iterable[str] = ()):
+        self.strings: List[str] = []
+        self.normalized: List[str] = []
+        self.string_index: Dict[str, int] = {}
+        self.matrix = MultiHotMatrix([])
+        self.add(strings)
+
+    def add(self, strings: Iterable[str]):
+        """Добавление новых строк (известные и пустые пропускаются)"""
+        new_strings = [text for text in dict.fromkeys(strings)
+                       if isinstance(text, str) and normalize(text) and text not in self.string_index]
+        if not new_strings:
+            return
+
+        for text in new_strings:
+            self.string_index[text] = len(self.strings)
+            self.strings.append(text)
+            self.normalized.append(normalize(text))
+        # Коды триграмм стабильны, матрица дописывается новыми строками
+        self.matrix = self.matrix.appended([trigrams(text) for text in new_strings])
+
+    def candidates(self, query: str, max_distance: int, limit: int = CANDIDATE_LIMIT) -> np.ndarray:
+        """Номера строк, которые могут быть не дальше max_distance правок от запроса"""
+        grams = trigrams(query)
+        postings = [self.matrix.postings(gram) for gram in grams]
+        postings = [rows for rows in postings if len(rows)]
+        if not postings:
+            return np.zeros(0, dtype=np.int64)
+
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.strings))
+        rows = np.flatnonzero(shared >= max(1, len(grams) - TRIGRAMS_PER_EDIT * max_distance))
+        return rows[top_k(shared[rows], limit)]
+
+    def suggest(self, query: str, limit: int = 5,
+                max_distance: Optional[int] = None) -> List[Tuple[str, int]]:
+        """Ближайшие строки к запросу: (строка, расстояние) по возрастанию расстояния"""
+        query = normalize(query)
+        if not query:
+            return []
+        max_distance = default_max_distance(query) if max_distance is None else max_distance
+
+        scored = []
+        for row in self.candidates(query, max_distance):
+            distance = match_distance(query, self.normalized[row], max_distance)
+            if distance <= max_distance:
+                scored.append((distance, row))
+        scored.sort()
+        return [(self.strings[row], distance) for distance, row in scored[:limit]]
+
+    def memory_usage(self) -> int:
+        """Объем массивов матрицы в байтах (без строк)"""
+        return self.matrix.indptr.nbytes + self.matrix.indices.nbytes + self.matrix.row_of_entry.nbytes
\ No newline at end of file
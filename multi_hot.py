@@ -0,0 +1,166 @@
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence
+
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Склеенные диапазоны [start, start + length) без цикла Python"""
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(np.asarray(starts, dtype=np.int64) - offsets, lengths) + np.arange(int(np.sum(lengths)))
+
+
+class MultiHotMatrix:
+    """Разреженная multi-hot матрица (CSR) для спискового атрибута книг.
+
+    Строка матрицы — позиция книги в каталоге, столбец — код значения в словаре.
+    Списки в ячейках DataFrame остаются для отображения, а поиск, подсчет
+    пересечений и перечисление опций идут по матрице.
+    """
+
+    def __init__(self, rows: Sequence, vocabulary: Optional[List[str]] = None):
+        # Словарь стабилен: переданные значения сохраняют коды, новые дописываются в конец
+        self.vocabulary: List[str] = list(vocabulary or [])
+        self.term_index: Dict[str, int] = {term: code for code, term in enumerate(self.vocabulary)}
+
+        new_terms = sorted({term for values in rows if isinstance(values, list)
+                            for term in values if term not in self.term_index})
+        for term in new_terms:
+            self.term_index[term] = len(self.vocabulary)
+            self.vocabulary.append(term)
+
+        indptr = [0]
+        indices = []
+        for values in rows:
+            if isinstance(values, list):
+                # Повторы внутри одной книги не учитываются, как у set()
+                indices.extend(sorted({self.term_index[term] for term in values}))
+            indptr.append(len(indices))
+
+        self._set_arrays(np.asarray(indptr, dtype=np.int64), np.asarray(indices, dtype=np.int32))
+
+    def _set_arrays(self, indptr: np.ndarray, indices: np.ndarray):
+        self.n_rows = len(indptr) - 1
+        self.indptr = indptr
+        self.indices = indices
+        # Номер строки для каждого ненулевого элемента: для bincount по строкам
+        self.row_of_entry = np.repeat(np.arange(self.n_rows, dtype=np.int32), np.diff(self.indptr))
+        self._postings_indptr = None
+        self._postings_rows = None
+
+    def appended(self, rows: Sequence) -> "MultiHotMatrix":
+        """Новая матрица с дописанными в конец строками (коды словаря сохраняются).
+
+        Исходная матрица не меняется: ее могут читать уже построенные индексы.
+        """
+        tail = MultiHotMatrix(rows, self.vocabulary)
+        matrix = MultiHotMatrix([], tail.vocabulary)
+        matrix._set_arrays(np.concatenate((self.indptr, self.indptr[-1] + tail.indptr[1:])),
+                           np.concatenate((self.indices, tail.indices)))
+        return matrix
+
+    @property
+    def n_terms(self) -> int:
+        return len(self.vocabulary)
+
+    def term_codes(self, terms: Iterable[str]) -> np.ndarray:
+        """Коды известных значений (неизвестные пропускаются)"""
+        return np.asarray(sorted({self.term_index[term] for term in terms if term in self.term_index}),
+                          dtype=np.int32)
+
+    def _selected(self, codes: np.ndarray) -> np.ndarray:
+        """Булева таблица выбранных кодов словаря"""
+        selected = np.zeros(self.n_terms, dtype=bool)
+        selected[codes] = True
+        return selected
+
+    def overlap_counts(self, terms: Iterable[str]) -> np.ndarray:
+        """Число общих значений с набором terms для каждой книги"""
+        return self.overlap_counts_by_codes(self.term_codes(terms))
+
+    def overlap_counts_by_codes(self, codes: np.ndarray) -> np.ndarray:
+        """Число общих значений с набором кодов для каждой книги"""
+        hits = self._selected(codes)[self.indices]
+        return np.bincount(self.row_of_entry[hits], minlength=self.n_rows)
+
+    def dot(self, weights: np.ndarray) -> np.ndarray:
+        """Произведение матрицы на вектор весов значений: сумма весов значений каждой книги"""
+        return np.bincount(self.row_of_entry, weights=weights[self.indices], minlength=self.n_rows)
+
+    def row_overlap_counts(self, row: int) -> np.ndarray:
+        """Число общих значений с книгой в позиции row для каждой книги"""
+        return self.overlap_counts_by_codes(self.row_codes(row))
+
+    def any_of(self, terms: Iterable[str]) -> np.ndarray:
+        """Маска книг, у которых есть хотя бы одно из значений"""
+        return self.overlap_counts(terms) > 0
+
+    def all_of(self, terms: Iterable[str]) -> np.ndarray:
+        """Маска книг, у которых есть все значения"""
+        terms = set(terms)
+        codes = self.term_codes(terms)
+        if len(codes) < len(terms):
+            return np.zeros(self.n_rows, dtype=bool)
+        return self.overlap_counts_by_codes(codes) == len(codes)
+
+    def term_counts(self, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Число книг с каждым значением словаря (среди книг из маски)"""
+        indices = self.indices if mask is None else self.indices[mask[self.row_of_entry]]
+        return np.bincount(indices, minlength=self.n_terms)
+
+    def present_terms(self, mask: Optional[np.ndarray] = None) -> List[str]:
+        """Отсортированные значения, встречающиеся у книг из маски"""
+        counts = self.term_counts(mask)
+        return sorted(self.vocabulary[code] for code in np.flatnonzero(counts))
+
+    def row_codes(self, row: int) -> np.ndarray:
+        """Коды значений книги в позиции row"""
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def row_terms(self, row: int) -> List[str]:
+        """Значения книги в позиции row"""
+        return [self.vocabulary[code] for code in self.row_codes(row)]
+
+    def common_terms(self, row: int, other_row: int) -> List[str]:
+        """Общие значения двух книг"""
+        common = np.intersect1d(self.row_codes(row), self.row_codes(other_row), assume_unique=True)
+        return [self.vocabulary[code] for code in common]
+
+    def postings(self, term: str) -> np.ndarray:
+        """Позиции книг со значением term (транспонированная матрица строится один раз)"""
+        code = self.term_index.get(term)
+        if code is None:
+            return np.zeros(0, dtype=np.int32)
+        return self.code_postings(code)
+
+    def code_postings(self, code: int) -> np.ndarray:
+        """Позиции книг (по возрастанию) со значением с кодом code"""
+        self._build_postings()
+        return self._postings_rows[self._postings_indptr[code]:self._postings_indptr[code + 1]]
+
+    def _build_postings(self):
+        """Транспонированная матрица: книги по коду значения"""
+        if self._postings_indptr is None:
+            order = np.argsort(self.indices, kind="stable")
+            self._postings_rows = self.row_of_entry[order]
+            self._postings_indptr = np.concatenate(
+                ([0], np.cumsum(np.bincount(self.indices, minlength=self.n_terms)))
+            )
+
+    def rows_overlap_counts(self, rows: Sequence[int]) -> np.ndarray:
+        """Число общих значений каждой книги из rows с каждой книгой каталога.
+
+        Матрица len(rows) × n_rows — произведение M[rows] · Mᵀ, собранное по
+        постингам значений выбранных книг.
+        """
+        self._build_postings()
+        rows = np.asarray(rows, dtype=np.int64)
+        # Коды значений выбранных книг и номер выбранной книги для каждого кода
+        lengths = self.indptr[rows + 1] - self.indptr[rows]
+        codes = self.indices[_ranges(self.indptr[rows], lengths)]
+        owners = np.repeat(np.arange(len(rows)), lengths)
+
+        # Книги с каждым из кодов: постинги подряд, без цикла по кодам
+        starts = self._postings_indptr[codes]
+        posting_lengths = self._postings_indptr[codes + 1] - starts
+        cells = np.repeat(owners, posting_lengths) * self.n_rows \
+            + self._postings_rows[_ranges(starts, posting_lengths)]
+        return np.bincount(cells, minlength=len(rows) * self.n_rows).reshape(len(rows), self.n_rows)
\ No newline at end of file
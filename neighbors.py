@@ -0,0 +1,378 @@
+"""Таблица ближайших соседей книг: top-K похожих книг для каждой книги каталога.
+
+Строится офлайн блоками ограниченного размера в пуле процессов и хранится
+массивами .npy (id соседей int32 + оценки float32), которые приложение
+открывает через memory map. Запуск:
+    python neighbors.py --catalog books.jsonl --out neighbors --k 50 --workers 4
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+
+# Соседей на книгу и каталог таблиц по умолчанию
+NEIGHBORS_K = 50
+NEIGHBORS_DIR = "neighbors"
+
+# Память на блок оценок при построении (блок строк × все книги, float64)
+BLOCK_BYTES = 64 * 2**20
+
+# Сколько книг из постингов значений книги собирается в кандидаты (дальше — только их оценка)
+CANDIDATE_CAP = 50_000
+
+
+@dataclass(frozen=True)
+class SimilarityWeights:
+    """Формула схожести: совпадения скалярных атрибутов, общие значения списков,
+    бонус кандидату за рейтинг. Слагаемые складываются в порядке объявления."""
+    name: str
+    scalar: Tuple[Tuple[str, int], ...]
+    lists: Tuple[Tuple[str, float], ...]
+    rating_bonus: float = 0.0
+    rating_threshold: float = 4.0
+    rating_tiebreak: bool = True  # при равной оценке выше книга с большим рейтингом
+
+
+# Оценка SimpleRecommender: жанр +3, поджанр +2, автор +1, настроения ×0.5, тропы ×0.3
+RECOMMENDER_WEIGHTS = SimilarityWeights(
+    "recommender",
+    scalar=(("main_genre", 3), ("sub_genre", 2), ("author", 1)),
+    lists=(("mood", 0.5), ("plot_tropes", 0.3)),
+)
+
+# Оценка страницы рекомендаций: жанр +2, поджанр +1, теги и тропы ×0.5, настроения ×0.3,
+# +0.5 книгам с рейтингом от 4; равные оценки — в порядке каталога
+PAGE_WEIGHTS = SimilarityWeights(
+    "page",
+    scalar=(("main_genre", 2), ("sub_genre", 1)),
+    lists=(("tags", 0.5), ("plot_tropes", 0.5), ("mood", 0.3)),
+    rating_bonus=0.5,
+    rating_tiebreak=False,
+)
+
+
+class SimilarityScorer:
+    """Оценки схожести по кодам категорий и multi-hot матрицам каталога.
+
+    Снимок каталога: не меняется после создания и передается в процессы пула.
+    """
+
+    def __init__(self, book_db, weights: SimilarityWeights):
+        books = book_db.books
+        self.weights = weights
+        self.n_rows = len(books)
+        self.ids = books["id"].to_numpy(dtype=np.int64)
+        self.ratings = books["rating"].to_numpy(dtype=np.float64)
+        self.codes = {column: books[column].cat.codes.to_numpy() for column, _ in weights.scalar}
+        # Постинги скалярных атрибутов: позиции книг, упорядоченные по коду (пропуски -1 — первыми)
+        self.orders = {column: np.argsort(codes, kind="stable") for column, codes in self.codes.items()}
+        self.code_indptr = {column: np.concatenate(([0], np.cumsum(np.bincount(codes.astype(np.int64) + 1))))
+                            for column, codes in self.codes.items()}
+        self.matrices = {column: book_db.get_attribute_matrix(column) for column, _ in weights.lists}
+        for matrix in self.matrices.values():
+            matrix._build_postings()  # один раз здесь, а не в каждом процессе пула
+        # Бонус зависит только от кандидата; +0.0 не меняет оценку
+        self.bonus = np.where(self.ratings >= weights.rating_threshold, weights.rating_bonus, 0.0)
+
+    def symmetric_scores(self, positions: Sequence[int]) -> np.ndarray:
+        """Симметричная часть оценки (без бонуса): len(positions) × книг"""
+        positions = np.asarray(positions, dtype=np.int64)
+        matches = np.zeros((len(positions), self.n_rows), dtype=np.int64)
+        for column, weight in self.weights.scalar:
+            codes = self.codes[column]
+            target_codes = codes[positions][:, None]
+            # Пропуск (код -1) ни с чем не совпадает
+            matches += weight * ((codes[None, :] == target_codes) & (target_codes != -1))
+
+        scores = matches.astype(np.float64)
+        for column, weight in self.weights.lists:
+            scores = scores + self.matrices[column].rows_overlap_counts(positions) * weight
+        return scores
+
+    def scores(self, positions: Sequence[int]) -> np.ndarray:
+        """Оценки схожести книг positions со всеми книгами каталога"""
+        return self.symmetric_scores(positions) + self.bonus[None, :]
+
+    def pair_scores(self, position: int, others: Sequence[int]) -> np.ndarray:
+        """Точные оценки для нескольких кандидатов (без прохода по каталогу)"""
+        scores = []
+        for other in others:
+            score = sum(weight for column, weight in self.weights.scalar
+                        if self.codes[column][position] != -1
+                        and self.codes[column][position] == self.codes[column][other])
+            for column, weight in self.weights.lists:
+                matrix = self.matrices[column]
+                common = np.intersect1d(matrix.row_codes(position), matrix.row_codes(other), assume_unique=True)
+                score = score + len(common) * weight
+            scores.append(score + self.bonus[other])
+        return np.asarray(scores, dtype=np.float64)
+
+    def candidate_scores(self, position: int, cap: Optional[int] = CANDIDATE_CAP
+                         ) -> Tuple[np.ndarray, np.ndarray, float]:
+        """Книги, у которых есть общие значения с книгой position, и их точные оценки.
+
+        Кандидаты — объединение постингов значений книги: от самых редких значений
+        к частым, пока их суммарная длина не превысит cap (None — без ограничения).
+        Оценки кандидатов полные, по всем значениям. Возвращает (позиции по
+        возрастанию, оценки, сумму весов несобранных постингов): оценка книги вне
+        кандидатов не больше этой суммы плюс бонус за рейтинг (0 — все постинги собраны).
+        """
+        postings = []  # (колонка, вес, позиции книг со значением)
+        for column, weight in self.weights.scalar:
+            code = int(self.codes[column][position])
+            if code != -1:
+                indptr = self.code_indptr[column]
+                postings.append((column, weight, self.orders[column][indptr[code + 1]:indptr[code + 2]]))
+        for column, weight in self.weights.lists:
+            matrix = self.matrices[column]
+            postings.extend((column, weight, matrix.code_postings(code)) for code in matrix.row_codes(position))
+
+        postings.sort(key=lambda item: len(item[2]))
+        n_gathered, total = 0, 0
+        for _, _, posting in postings:
+            if n_gathered and cap is not None and total + len(posting) > cap:
+                break
+            n_gathered += 1
+            total += len(posting)
+        if n_gathered:
+            candidates, inverse = np.unique(np.concatenate([posting for _, _, posting in postings[:n_gathered]]),
+                                            return_inverse=True)
+        else:
+            candidates, inverse = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        # Совпадения кандидатов со значениями: собранные постинги — подсчетом по inverse,
+        # остальные — сравнением кодов или поиском в отсортированном постинге.
+        # Слагаемые — в том же порядке и типах, что в symmetric_scores, поэтому оценки равны
+        matches = np.zeros(len(candidates), dtype=np.int64)
+        overlaps = {column: np.zeros(len(candidates), dtype=np.int64) for column, _ in self.weights.lists}
+        offset = 0
+        for number, (column, weight, posting) in enumerate(postings):
+            if number < n_gathered:
+                hit = np.bincount(inverse[offset:offset + len(posting)], minlength=len(candidates))
+                offset += len(posting)
+            elif column in overlaps:
+                found = np.searchsorted(posting, candidates)
+                hit = posting[np.minimum(found, len(posting) - 1)] == candidates
+            else:
+                hit = self.codes[column][candidates] == self.codes[column][position]
+            if column in overlaps:
+                overlaps[column] += hit
+            else:
+                matches += weight * hit
+        scores = matches.astype(np.float64)
+        for column, weight in self.weights.lists:
+            scores = scores + overlaps[column] * weight
+        skipped_weight = sum(weight for _, weight, _ in postings[n_gathered:])
+        return candidates, scores + self.bonus[candidates], float(skipped_weight)
+
+    def rank(self, scores: np.ndarray, excluded: np.ndarray, limit: int,
+             positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Позиции лучших книг с положительной оценкой: по оценке, затем по рейтингу
+        (если так задано формулой), затем в порядке каталога.
+
+        positions — позиции книг, которым соответствуют scores (по умолчанию весь каталог).
+        """
+        if positions is None:
+            candidates = np.flatnonzero((scores > 0) & ~excluded)
+            candidate_scores = scores[candidates]
+        else:
+            keep = (scores > 0) & ~excluded[positions]
+            candidates, candidate_scores = positions[keep], scores[keep]
+        if len(candidates) > limit:
+            # Кандидаты с оценкой не ниже limit-й: полная сортировка только для них
+            kth = np.partition(-candidate_scores, limit - 1)[limit - 1]
+            keep = -candidate_scores <= kth
+            candidates, candidate_scores = candidates[keep], candidate_scores[keep]
+
+        keys = [candidates]
+        if self.weights.rating_tiebreak:
+            keys.append(-self.ratings[candidates])
+        keys.append(-candidate_scores)
+        return candidates[np.lexsort(keys)][:limit]
+
+    def top_neighbors(self, positions: Sequence[int], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Соседи книг positions: id (int32, -1 — пусто) и оценки (float32), len(positions) × k"""
+        neighbor_ids = np.full((len(positions), k), -1, dtype=np.int32)
+        neighbor_scores = np.zeros((len(positions), k), dtype=np.float32)
+        block_rows = max(1, BLOCK_BYTES // (8 * max(self.n_rows, 1)))
+
+        for block_start in range(0, len(positions), block_rows):
+            block = positions[block_start:block_start + block_rows]
+            for offset, (position, scores) in enumerate(zip(block, self.scores(block))):
+                excluded = np.zeros(self.n_rows, dtype=bool)
+                excluded[position] = True  # книга не сосед самой себе
+                top = self.rank(scores, excluded, k)
+                neighbor_ids[block_start + offset, :len(top)] = self.ids[top]
+                neighbor_scores[block_start + offset, :len(top)] = scores[top]
+        return neighbor_ids, neighbor_scores
+
+
+# Снимок каталога в процессе пула (передается один раз через initializer)
+_worker_scorer: Optional[SimilarityScorer] = None
+
+
+def _init_worker(scorer: SimilarityScorer):
+    global _worker_scorer
+    _worker_scorer = scorer
+
+
+def _worker_block(args) -> Tuple[np.ndarray, np.ndarray]:
+    positions, k = args
+    return _worker_scorer.top_neighbors(positions, k)
+
+
+def compute_neighbors(scorer: SimilarityScorer, positions: Sequence[int], k: int = NEIGHBORS_K,
+                      workers: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Соседи для книг positions; блоки строк распределяются по процессам пула"""
+    positions = np.asarray(positions, dtype=np.int64)
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(positions) < 2 * workers:
+        return scorer.top_neighbors(positions, k)
+
+    block_rows = max(1, min(BLOCK_BYTES // (8 * max(scorer.n_rows, 1)), -(-len(positions) // workers)))
+    blocks = [(positions[start:start + block_rows], k) for start in range(0, len(positions), block_rows)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(scorer,)) as executor:
+        results = list(executor.map(_worker_block, blocks))
+    return np.concatenate([ids for ids, _ in results]), np.concatenate([scores for _, scores in results])
+
+
+class NeighborTable:
+    """Таблица соседей одной формулы схожести: строка i — книга в позиции i каталога"""
+
+    def __init__(self, weights: SimilarityWeights, row_ids: np.ndarray,
+                 neighbor_ids: np.ndarray, neighbor_scores: np.ndarray):
+        self.weights = weights
+        self.row_ids = row_ids  # id книги каждой строки: проверка соответствия каталогу
+        self.neighbor_ids = neighbor_ids
+        self.neighbor_scores = neighbor_scores
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.row_ids)
+
+    @property
+    def k(self) -> int:
+        return self.neighbor_ids.shape[1]
+
+    @classmethod
+    def build(cls, scorer: SimilarityScorer, k: int = NEIGHBORS_K,
+              workers: Optional[int] = None) -> "NeighborTable":
+        """Полное построение для всего каталога"""
+        neighbor_ids, neighbor_scores = compute_neighbors(scorer, np.arange(scorer.n_rows), k, workers)
+        return cls(scorer.weights, scorer.ids.copy(), neighbor_ids, neighbor_scores)
+
+    def matches_catalog(self, book_ids: np.ndarray) -> bool:
+        """Строки таблицы — начало текущего каталога (книги только дописываются в конец)"""
+        return self.n_rows <= len(book_ids) and np.array_equal(self.row_ids, book_ids[:self.n_rows])
+
+    def neighbors(self, position: int) -> Tuple[np.ndarray, np.ndarray]:
+        """id соседей и их оценки по убыванию схожести"""
+        ids = self.neighbor_ids[position]
+        filled = int(np.count_nonzero(ids >= 0))
+        return ids[:filled], self.neighbor_scores[position, :filled]
+
+    def is_complete(self, position: int) -> bool:
+        """Список неполон — значит, в нем все книги с положительной оценкой"""
+        return self.neighbor_ids[position, -1] < 0
+
+    def updated(self, scorer: SimilarityScorer, changed_positions: Sequence[int] = (),
+                workers: Optional[int] = None) -> "NeighborTable":
+        """Таблица для нового снимка каталога: пересчитываются только затронутые строки.
+
+        Затронуты новые и измененные книги, книги, в списках которых есть измененные,
+        и книги, в чей top-K новая или измененная книга теперь попадает.
+        """
+        n_old = self.n_rows
+        changed = np.union1d(np.asarray(changed_positions, dtype=np.int64), np.arange(n_old, scorer.n_rows))
+        neighbor_ids = np.full((scorer.n_rows, self.k), -1, dtype=np.int32)
+        neighbor_scores = np.zeros((scorer.n_rows, self.k), dtype=np.float32)
+        neighbor_ids[:n_old] = self.neighbor_ids
+        neighbor_scores[:n_old] = self.neighbor_scores
+        if not len(changed):
+            return NeighborTable(self.weights, scorer.ids.copy(), neighbor_ids, neighbor_scores)
+
+        affected = np.zeros(scorer.n_rows, dtype=bool)
+        affected[changed] = True
+        affected[:n_old] |= np.isin(self.neighbor_ids, scorer.ids[changed]).any(axis=1)
+
+        # Порог входа в список: последняя оценка полного списка (с запасом на округление float32)
+        threshold = np.full(scorer.n_rows, -np.inf)
+        full = neighbor_ids[:n_old, -1] >= 0
+        threshold[:n_old][full] = neighbor_scores[:n_old, -1][full] - 1e-4
+        block_rows = max(1, BLOCK_BYTES // (8 * max(scorer.n_rows, 1)))
+        for block_start in range(0, len(changed), block_rows):
+            block = changed[block_start:block_start + block_rows]
+            # Оценка книги b в списке книги r: симметричная часть плюс бонус самой b
+            incoming = scorer.symmetric_scores(block) + scorer.bonus[block][:, None]
+            incoming[np.arange(len(block)), block] = 0
+            affected |= ((incoming > 0) & (incoming >= threshold[None, :])).any(axis=0)
+
+        rows = np.flatnonzero(affected)
+        neighbor_ids[rows], neighbor_scores[rows] = compute_neighbors(scorer, rows, self.k, workers)
+        return NeighborTable(self.weights, scorer.ids.copy(), neighbor_ids, neighbor_scores)
+
+    def save(self, directory: str):
+        """Сохранение массивов .npy (запись во временные файлы и атомарная замена)"""
+        os.makedirs(directory, exist_ok=True)
+        arrays = {"row_ids": self.row_ids.astype(np.int64), "ids": self.neighbor_ids,
+                  "scores": self.neighbor_scores}
+        for suffix, array in arrays.items():
+            path = os.path.join(directory, f"{self.weights.name}.{suffix}.npy")
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(path + ".tmp", path)
+        with open(os.path.join(directory, f"{self.weights.name}.json"), "w", encoding="utf-8") as f:
+            json.dump(asdict(self.weights), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str, weights: SimilarityWeights) -> Optional["NeighborTable"]:
+        """Таблица из каталога (memory map); None, если ее нет или она построена другой формулой"""
+        meta_path = os.path.join(directory, f"{weights.name}.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            if json.load(f) != json.loads(json.dumps(asdict(weights))):
+                return None
+
+        arrays = [np.load(os.path.join(directory, f"{weights.name}.{suffix}.npy"), mmap_mode="r")
+                  for suffix in ("row_ids", "ids", "scores")]
+        return cls(weights, *arrays)
+
+
+def build_tables(book_db, directory: str, k: int = NEIGHBORS_K, workers: Optional[int] = None,
+                 all_weights: List[SimilarityWeights] = (RECOMMENDER_WEIGHTS, PAGE_WEIGHTS)):
+    """Построение и сохранение таблиц всех формул схожести.
+    
+    Сохраненная таблица, построенная для начала текущего каталога, досчитывается
+    инкрементально — пересчитываются только строки, затронутые дописанными книгами.
+    """
+    book_ids = book_db.books["id"].to_numpy()
+    for weights in all_weights:
+        scorer = SimilarityScorer(book_db, weights)
+        table = NeighborTable.load(directory, weights)
+        if table is not None and table.k == k and table.matches_catalog(book_ids):
+            table = table.updated(scorer, workers=workers)
+        else:
+            table = NeighborTable.build(scorer, k, workers)
+        table.save(directory)
+
+
+if __name__ == "__main__":
+    import time
+    from database import BookDatabase
+
+    parser = argparse.ArgumentParser(description="Построение таблиц соседей книг")
+    parser.add_argument("--catalog", default=None, help="Файл каталога (по умолчанию — найденный рядом)")
+    parser.add_argument("--out", default=NEIGHBORS_DIR)
+    parser.add_argument("--k", type=int, default=NEIGHBORS_K)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    db = BookDatabase(args.catalog)
+    build_tables(db, args.out, args.k, args.workers)
+    print(f"Таблицы соседей для {len(db.books)} книг сохранены в {args.out} "
+          f"за {time.perf_counter() - started:.1f} с")
\ No newline at end of file
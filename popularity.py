@@ -0,0 +1,58 @@
+from typing import Collection
+import numpy as np
+import pandas as pd
+
+
+def _descending_key(values: pd.Series) -> np.ndarray:
+    """Ключ сортировки по убыванию: пропуски — в конце"""
+    key = -values.to_numpy(dtype=np.float64, na_value=np.nan)
+    key[np.isnan(key)] = np.inf
+    return key
+
+
+class PopularityRanking:
+    """Книги каталога по популярности: по рейтингу, затем по году (новые выше), затем в порядке каталога.
+
+    Перестановка позиций строится один раз на версию каталога; книги, дописанные
+    в конец каталога, сортируются отдельно и вливаются одним бинарным поиском. Лучшие
+    книги без исключенных — префикс перестановки: O(limit + исключенных).
+    """
+
+    def __init__(self, books: pd.DataFrame):
+        self.ids = books["id"].to_numpy(dtype=np.int64)
+        self.rating_key = _descending_key(books["rating"])
+        self.year_key = _descending_key(books["year"])
+        self.order = np.lexsort((np.arange(len(books)), self.year_key, self.rating_key))
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.ids)
+
+    def appended(self, books: pd.DataFrame) -> "PopularityRanking":
+        """Ранжирование каталога books, в котором после построения только дописаны книги"""
+        ranking = PopularityRanking.__new__(PopularityRanking)
+        ranking.ids = books["id"].to_numpy(dtype=np.int64)
+        ranking.rating_key = _descending_key(books["rating"])
+        ranking.year_key = _descending_key(books["year"])
+        added = np.arange(self.n_rows, len(books))
+        added = added[np.lexsort((added, ranking.year_key[added], ranking.rating_key[added]))]
+        # Дописанные книги стоят в каталоге позже всех прежних, поэтому при равных рейтинге
+        # и годе идут после них: место — правая граница по паре ключей в прежнем порядке
+        indices = np.searchsorted(ranking._pair_keys(self.order), ranking._pair_keys(added), side="right")
+        ranking.order = np.insert(self.order, indices, added)
+        return ranking
+
+    def _pair_keys(self, positions: np.ndarray) -> np.ndarray:
+        """Пары (рейтинг, год) позиций для сравнения одним searchsorted"""
+        keys = np.empty(len(positions), dtype=[("rating", np.float64), ("year", np.float64)])
+        keys["rating"] = self.rating_key[positions]
+        keys["year"] = self.year_key[positions]
+        return keys
+
+    def top(self, limit: int, exclude_ids: Collection[int] = ()) -> np.ndarray:
+        """Позиции limit самых популярных книг, кроме книг с id из exclude_ids"""
+        # Среди первых limit + len(exclude_ids) книг исключенных не больше len(exclude_ids)
+        candidates = self.order[:limit + len(exclude_ids)]
+        if len(exclude_ids):
+            candidates = candidates[~np.isin(self.ids[candidates], np.fromiter(exclude_ids, dtype=np.int64))]
+        return candidates[:limit]
\ No newline at end of file
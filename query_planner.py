@@ -0,0 +1,130 @@
+import numpy as np
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+from filter_index import FilterIndex
+
+
+@dataclass
+class PlanStep:
+    """Шаг плана: одно условие фильтра"""
+    key: str
+    value: object
+    estimate: int  # оценка числа подходящих книг по статистике значений
+    positions: Callable[[], np.ndarray]  # все подходящие книги (для первого шага)
+    matches: Callable[[np.ndarray], np.ndarray]  # маска по позициям кандидатов
+    scan: bool = False  # условие без статистики: проверяется просмотром колонки
+
+
+class QueryPlanner:
+    """Планировщик фильтров по селективности.
+
+    Первым выполняется условие с наименьшей оценкой числа книг, остальные
+    проверяют только оставшихся кандидатов; пустой набор кандидатов
+    завершает выполнение. Условия вне индекса идут последними.
+    """
+
+    def __init__(self, index: FilterIndex, scan_mask: Callable[[str, object], np.ndarray]):
+        self.index = index
+        self.scan_mask = scan_mask  # маска полным просмотром для атрибутов вне индекса
+
+    def plan(self, filters: Dict) -> List[PlanStep]:
+        """Условия фильтра в порядке выполнения"""
+        steps = [self._step(key, value) for key, value in filters.items() if value]
+        return sorted(steps, key=lambda step: (step.scan, step.estimate))
+
+    def execute(self, filters: Dict) -> np.ndarray:
+        """Позиции подходящих книг (по возрастанию)"""
+        positions, _ = self._run(self.plan(filters))
+        return positions
+
+    def explain(self, filters: Dict) -> List[Dict]:
+        """Порядок условий, их оценки и число книг после каждого шага (None — шаг не понадобился)"""
+        steps = self.plan(filters)
+        _, row_counts = self._run(steps)
+        return [
+            {
+                "step": number,
+                "filter": step.key,
+                "value": step.value,
+                "estimate": step.estimate,
+                "rows": row_counts[number - 1] if number <= len(row_counts) else None,
+            }
+            for number, step in enumerate(steps, start=1)
+        ]
+
+    def _run(self, steps: List[PlanStep]):
+        """Выполнение плана: позиции книг и число кандидатов после каждого шага"""
+        if not steps:
+            return np.arange(self.index.n_rows), []
+
+        positions = steps[0].positions()
+        row_counts = [len(positions)]
+        for step in steps[1:]:
+            if len(positions) == 0:
+                break
+            positions = positions[step.matches(positions)]
+            row_counts.append(len(positions))
+        return positions, row_counts
+
+    def _step(self, key: str, value) -> PlanStep:
+        """Шаг плана для условия: оценка, выборка всех книг и проверка кандидатов"""
+        index = self.index
+
+        if key == "min_rating":
+            return PlanStep(
+                key, value, index.count_rating_at_least(value),
+                positions=lambda: index.to_positions(index.at_least_rating(value)),
+                matches=lambda rows: index.ratings[rows] >= value,
+            )
+
+        if key == "character_age_range":
+            min_age, max_age = value
+            return PlanStep(
+                key, value, index.count_age_below(max_age),
+                positions=lambda: index.to_positions(index.age_overlap(min_age, max_age)),
+                matches=lambda rows: (index.age_min[rows] <= max_age) & (index.age_max[rows] >= min_age),
+            )
+
+        if not isinstance(value, list) and key in index.list_values:
+            # Список не равен отдельному значению: ни одна книга не подходит
+            return PlanStep(
+                key, value, 0,
+                positions=lambda: np.zeros(0, dtype=np.int64),
+                matches=lambda rows: np.zeros(len(rows), dtype=bool),
+            )
+
+        if isinstance(value, list) and key in index.list_values:
+            # «Любое из» для спискового атрибута: сумма частот — оценка сверху
+            codes = index.list_values[key].term_codes(value)
+            return PlanStep(
+                key, value, int(index.postings[key].counts[codes].sum()),
+                positions=lambda: index.to_positions(index.any_of(key, value)),
+                matches=lambda rows: index.contains(index.any_of(key, value), rows),
+            )
+
+        if isinstance(value, list) and key in index.values:
+            codes = index.value_codes(key, value)
+            selected = np.zeros(len(index.values[key]) + 1, dtype=bool)
+            selected[codes] = True
+            return PlanStep(
+                key, value, int(index.postings[key].counts[codes].sum()),
+                positions=lambda: index.to_positions(index.isin(key, value)),
+                matches=lambda rows: selected[index.codes[key][rows]],
+            )
+
+        if not isinstance(value, list) and key in index.values:
+            code = index.value_code(key, value)
+            estimate = 0 if code is None else int(index.postings[key].counts[code])
+            return PlanStep(
+                key, value, estimate,
+                positions=lambda: (np.zeros(0, dtype=np.int32) if code is None
+                                   else index.postings[key].positions(code)),
+                matches=lambda rows: index.codes[key][rows] == (-1 if code is None else code),
+            )
+
+        return PlanStep(
+            key, value, index.n_rows,
+            positions=lambda: np.flatnonzero(self.scan_mask(key, value)),
+            matches=lambda rows: self.scan_mask(key, value)[rows],
+            scan=True,
+        )
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""Готовые рекомендации пользователей, посчитанные офлайн (batch_recommendations.py).
+
+Для каждого пользователя хранятся книги страницы «Рекомендуемое вам» (id,
+оценка, книга-источник) и отпечаток данных, по которым они посчитаны: его
+отзывов и списков. Приложение берет запись, только если отпечаток совпадает
+с текущими данными и каталог не менялся, иначе считает рекомендации на лету.
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+RESULTS_DIR = "batch_recommendations"
+
+# Книга-источник элемента: id понравившейся книги или одно из значений ниже
+SOURCE_ALL_GOOD = -1  # общие значения со всеми понравившимися книгами (добор рекомендаций)
+SOURCE_NONE = -2  # популярная книга (у пользователя нет хороших отзывов)
+
+_ARRAYS = ("from_reviews", "indptr", "book_ids", "scores", "sources")
+
+
+def user_fingerprint(reviews: Iterable[Tuple[int, Dict]], list_book_ids: Iterable[int]) -> str:
+    """Отпечаток данных пользователя, от которых зависят рекомендации страницы:
+    оценки в порядке отзывов (важен порядок) и книги из его списков"""
+    data = [[[int(book_id), review["rating"]] for book_id, review in reviews], sorted(map(int, list_book_ids))]
+    return hashlib.sha1(json.dumps(data).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class StoredRecommendations:
+    """Рекомендации одного пользователя"""
+    fingerprint: str
+    from_reviews: bool
+    book_ids: np.ndarray
+    scores: np.ndarray
+    sources: np.ndarray
+
+
+class RecommendationStore:
+    """Рекомендации всех пользователей: массивы CSR (строка — пользователь) и список имен"""
+
+    def __init__(self, n_books: int, usernames: List[str], fingerprints: List[str], from_reviews: np.ndarray,
+                 indptr: np.ndarray, book_ids: np.ndarray, scores: np.ndarray, sources: np.ndarray):
+        self.n_books = n_books  # размер каталога при расчете
+        self.usernames = usernames
+        self.fingerprints = fingerprints
+        self.from_reviews = from_reviews
+        self.indptr = indptr
+        self.book_ids = book_ids
+        self.scores = scores
+        self.sources = sources
+        self.rows = {username: row for row, username in enumerate(usernames)}
+
+    def __len__(self) -> int:
+        return len(self.usernames)
+
+    @classmethod
+    def build(cls, n_books: int, entries: Dict[str, StoredRecommendations]) -> "RecommendationStore":
+        usernames = list(entries)
+        lengths = [len(entries[username].book_ids) for username in usernames]
+
+        def column(name: str, dtype) -> np.ndarray:
+            parts = [np.asarray(getattr(entries[username], name), dtype=dtype) for username in usernames]
+            return np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+
+        return cls(n_books, usernames, [entries[username].fingerprint for username in usernames],
+                   np.array([entries[username].from_reviews for username in usernames], dtype=bool),
+                   np.concatenate(([0], np.cumsum(lengths, dtype=np.int64))),
+                   column("book_ids", np.int32), column("scores", np.float32), column("sources", np.int32))
+
+    def get(self, username: str) -> Optional[StoredRecommendations]:
+        row = self.rows.get(username)
+        if row is None:
+            return None
+        entries = slice(self.indptr[row], self.indptr[row + 1])
+        return StoredRecommendations(self.fingerprints[row], bool(self.from_reviews[row]),
+                                     self.book_ids[entries], self.scores[entries], self.sources[entries])
+
+    def entries(self) -> Dict[str, StoredRecommendations]:
+        return {username: self.get(username) for username in self.usernames}
+
+    def save(self, directory: str):
+        """Сохранение массивов .npy (запись во временные файлы и атомарная замена); метаданные — последними"""
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            os.remove(meta_path)  # без метаданных частично записанное хранилище не загружается
+        for name in _ARRAYS:
+            path = os.path.join(directory, f"{name}.npy")
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, getattr(self, name))
+            os.replace(path + ".tmp", path)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"n_books": self.n_books, "usernames": self.usernames, "fingerprints": self.fingerprints},
+                      f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["RecommendationStore"]:
+        """Хранилище из каталога (memory map); None, если его нет"""
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = [np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in _ARRAYS]
+        return cls(meta["n_books"], meta["usernames"], meta["fingerprints"], *arrays)
+
+    @staticmethod
+    def modified_time(directory: str) -> Optional[float]:
+        """Время записи хранилища (по метаданным); None, если его нет"""
+        try:
+            return os.path.getmtime(os.path.join(directory, "meta.json"))
+        except OSError:
+            return None
\ No newline at end of file
@@ -1,15 +1,272 @@
+import threading
+import numpy as np
 import pandas as pd
 import streamlit as st
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+from collaborative import CF_DIR, CollaborativeModel, Interactions
+from description_vectors import DESCRIPTION_DIR, DescriptionVectors
+from filter_index import top_k
+from neighbors import (CANDIDATE_CAP, NEIGHBORS_DIR, PAGE_WEIGHTS, RECOMMENDER_WEIGHTS, NeighborTable, SimilarityScorer,
+                       SimilarityWeights)
+from popularity import PopularityRanking
+from recommendation_store import (RESULTS_DIR, SOURCE_ALL_GOOD, SOURCE_NONE, RecommendationStore,
+                                  StoredRecommendations, user_fingerprint)
+from taste_profiles import FAVORITES_LIST, TasteProfile
+from ttl_cache import TTLCache
+
+# Сколько понравившихся книг оценивается одним матричным проходом (память: блок × число книг)
+SCORE_BLOCK_SIZE = 16
+
+# Смешивание с коллаборативной моделью: доля коллаборативной оценки, доля item-item в ней
+# (остальное — ALS) и сколько кандидатов каждого источника сравнивается для книги
+COLLABORATIVE_WEIGHT = 0.5
+ITEM_ITEM_SHARE = 0.5
+BLEND_CANDIDATES = 20
+
+# Доля косинуса описаний (description_vectors.py) в схожести книг, остальное — оценка по атрибутам
+DESCRIPTION_WEIGHT = 0.3
+
+# Готовые рекомендации пользователей; ключ включает версии каталога, отзывов и списков
+RECOMMENDATIONS_CACHE_SIZE = 1024
+
+# Списки, книги из которых не рекомендуются на странице рекомендаций
+PAGE_LIST_CATEGORIES = ["reading", "read", "planned", "dropped", "favorites"]
+
+# Пояснения к рекомендациям страницы: {ключ элемента: колонка с общими значениями}
+PAGE_REASON_COLUMNS = {"common_tags": "tags", "common_tropes": "plot_tropes", "common_moods": "mood"}
 
 class SimpleRecommender:
     """Простая система рекомендаций на основе отзывов пользователя"""
     
-    def __init__(self, book_db, book_page_manager):
+    def __init__(self, book_db, book_page_manager, neighbors_dir: Optional[str] = NEIGHBORS_DIR,
+                 collaborative_dir: Optional[str] = CF_DIR, description_dir: Optional[str] = DESCRIPTION_DIR,
+                 candidate_cap: Optional[int] = CANDIDATE_CAP, results_dir: Optional[str] = RESULTS_DIR):
         self.book_db = book_db
         self.book_page_manager = book_page_manager
+        self.neighbors_dir = neighbors_dir  # таблицы соседей (neighbors.py); None — только расчет на лету
+        self.collaborative_dir = collaborative_dir  # модель collaborative.py; None — только схожесть книг
+        self.description_dir = description_dir  # векторы description_vectors.py; None — без описаний
+        self.candidate_cap = candidate_cap  # предел кандидатов из постингов; None — без ограничения
+        self.results_dir = results_dir  # рекомендации batch_recommendations.py; None — только расчет на лету
+        self._store = None  # (время записи хранилища, RecommendationStore или None)
+        self._collaborative = None  # (версия каталога, CollaborativeModel или None)
+        self._descriptions = None  # (версия каталога, DescriptionVectors или None)
+        self._popularity = None  # (версия каталога, PopularityRanking)
+        self._scorers = {}  # {формула: (версия каталога, SimilarityScorer)}
+        self._tables = {}  # {формула: (версия каталога, NeighborTable или None)}
+        self._lock = threading.Lock()
+        self.results = TTLCache(RECOMMENDATIONS_CACHE_SIZE)
+    
+    def _user_state(self, username: str) -> Tuple[int, int, int]:
+        """Версии данных, от которых зависят рекомендации пользователя: каталог, его отзывы и списки.
+        
+        Счетчики меняются при add_review и изменении списков, поэтому запись кэша
+        с прежним ключом больше не используется и вытесняется как давно не нужная.
+        """
+        lists_manager = getattr(self.book_page_manager, "lists_manager", None)
+        return (self.book_db.catalog_version,
+                getattr(self.book_page_manager, "get_user_version", lambda _: 0)(username),
+                lists_manager.get_user_version(username) if lists_manager is not None else 0)
     
     def get_recommendations(self, username: str, limit: int = 15) -> List[Dict]:
+        """Рекомендации пользователя из кэша (пересчет — только после его новых отзывов,
+        изменения списков или каталога)"""
+        key = ("recommendations", username, limit, self._user_state(username))
+        return list(self.results.get_or_compute(key, lambda: self._compute_recommendations(username, limit)))
+    
+    def get_profile_recommendations(self, username: str, limit: int = 15) -> List[Dict]:
+        """Рекомендации по профилю вкуса из кэша.
+        
+        Отдельный ранжир: одна оценка каталога по профилю вместо точного цикла
+        по понравившимся книгам get_recommendations; без менеджера профилей — как get_recommendations.
+        """
+        key = ("profile", username, limit, self._user_state(username))
+        return list(self.results.get_or_compute(key, lambda: self._profile_recommendations(username, limit)))
+    
+    def get_page_recommendations(self, username: str) -> Tuple[List[Dict], bool]:
+        """Рекомендации для страницы «Рекомендуемое вам» из кэша.
+        
+        Возвращает (элементы, основаны ли они на отзывах). Элемент — {"book": строка каталога,
+        "score", "common_tags", "common_tropes", "common_moods"}; без хороших отзывов —
+        популярные книги не из списков пользователя (только "book").
+        """
+        key = ("page", username, self._user_state(username))
+        items, from_reviews = self.results.get_or_compute(key, lambda: self._page_recommendations(username))
+        return list(items), from_reviews
+    
+    def _page_recommendations(self, username: str) -> Tuple[List[Dict], bool]:
+        """Рекомендации страницы из офлайн-хранилища, если они посчитаны по текущим данным, иначе — расчет"""
+        inputs = self._page_inputs(username)
+        stored = self._stored_page_recommendations(username, *inputs)
+        return stored if stored is not None else self._compute_page_recommendations(username, inputs)
+    
+    def page_recommendations_entry(self, username: str) -> StoredRecommendations:
+        """Рекомендации страницы, посчитанные на лету, в виде записи офлайн-хранилища"""
+        inputs = self._page_inputs(username)
+        items, from_reviews = self._compute_page_recommendations(username, inputs)
+        user_all_books, reviews, _ = inputs
+        return StoredRecommendations(
+            user_fingerprint(reviews, user_all_books), from_reviews,
+            np.array([item["book"]["id"] for item in items], dtype=np.int32),
+            np.array([item.get("score", 0.0) for item in items], dtype=np.float32),
+            np.array([item.get("source", SOURCE_NONE) for item in items], dtype=np.int32),
+        )
+    
+    def get_result_store(self) -> Optional[RecommendationStore]:
+        """Офлайн-хранилище рекомендаций (перечитывается, когда пакетный расчет записал новое)"""
+        if not self.results_dir:
+            return None
+        modified = RecommendationStore.modified_time(self.results_dir)
+        if self._store is None or self._store[0] != modified:
+            with self._lock:
+                store = RecommendationStore.load(self.results_dir) if modified is not None else None
+                self._store = (modified, store)
+        return self._store[1]
+    
+    def _stored_page_recommendations(self, username: str, user_all_books: set, reviews: List[Tuple[int, Dict]],
+                                     good_reviews_books: List[int]) -> Optional[Tuple[List[Dict], bool]]:
+        """Элементы страницы по записи хранилища; None — записи нет или она посчитана по другим данным"""
+        store = self.get_result_store()
+        if store is None or store.n_books != len(self.book_db.books):
+            return None
+        entry = store.get(username)
+        if entry is None or entry.fingerprint != user_fingerprint(reviews, user_all_books):
+            return None
+        
+        db = self.book_db
+        positions = [db.get_position(int(book_id)) for book_id in entry.book_ids]
+        if any(position is None for position in positions):
+            return None
+        if not entry.from_reviews:
+            return [{"book": db.books.iloc[position]} for position in positions], False
+        
+        good_positions = [position for position in map(db.get_position, good_reviews_books[:5]) if position is not None]
+        items = []
+        for position, score, source in zip(positions, entry.scores.tolist(), entry.sources.tolist()):
+            if source == SOURCE_ALL_GOOD:
+                item = {"book": db.books.iloc[position], "score": score, "source": source}
+                item.update(self._common_values(good_positions, position))
+            else:
+                item = {"book": db.books.iloc[position], "position": position, "score": score, "source": source}
+                item.update(self._common_values([db.get_position(source)], position))
+            items.append(item)
+        return items, True
+    
+    def _common_values(self, source_positions: List[int], position: int) -> Dict[str, List[str]]:
+        """Общие теги, тропы и настроения книги position с книгами source_positions"""
+        values = {}
+        for key, column in PAGE_REASON_COLUMNS.items():
+            matrix = self.book_db.get_attribute_matrix(column)
+            if len(source_positions) == 1:
+                values[key] = matrix.common_terms(source_positions[0], position)
+                continue
+            source_codes = np.unique(np.concatenate([matrix.row_codes(source) for source in source_positions]))
+            common = np.intersect1d(matrix.row_codes(position), source_codes, assume_unique=True)
+            values[key] = [matrix.vocabulary[code] for code in common]
+        return values
+    
+    def _page_inputs(self, username: str) -> Tuple[set, List[Tuple[int, Dict]], List[int]]:
+        """Книги из списков пользователя, его отзывы и id книг с хорошими отзывами не из списков"""
+        user_all_books = self.user_list_books(username)
+        reviews = self.book_page_manager.get_user_reviews(username)
+        good_reviews_books = [book_id for book_id, review in reviews
+                              if review["rating"] >= 4 and book_id not in user_all_books]
+        return user_all_books, reviews, good_reviews_books
+    
+    def user_list_books(self, username: str) -> set:
+        """Id книг из всех списков пользователя (без загрузки самих книг)"""
+        lists_manager = self.book_page_manager.lists_manager
+        user_all_books = set()
+        for category in PAGE_LIST_CATEGORIES:
+            user_all_books.update(lists_manager.get_list_book_ids(username, category))
+        return user_all_books
+    
+    def _compute_page_recommendations(self, username: str, inputs: Optional[Tuple] = None) -> Tuple[List[Dict], bool]:
+        db = self.book_db
+        # 1-2. Книги пользователя из всех списков и ID книг с хорошими отзывами, исключая те, что уже в списках
+        user_all_books, _, good_reviews_books = inputs if inputs is not None else self._page_inputs(username)
+        
+        if not good_reviews_books:
+            # Популярные книги, которых нет в списках пользователя
+            popular = self.popular_books(10, user_all_books)  # Исключаем книги из списков
+            return [{"book": book} for _, book in popular.iterrows()], False
+        
+        # 3. Находим похожие книги, учитывая теги и тропы
+        recommended_ids = set()
+        all_recommendations = []
+        
+        tags_matrix = db.get_attribute_matrix("tags")
+        tropes_matrix = db.get_attribute_matrix("plot_tropes")
+        moods_matrix = db.get_attribute_matrix("mood")
+        
+        # Книги из списков пользователя и уже рекомендованные не предлагаются
+        excluded = self._exclusion_mask(user_all_books)
+        
+        for good_book_id in good_reviews_books[:3]:  # Берем только 3 книги для анализа
+            good_position = db.get_position(good_book_id)
+            if good_position is None:
+                continue
+            
+            # Похожие книги из таблицы соседей (или одним проходом по каталогу, если ее нет):
+            # жанр +2, поджанр +1, теги и тропы ×0.5, настроение ×0.3, +0.5 за рейтинг от 4
+            positions, scores = self.similar_positions(good_position, excluded, 4, PAGE_WEIGHTS)
+            
+            for position, score in zip(positions, scores):  # До 4 книг от каждой исходной
+                # Общие значения нужны только для показанных книг
+                all_recommendations.append({
+                    "book": db.books.iloc[position],
+                    "position": position,
+                    "score": score,
+                    "source": good_book_id,
+                    "common_tags": tags_matrix.common_terms(good_position, position),
+                    "common_tropes": tropes_matrix.common_terms(good_position, position),
+                    "common_moods": moods_matrix.common_terms(good_position, position),
+                })
+                recommended_ids.add(int(db.books["id"].iat[position]))
+                excluded[position] = True
+        
+        # 4. Если мало рекомендаций, добавляем книги по другим критериям
+        if len(all_recommendations) < 5:
+            # Ищем книги с общими тегами/тропами из ВСЕХ оцененных книг
+            all_good_tags = set()
+            all_good_tropes = set()
+            all_good_moods = set()
+            good_positions = []
+            
+            for good_book_id in good_reviews_books[:5]:
+                good_position = db.get_position(good_book_id)
+                if good_position is not None:
+                    good_positions.append(good_position)
+                    all_good_tags.update(tags_matrix.row_terms(good_position))
+                    all_good_tropes.update(tropes_matrix.row_terms(good_position))
+                    all_good_moods.update(moods_matrix.row_terms(good_position))
+            
+            # Книги с общими тегами/тропами: маска по всему каталогу за одну операцию
+            candidates = (tags_matrix.any_of(all_good_tags) |
+                          tropes_matrix.any_of(all_good_tropes) |
+                          moods_matrix.any_of(all_good_moods))
+            
+            for position in np.flatnonzero(candidates):
+                book = db.books.iloc[position]
+                if (book["id"] in user_all_books) or (book["id"] in recommended_ids):
+                    continue
+                
+                all_recommendations.append({
+                    "book": book,
+                    "score": 1.0,
+                    "source": SOURCE_ALL_GOOD,
+                    **self._common_values(good_positions, position),
+                })
+                recommended_ids.add(book["id"])
+                
+                if len(all_recommendations) >= 10:  # Максимум 10 рекомендаций
+                    break
+        
+        # 5. Сортируем по score
+        all_recommendations.sort(key=lambda x: x["score"], reverse=True)
+        return all_recommendations, True
+    
+    def _compute_recommendations(self, username: str, limit: int = 15) -> List[Dict]:
         """Получение рекомендаций на основе хороших отзывов пользователя"""
         # 1. Находим книги с хорошими отзывами (оценка 4-5)
         good_reviews_books = self._get_books_with_good_reviews(username)
@@ -17,14 +274,31 @@ class SimpleRecommender:
         if not good_reviews_books:
             return self._get_popular_books(limit)
         
-        # 2. Находим похожие книги
+        # 2. Находим похожие книги: по таблице соседей или блоками оценок на лету;
+        # отбор идет по порядку — найденные для одной книги исключаются для следующих.
+        # Если есть коллаборативная модель или векторы описаний, оценки смешиваются
+        collaborative = self.collaborative_scores(username)
+        blend = collaborative is not None or self.get_description_vectors() is not None
         recommendations = []
-        seen_ids = set(good_reviews_books)  # Исключаем уже оцененные книги
+        excluded = self._exclusion_mask(good_reviews_books)  # Исключаем уже оцененные книги
+        positions = [position for position in map(self.book_db.get_position, good_reviews_books)
+                     if position is not None]
         
-        for book_id in good_reviews_books:
-            similar_books = self._find_similar_books(book_id, seen_ids, limit=5)
-            recommendations.extend(similar_books)
-            seen_ids.update([b["id"] for b in similar_books])
+        scorer = self.get_scorer()
+        table = self.get_neighbor_table()
+        for block_start in range(0, len(positions), SCORE_BLOCK_SIZE):
+            block = positions[block_start:block_start + SCORE_BLOCK_SIZE]
+            # Без таблицы соседей и отбора кандидатов оценки блока считаются одним матричным проходом
+            full_scan = table is None and self.candidate_cap is None
+            block_scores = scorer.scores(block) if full_scan else [None] * len(block)
+            for position, scores in zip(block, block_scores):
+                if not blend:
+                    similar_positions, similar_scores = self.similar_positions(position, excluded, 5, scores=scores)
+                else:
+                    similar_positions, similar_scores = self._blended_positions(
+                        position, excluded, collaborative, 5, scores)
+                recommendations.extend(self._book_records(similar_positions, similar_scores))
+                excluded[similar_positions] = True
         
         # 3. Убираем дубликаты и сортируем
         unique_recs = {}
@@ -34,79 +308,278 @@ class SimpleRecommender:
         
         return list(unique_recs.values())[:limit]
     
+    def get_taste_profile(self, username: str) -> TasteProfile:
+        """Профиль вкуса пользователя; если он еще не сохранен — строится по отзывам и любимым книгам"""
+        profiles = self.book_page_manager.profiles
+        profile = profiles.get_profile(username)
+        if profile is None:
+            lists_manager = getattr(self.book_page_manager, "lists_manager", None)
+            favorite_ids = lists_manager.get_list_book_ids(username, FAVORITES_LIST) if lists_manager is not None else []
+            profile = profiles.rebuild(username, self.book_page_manager.get_user_reviews(username), favorite_ids)
+        return profile
+    
+    def _profile_recommendations(self, username: str, limit: int) -> List[Dict]:
+        """Рекомендации по профилю вкуса: одна оценка всего каталога вместо цикла по понравившимся книгам.
+        
+        Оценка профиля нормируется максимумом и смешивается с косинусом описаний
+        (с центром описаний понравившихся книг) и коллаборативной оценкой, если они есть.
+        """
+        if getattr(self.book_page_manager, "profiles", None) is None:
+            return self._compute_recommendations(username, limit)
+        profile = self.get_taste_profile(username)
+        if profile.is_empty():
+            return self._get_popular_books(limit)
+        
+        db = self.book_db
+        liked = dict(profile.books)  # копия: профиль может обновиться из другой сессии
+        scores = self.book_page_manager.profiles.scores(profile)
+        scale = scores.max()
+        if scale > 0:
+            scores = scores / scale
+        descriptions = self.get_description_vectors()
+        if descriptions is not None:
+            known = [(position, weight) for position, weight in
+                     ((db.get_position(book_id), weight) for book_id, weight in liked.items())
+                     if position is not None]
+            similarities = descriptions.centroid_scores([position for position, _ in known],
+                                                        [weight for _, weight in known], len(scores))
+            scores = (1 - DESCRIPTION_WEIGHT) * scores + DESCRIPTION_WEIGHT * similarities
+        collaborative = self.collaborative_scores(username)
+        if collaborative is not None:
+            scores = (1 - COLLABORATIVE_WEIGHT) * scores + COLLABORATIVE_WEIGHT * collaborative
+        
+        # Книги, по которым построен профиль, не рекомендуются
+        top = self.get_scorer().rank(scores, self._exclusion_mask(liked), limit)
+        return self._book_records(top, scores[top])
+    
     def _get_books_with_good_reviews(self, username: str) -> List[int]:
         """Получение ID книг с хорошими отзывами от пользователя"""
         good_books = []
         
         # Проверяем отзывы в book_page_manager
-        for book_id_str, reviews in self.book_page_manager.reviews.items():
-            for review in reviews:
-                if review["username"] == username and review["rating"] >= 4:
-                    good_books.append(int(book_id_str))
+        for book_id, review in self.book_page_manager.get_user_reviews(username):
+            if review["rating"] >= 4:
+                good_books.append(book_id)
         
         return list(set(good_books))  # Убираем дубликаты
     
-    def _find_similar_books(self, book_id: int, exclude_ids: set, limit: int = 5) -> List[Dict]:
-        """Поиск похожих книг"""
-        # Находим целевую книгу
-        target_book = self.book_db.books[self.book_db.books["id"] == book_id]
-        if target_book.empty:
-            return []
-        
-        target = target_book.iloc[0]
-        all_books = self.book_db.books
+    def get_scorer(self, weights: SimilarityWeights = RECOMMENDER_WEIGHTS) -> SimilarityScorer:
+        """Оценки схожести для текущей версии каталога"""
+        version = self.book_db.catalog_version
+        cached = self._scorers.get(weights.name)
+        if cached is None or cached[0] != version:
+            cached = (version, SimilarityScorer(self.book_db, weights))
+            self._scorers[weights.name] = cached
+        return cached[1]
+    
+    def get_neighbor_table(self, weights: SimilarityWeights = RECOMMENDER_WEIGHTS) -> Optional[NeighborTable]:
+        """Таблица соседей, согласованная с каталогом (None — таблицы нет или она от другого каталога).
         
-        similar_books = []
+        Книги, добавленные после построения, досчитываются инкрементально: пересчитываются
+        только затронутые строки. Обновленная таблица живет только в памяти процесса —
+        на диск ее записывают офлайн-построение и пакетный расчет.
+        """
+        version = self.book_db.catalog_version
+        cached = self._tables.get(weights.name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
         
-        for _, book in all_books.iterrows():
-            # Пропускаем если книга уже в исключениях
-            if book["id"] in exclude_ids:
-                continue
+        with self._lock:
+            if cached is not None:
+                table = cached[1]
+            else:
+                table = NeighborTable.load(self.neighbors_dir, weights) if self.neighbors_dir else None
             
-            similarity_score = 0
-            
-            # По жанру
-            if book["main_genre"] == target["main_genre"]:
-                similarity_score += 3
-            
-            # По поджанру
-            if book["sub_genre"] == target["sub_genre"]:
-                similarity_score += 2
-            
-            # По автору (но не слишком много от одного автора)
-            if book["author"] == target["author"]:
-                similarity_score += 1
-            
-            # По настроению
-            if (isinstance(book.get("mood"), list) and 
-                isinstance(target.get("mood"), list)):
-                common_moods = set(book["mood"]).intersection(set(target["mood"]))
-                similarity_score += len(common_moods) * 0.5
+            book_ids = self.book_db.books["id"].to_numpy()
+            if table is not None and not table.matches_catalog(book_ids):
+                table = None
+            if table is not None and table.n_rows < len(book_ids):
+                # В процессе Streamlit без пула: добавленных книг немного
+                table = table.updated(self.get_scorer(weights), workers=1)
+            self._tables[weights.name] = (version, table)
+        return table
+    
+    def get_collaborative_model(self) -> Optional[CollaborativeModel]:
+        """Коллаборативная модель, согласованная с каталогом (None — модели нет или она от другого каталога).
+        
+        Книги, добавленные после обучения, получают нулевую коллаборативную оценку до переобучения.
+        """
+        version = self.book_db.catalog_version
+        if self._collaborative is not None and self._collaborative[0] == version:
+            return self._collaborative[1]
+        
+        with self._lock:
+            model = self._collaborative[1] if self._collaborative is not None else None
+            if model is None and self.collaborative_dir:
+                model = CollaborativeModel.load(self.collaborative_dir)
+            if model is not None and not model.matches_catalog(self.book_db.books["id"].to_numpy()):
+                model = None
+            self._collaborative = (version, model)
+        return model
+    
+    def get_description_vectors(self) -> Optional[DescriptionVectors]:
+        """Векторы описаний, согласованные с каталогом (None — их нет или они от другого каталога).
+        
+        У книг, добавленных после построения, схожесть описаний 0 до перестроения.
+        """
+        version = self.book_db.catalog_version
+        if self._descriptions is not None and self._descriptions[0] == version:
+            return self._descriptions[1]
+        
+        with self._lock:
+            vectors = self._descriptions[1] if self._descriptions is not None else None
+            if vectors is None and self.description_dir:
+                vectors = DescriptionVectors.load(self.description_dir)
+            if vectors is not None and not vectors.matches_catalog(self.book_db.books["id"].to_numpy()):
+                vectors = None
+            self._descriptions = (version, vectors)
+        return vectors
+    
+    def collaborative_scores(self, username: str) -> Optional[np.ndarray]:
+        """Коллаборативные оценки всех книг каталога для пользователя (не больше 1) по его текущим
+        отзывам и спискам; None — модели нет или она ничего не может предложить"""
+        model = self.get_collaborative_model()
+        if model is None:
+            return None
+        
+        ratings = [(username, book_id, review["rating"])
+                   for book_id, review in self.book_page_manager.get_user_reviews(username)]
+        list_books = []
+        lists_manager = getattr(self.book_page_manager, "lists_manager", None)
+        if lists_manager is not None:
+            for list_name, book_list in lists_manager.get_user_lists(username).items():
+                list_books.extend((username, list_name, book_id) for book_id in book_list.book_ids)
+        user = Interactions.from_events(model.row_ids, ratings, list_books)
+        if not user.nnz:
+            return None
+        
+        scores = np.zeros(len(self.book_db.books), dtype=np.float64)
+        for share, part in ((ITEM_ITEM_SHARE, model.item_item_scores(user)),
+                            (1 - ITEM_ITEM_SHARE, model.als_scores(user))):
+            # Каждая часть нормируется своим максимумом по модулю
+            scale = np.max(np.abs(part)) if len(part) else 0
+            if scale > 0:
+                scores[:model.n_rows] += share * part / scale
+        return scores if np.any(scores > 0) else None
+    
+    def _blended_positions(self, position: int, excluded: np.ndarray, collaborative: Optional[np.ndarray],
+                           limit: int, scores: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Лучшие книги по смеси схожести с книгой position и коллаборативной оценки.
+        
+        Схожесть — оценка по атрибутам (нормированная максимумом среди кандидатов),
+        смешанная с косинусом описаний, если есть векторы. Кандидаты — самые похожие
+        книги по атрибутам, по описаниям (для плотных векторов) и книги с наибольшей
+        коллаборативной оценкой; при равенстве выше похожие по атрибутам.
+        """
+        content_positions, _ = self.similar_positions(position, excluded, BLEND_CANDIDATES, scores=scores)
+        candidate_lists = [content_positions]
+        descriptions = self.get_description_vectors()
+        was_excluded = excluded[position]
+        excluded[position] = True
+        if descriptions is not None:
+            candidate_lists.append(descriptions.most_similar(position, excluded, BLEND_CANDIDATES))
+        if collaborative is not None:
+            collaborative_positions = np.flatnonzero((collaborative > 0) & ~excluded)
+            candidate_lists.append(collaborative_positions[
+                top_k(collaborative[collaborative_positions], BLEND_CANDIDATES)])
+        excluded[position] = was_excluded
+        
+        candidates = np.concatenate(candidate_lists).astype(np.int64)
+        candidates = candidates[np.sort(np.unique(candidates, return_index=True)[1])]
+        content_scores = self.get_scorer().pair_scores(position, candidates)
+        scale = content_scores.max() if len(candidates) and content_scores.max() > 0 else 1.0
+        content_scores = content_scores / scale
+        if descriptions is not None:
+            content_scores = ((1 - DESCRIPTION_WEIGHT) * content_scores +
+                              DESCRIPTION_WEIGHT * descriptions.similarities(position, candidates))
+        blended = content_scores
+        if collaborative is not None:
+            blended = (1 - COLLABORATIVE_WEIGHT) * content_scores + COLLABORATIVE_WEIGHT * collaborative[candidates]
+        top = top_k(blended, limit)
+        top = top[blended[top] > 0]
+        return candidates[top], blended[top]
+    
+    def similar_positions(self, position: int, excluded: np.ndarray, limit: int,
+                          weights: SimilarityWeights = RECOMMENDER_WEIGHTS,
+                          scores: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Позиции самых похожих книг (кроме исключенных и самой книги) и их оценки.
+        
+        Берутся из списка соседей, если в нем хватает неисключенных книг; иначе
+        оцениваются только книги из постингов значений (candidate_scores), а полный
+        проход по каталогу нужен, лишь когда книга вне кандидатов может войти в
+        результат: по несобранным постингам и бонусу за рейтинг ее оценка может быть
+        не ниже последней найденной (scores — уже посчитанная строка оценок).
+        """
+        scorer = self.get_scorer(weights)
+        was_excluded = excluded[position]
+        excluded[position] = True
+        try:
+            table = self.get_neighbor_table(weights) if scores is None else None
+            if table is not None:
+                neighbor_ids, _ = table.neighbors(position)
+                positions = np.array([self.book_db.get_position(book_id) for book_id in neighbor_ids], dtype=np.int64)
+                positions = positions[~excluded[positions]][:limit]
+                if len(positions) == limit or table.is_complete(position):
+                    return positions, scorer.pair_scores(position, positions)
             
-            # По тропам
-            if (isinstance(book.get("plot_tropes"), list) and 
-                isinstance(target.get("plot_tropes"), list)):
-                common_tropes = set(book["plot_tropes"]).intersection(set(target["plot_tropes"]))
-                similarity_score += len(common_tropes) * 0.3
+            if scores is None and self.candidate_cap is not None:
+                candidates, candidate_scores, skipped_weight = scorer.candidate_scores(position, self.candidate_cap)
+                top = scorer.rank(candidate_scores, excluded, limit, candidates)
+                top_scores = candidate_scores[np.searchsorted(candidates, top)]
+                # Верхняя граница оценки книги вне кандидатов; при равенстве она может
+                # оказаться выше по рейтингу или порядку каталога
+                outside_bound = skipped_weight + max(scorer.weights.rating_bonus, 0.0)
+                if outside_bound <= 0 or (len(top) == limit and top_scores[-1] > outside_bound):
+                    return top, top_scores
             
-            if similarity_score > 0:
-                book_dict = book.to_dict()
-                book_dict["similarity_score"] = similarity_score
-                similar_books.append(book_dict)
-        
-        # Сортируем по схожести и рейтингу
-        similar_books.sort(key=lambda x: (x["similarity_score"], x["rating"]), reverse=True)
+            if scores is None:
+                scores = scorer.scores([position])[0]
+            top = scorer.rank(scores, excluded, limit)
+            return top, scores[top]
+        finally:
+            excluded[position] = was_excluded
+    
+    def _find_similar_books(self, book_id: int, exclude_ids: set, limit: int = 5) -> List[Dict]:
+        """Поиск похожих книг"""
+        position = self.book_db.get_position(book_id)
+        if position is None:
+            return []
         
-        return similar_books[:limit]
+        return self._book_records(*self.similar_positions(position, self._exclusion_mask(exclude_ids), limit))
+    
+    def _exclusion_mask(self, book_ids) -> np.ndarray:
+        """Маска исключенных книг по позициям каталога (неизвестные id пропускаются)"""
+        excluded = np.zeros(len(self.book_db.books), dtype=bool)
+        positions = [self.book_db.get_position(book_id) for book_id in book_ids]
+        excluded[[position for position in positions if position is not None]] = True
+        return excluded
+    
+    def _book_records(self, positions: np.ndarray, scores: np.ndarray) -> List[Dict]:
+        """Карточки книг с оценкой схожести (или смешанной оценкой, если есть коллаборативная модель)"""
+        similar_books = self.book_db.books.iloc[positions].to_dict("records")
+        for book, score in zip(similar_books, scores):
+            book["similarity_score"] = float(score)
+        return similar_books
+    
+    def get_popularity(self) -> PopularityRanking:
+        """Порядок книг по популярности для текущей версии каталога (добавленные книги вставляются в него)"""
+        version = self.book_db.catalog_version
+        cached = self._popularity
+        if cached is None or cached[0] != version:
+            books = self.book_db.books
+            with self._lock:
+                if cached is not None and cached[1].n_rows <= len(books):
+                    ranking = cached[1].appended(books)
+                else:
+                    ranking = PopularityRanking(books)
+                self._popularity = cached = (version, ranking)
+        return cached[1]
+    
+    def popular_books(self, limit: int, exclude_ids=()) -> pd.DataFrame:
+        """Самые популярные книги (по рейтингу и году), кроме книг с id из exclude_ids"""
+        return self.book_db.books.iloc[self.get_popularity().top(limit, exclude_ids)]
     
     def _get_popular_books(self, limit: int = 15) -> List[Dict]:
         """Получение популярных книг (если нет отзывов)"""
-        all_books = self.book_db.books
-        
-        # Сортируем по рейтингу и году
-        popular = all_books.sort_values(
-            by=["rating", "year"], 
-            ascending=[False, False]
-        )
-        
-        return popular.head(limit).to_dict('records')
\ No newline at end of file
+        # Префикс готового порядка по рейтингу и году вместо сортировки каталога
+        return self.popular_books(limit).to_dict('records')
\ No newline at end of file
@@ -0,0 +1,552 @@
+import json
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from database import BOOK_COLUMNS, LIST_COLUMNS, parse_age_interval
+
+# Скалярные колонки лежат в таблице books, списковые — в таблице-связке book_attributes
+SCALAR_COLUMNS = [column for column in BOOK_COLUMNS if column not in LIST_COLUMNS]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS books (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT,
+    main_genre TEXT,
+    sub_genre TEXT,
+    rating REAL,
+    year INTEGER,
+    pages INTEGER,
+    description TEXT,
+    cover_image TEXT,
+    character_age TEXT,
+    character_profession TEXT,
+    character_gender TEXT,
+    setting_time_period TEXT,
+    setting_location TEXT,
+    setting_type TEXT,
+    pacing TEXT,
+    age_min REAL,
+    age_max REAL
+);
+CREATE INDEX IF NOT EXISTS idx_books_genre ON books (main_genre, sub_genre);
+CREATE INDEX IF NOT EXISTS idx_books_sub_genre ON books (sub_genre);
+
+CREATE TABLE IF NOT EXISTS book_attributes (
+    book_id INTEGER NOT NULL REFERENCES books (id),
+    attribute TEXT NOT NULL,
+    value TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (book_id, attribute, position)
+);
+CREATE INDEX IF NOT EXISTS idx_book_attributes_value ON book_attributes (attribute, value, book_id);
+
+CREATE TABLE IF NOT EXISTS reviews (
+    pk INTEGER PRIMARY KEY AUTOINCREMENT,
+    book_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    username TEXT NOT NULL,
+    rating INTEGER NOT NULL,
+    text TEXT,
+    date TEXT,
+    likes INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_reviews_book_user ON reviews (book_id, username);
+CREATE INDEX IF NOT EXISTS idx_reviews_user ON reviews (username);
+
+CREATE TABLE IF NOT EXISTS user_lists (
+    username TEXT NOT NULL,
+    list_name TEXT NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT DEFAULT '',
+    PRIMARY KEY (username, list_name)
+);
+
+CREATE TABLE IF NOT EXISTS list_books (
+    username TEXT NOT NULL,
+    list_name TEXT NOT NULL,
+    book_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (username, list_name, book_id)
+);
+CREATE INDEX IF NOT EXISTS idx_list_books_list ON list_books (username, list_name, position);
+
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    email TEXT NOT NULL,
+    password_hash TEXT NOT NULL,
+    created_at TEXT,
+    preferences TEXT,
+    reading_stats TEXT,
+    taste_profile TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users (email);
+"""
+
+# Интервал возраста героя (разобранный character_age) для индексированного фильтра по диапазону;
+# индекс создается после добавления колонок в базу, созданную до их появления
+AGE_COLUMNS = ["age_min", "age_max"]
+AGE_INDEX = "CREATE INDEX IF NOT EXISTS idx_books_age ON books (age_min, age_max)"
+
+# Книг в порции импорта каталога (строки порции собираются в памяти перед executemany)
+IMPORT_CHUNK_SIZE = 10_000
+
+# SQLite ограничивает число параметров в одном запросе
+QUERY_CHUNK_SIZE = 900
+
+
+class SQLiteStorage:
+    """Хранилище каталога, отзывов, списков и пользователей в SQLite"""
+
+    def __init__(self, db_path: str = "libro.db"):
+        self.db_path = db_path
+        # Streamlit выполняет скрипт в разных потоках, доступ сериализуем блокировкой
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.lock = threading.RLock()
+
+        with self.lock:
+            self.connection.executescript(SCHEMA)
+            # Колонки, добавленные после создания базы
+            user_columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(users)")}
+            if "taste_profile" not in user_columns:
+                self.connection.execute("ALTER TABLE users ADD COLUMN taste_profile TEXT")
+                self.connection.commit()
+            book_columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(books)")}
+            if "age_min" not in book_columns:
+                for column in AGE_COLUMNS:
+                    self.connection.execute(f"ALTER TABLE books ADD COLUMN {column} REAL")
+                self._fill_age_columns()
+            self.connection.execute(AGE_INDEX)
+            self.connection.commit()
+
+    def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        """Выполнение запроса на чтение"""
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def _write(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        """Выполнение запроса на запись с фиксацией транзакции"""
+        with self.lock:
+            cursor = self.connection.execute(sql, params)
+            self.connection.commit()
+            return cursor
+
+    def is_empty(self, table: str) -> bool:
+        """Проверка, есть ли в таблице данные (для первичного импорта из JSON)"""
+        if table not in ("books", "reviews", "user_lists", "users"):
+            raise ValueError(f"Неизвестная таблица: {table}")
+        return not self._query(f"SELECT 1 FROM {table} LIMIT 1")
+
+    # Каталог книг
+
+    def import_books(self, books_df: pd.DataFrame):
+        """Импорт каталога из DataFrame (схема dataclass Book) одной транзакцией.
+
+        Строки собираются порциями по IMPORT_CHUNK_SIZE книг и пишутся executemany;
+        возраст каждого различного значения разбирается один раз.
+        """
+        columns = SCALAR_COLUMNS + AGE_COLUMNS
+        insert_books = f"INSERT OR REPLACE INTO books ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        age_bounds = {}
+        with self.lock, self.connection:
+            for start in range(0, len(books_df), IMPORT_CHUNK_SIZE):
+                records = books_df.iloc[start:start + IMPORT_CHUNK_SIZE].to_dict("records")
+                book_ids, book_rows, attribute_rows = [], [], []
+                for record in records:
+                    age = self._to_sql_value(record.get("character_age"))
+                    if age not in age_bounds:
+                        age_bounds[age] = self._age_bounds(age)
+                    book_id = self._to_sql_value(record["id"])
+                    book_ids.append((book_id,))
+                    book_rows.append(tuple(self._to_sql_value(record.get(column)) for column in SCALAR_COLUMNS)
+                                     + age_bounds[age])
+                    for attribute in LIST_COLUMNS:
+                        values = record.get(attribute)
+                        if isinstance(values, list):
+                            attribute_rows.extend((book_id, attribute, value, position)
+                                                  for position, value in enumerate(values))
+                self.connection.executemany(insert_books, book_rows)
+                self.connection.executemany("DELETE FROM book_attributes WHERE book_id = ?", book_ids)
+                self.connection.executemany(
+                    "INSERT INTO book_attributes (book_id, attribute, value, position) VALUES (?, ?, ?, ?)",
+                    attribute_rows
+                )
+
+    def _fill_age_columns(self):
+        """Заполнение age_min / age_max у книг, импортированных до появления колонок:
+        каждое различное значение возраста разбирается один раз"""
+        ages = [row["character_age"] for row in
+                self.connection.execute("SELECT DISTINCT character_age FROM books WHERE character_age IS NOT NULL")]
+        self.connection.executemany(
+            "UPDATE books SET age_min = ?, age_max = ? WHERE character_age = ?",
+            [self._age_bounds(age) + (age,) for age in ages]
+        )
+
+    @staticmethod
+    def _age_bounds(age) -> Tuple[Optional[float], Optional[float]]:
+        """Границы интервала возраста для SQL: неразобранный возраст — NULL (не попадает в диапазоны),
+        «40+» — верхняя граница inf"""
+        age_min, age_max = parse_age_interval(age)
+        if np.isnan(age_min):
+            return None, None
+        return age_min, age_max
+
+    def _to_sql_value(self, value):
+        """Приведение значений pandas/numpy к типам SQLite"""
+        if value is None or (not isinstance(value, str) and pd.isna(value)):
+            return None
+        if hasattr(value, "item"):
+            return value.item()
+        return value
+
+    def read_columns(self, columns: List[str]) -> pd.DataFrame:
+        """Чтение колонок каталога (тот же интерфейс, что у CatalogLoader)"""
+        scalar = [column for column in columns if column in SCALAR_COLUMNS and column != "id"]
+        rows = self._query(f"SELECT {', '.join(['id'] + scalar)} FROM books ORDER BY id")
+        book_ids = [row["id"] for row in rows]
+
+        data = {"id": book_ids}
+        for column in scalar:
+            data[column] = [row[column] for row in rows]
+
+        for attribute in [column for column in columns if column in LIST_COLUMNS]:
+            values_by_book = {}
+            for row in self._query(
+                "SELECT book_id, value FROM book_attributes WHERE attribute = ? ORDER BY book_id, position",
+                (attribute,)
+            ):
+                values_by_book.setdefault(row["book_id"], []).append(row["value"])
+            data[attribute] = [values_by_book.get(book_id, []) for book_id in book_ids]
+
+        return pd.DataFrame(data, columns=columns)
+
+    def iter_columns(self, columns: List[str], chunk_size: int) -> Iterator[pd.DataFrame]:
+        """Потоковое чтение колонок порциями (тот же интерфейс, что у CatalogLoader): книги по id,
+        следующая порция начинается после последнего прочитанного id"""
+        scalar = [column for column in columns if column in SCALAR_COLUMNS and column != "id"]
+        last_id = None
+        while True:
+            where = "" if last_id is None else " WHERE id > ?"
+            rows = self._query(f"SELECT {', '.join(['id'] + scalar)} FROM books{where} ORDER BY id LIMIT ?",
+                               (() if last_id is None else (last_id,)) + (chunk_size,))
+            if not rows:
+                return
+            book_ids = [row["id"] for row in rows]
+            last_id = book_ids[-1]
+
+            data = {"id": book_ids}
+            for column in scalar:
+                data[column] = [row[column] for row in rows]
+            for attribute in [column for column in columns if column in LIST_COLUMNS]:
+                values_by_book = {}
+                for row in self._query(
+                    "SELECT book_id, value FROM book_attributes WHERE attribute = ? AND book_id BETWEEN ? AND ? "
+                    "ORDER BY book_id, position",
+                    (attribute, book_ids[0], last_id)
+                ):
+                    values_by_book.setdefault(row["book_id"], []).append(row["value"])
+                data[attribute] = [values_by_book.get(book_id, []) for book_id in book_ids]
+            yield pd.DataFrame(data, columns=columns)
+
+    def get_book(self, book_id: int) -> Optional[Dict]:
+        """Получение книги по первичному ключу"""
+        books = self.get_books([book_id])
+        return books[0] if books else None
+
+    def get_books(self, book_ids: List[int], columns: List[str] = BOOK_COLUMNS) -> List[Dict]:
+        """Пакетное получение книг по id (порядок сохраняется), только нужные колонки"""
+        scalar = ["id"] + [column for column in columns if column in SCALAR_COLUMNS and column != "id"]
+        attributes = [column for column in columns if column in LIST_COLUMNS]
+
+        found = {}
+        for start in range(0, len(book_ids), QUERY_CHUNK_SIZE):
+            chunk = [int(book_id) for book_id in book_ids[start:start + QUERY_CHUNK_SIZE]]
+            placeholders = ", ".join("?" for _ in chunk)
+
+            for row in self._query(f"SELECT {', '.join(scalar)} FROM books WHERE id IN ({placeholders})",
+                                   tuple(chunk)):
+                book = dict(row)
+                for attribute in attributes:
+                    book[attribute] = []
+                found[book["id"]] = book
+
+            if not attributes:
+                continue
+
+            for row in self._query(
+                f"SELECT book_id, attribute, value FROM book_attributes "
+                f"WHERE book_id IN ({placeholders}) AND attribute IN ({', '.join('?' for _ in attributes)}) "
+                f"ORDER BY book_id, attribute, position",
+                tuple(chunk) + tuple(attributes)
+            ):
+                found[row["book_id"]][row["attribute"]].append(row["value"])
+
+        return [{column: found[int(book_id)][column] for column in columns}
+                for book_id in book_ids if int(book_id) in found]
+
+    def filter_book_ids(self, filters: Dict) -> np.ndarray:
+        """Фильтрация каталога индексированным запросом (семантика BookFilter.apply_filters)"""
+        where, params = self._filter_where(filters)
+        rows = self._query(f"SELECT id FROM books{where} ORDER BY id", params)
+        return np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+
+    def facet_counts(self, filters: Dict, columns: List[str],
+                     present: List[str] = ()) -> Dict[str, Dict[object, int]]:
+        """Число книг по фильтрам для каждого значения колонок (как FilterIndex.facet_counts):
+        пропуски не считаются, present — колонки, которые должны быть заполнены у книги"""
+        where, params = self._filter_where(filters, [f"{column} IS NOT NULL" for column in present])
+        facets = {}
+        for column in columns:
+            if column in LIST_COLUMNS:
+                rows = self._query(
+                    f"SELECT value, COUNT(DISTINCT book_id) FROM book_attributes "
+                    f"WHERE attribute = ? AND book_id IN (SELECT id FROM books{where}) GROUP BY value ORDER BY value",
+                    (column,) + params
+                )
+            elif column in SCALAR_COLUMNS:
+                column_where = f"{where} AND {column} IS NOT NULL" if where else f" WHERE {column} IS NOT NULL"
+                rows = self._query(
+                    f"SELECT {column}, COUNT(*) FROM books{column_where} GROUP BY {column} ORDER BY {column}", params
+                )
+            else:
+                raise KeyError(column)
+            facets[column] = {row[0]: row[1] for row in rows}
+        return facets
+
+    def explain_filter(self, filters: Dict) -> List[str]:
+        """План SQLite для запроса фильтра (EXPLAIN QUERY PLAN)"""
+        where, params = self._filter_where(filters)
+        return [row["detail"] for row in self._query(f"EXPLAIN QUERY PLAN SELECT id FROM books{where} ORDER BY id",
+                                                     params)]
+
+    def _filter_where(self, filters: Dict, conditions: List[str] = ()) -> Tuple[str, tuple]:
+        """Условие WHERE и параметры для фильтров (conditions — дополнительные условия)"""
+        conditions = list(conditions)
+        params = []
+
+        for key, value in filters.items():
+            if not value:
+                continue
+
+            if key == "min_rating":
+                conditions.append("rating >= ?")
+                params.append(value)
+            elif key == "character_age_range":
+                min_age, max_age = value
+                conditions.append("age_min <= ? AND age_max >= ?")
+                params.extend([max_age, min_age])
+            elif key in LIST_COLUMNS:
+                if not isinstance(value, list):
+                    # Список не равен отдельному значению: ни одна книга не подходит (как в памяти)
+                    conditions.append("0")
+                    continue
+                values = value
+                placeholders = ", ".join("?" for _ in values)
+                conditions.append(
+                    f"id IN (SELECT book_id FROM book_attributes WHERE attribute = ? AND value IN ({placeholders}))"
+                )
+                params.append(key)
+                params.extend(values)
+            elif key in SCALAR_COLUMNS:
+                if isinstance(value, list):
+                    conditions.append(f"{key} IN ({', '.join('?' for _ in value)})")
+                    params.extend(value)
+                else:
+                    conditions.append(f"{key} = ?")
+                    params.append(value)
+            else:
+                raise KeyError(key)
+
+        return (f" WHERE {' AND '.join(conditions)}" if conditions else ""), tuple(params)
+
+    # Отзывы
+
+    def import_reviews(self, reviews: Dict[str, List[Dict]]):
+        """Импорт отзывов из формата book_reviews.json"""
+        for book_id, book_reviews in reviews.items():
+            self.replace_book_reviews(int(book_id), book_reviews)
+
+    def get_book_reviews(self, book_id: int) -> List[Dict]:
+        """Отзывы к книге"""
+        rows = self._query(
+            "SELECT id, username, rating, text, date, likes FROM reviews WHERE book_id = ? ORDER BY pk",
+            (int(book_id),)
+        )
+        return [dict(row) for row in rows]
+
+    def get_user_reviews(self, username: str) -> List[Tuple[int, Dict]]:
+        """Отзывы пользователя в виде пар (book_id, отзыв)"""
+        rows = self._query(
+            "SELECT book_id, id, username, rating, text, date, likes FROM reviews WHERE username = ? ORDER BY pk",
+            (username,)
+        )
+        return [(row["book_id"], {key: row[key] for key in row.keys() if key != "book_id"}) for row in rows]
+
+    def replace_book_reviews(self, book_id: int, reviews: List[Dict]):
+        """Полная замена отзывов к книге"""
+        with self.lock:
+            self.connection.execute("DELETE FROM reviews WHERE book_id = ?", (int(book_id),))
+            self.connection.executemany(
+                "INSERT INTO reviews (book_id, id, username, rating, text, date, likes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(int(book_id), review["id"], review["username"], review["rating"],
+                  review.get("text", ""), review.get("date"), review.get("likes", 0)) for review in reviews]
+            )
+            self.connection.commit()
+
+    def add_review(self, book_id: int, review: Dict):
+        """Добавление отзыва"""
+        self._write(
+            "INSERT INTO reviews (book_id, id, username, rating, text, date, likes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (int(book_id), review["id"], review["username"], review["rating"],
+             review["text"], review["date"], review.get("likes", 0))
+        )
+
+    def like_review(self, book_id: int, review_id: int) -> Optional[int]:
+        """Лайк отзыва, возвращает новое число лайков"""
+        self._write("UPDATE reviews SET likes = likes + 1 WHERE book_id = ? AND id = ?", (int(book_id), review_id))
+        rows = self._query("SELECT likes FROM reviews WHERE book_id = ? AND id = ?", (int(book_id), review_id))
+        return rows[0]["likes"] if rows else None
+
+    def iter_book_ids_with_reviews(self) -> List[str]:
+        """Id книг, у которых есть отзывы"""
+        return [str(row["book_id"]) for row in self._query("SELECT DISTINCT book_id FROM reviews ORDER BY book_id")]
+
+    def get_all_ratings(self) -> List[Tuple[str, int, int]]:
+        """Все оценки в виде (username, book_id, rating) — для обучения рекомендателя"""
+        return [tuple(row) for row in self._query("SELECT username, book_id, rating FROM reviews ORDER BY pk")]
+
+    # Списки пользователей
+
+    def get_user_lists(self, username: str) -> Dict[str, Dict]:
+        """Списки пользователя в формате user_lists.json"""
+        lists = {}
+        for row in self._query("SELECT list_name, name, description FROM user_lists WHERE username = ?", (username,)):
+            lists[row["list_name"]] = {"name": row["name"], "book_ids": [], "description": row["description"]}
+
+        for row in self._query(
+            "SELECT list_name, book_id FROM list_books WHERE username = ? ORDER BY list_name, position",
+            (username,)
+        ):
+            if row["list_name"] in lists:
+                lists[row["list_name"]]["book_ids"].append(row["book_id"])
+        return lists
+
+    def get_list_book_ids(self, username: str, list_name: str) -> List[int]:
+        """Id книг в списке пользователя"""
+        rows = self._query(
+            "SELECT book_id FROM list_books WHERE username = ? AND list_name = ? ORDER BY position",
+            (username, list_name)
+        )
+        return [row["book_id"] for row in rows]
+
+    def save_list(self, username: str, list_name: str, name: str, description: str = ""):
+        """Создание списка (существующий список не перезаписывается)"""
+        self._write(
+            "INSERT OR IGNORE INTO user_lists (username, list_name, name, description) VALUES (?, ?, ?, ?)",
+            (username, list_name, name, description)
+        )
+
+    def add_list_book(self, username: str, list_name: str, book_id: int):
+        """Добавление книги в конец списка"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT COALESCE(MAX(position), -1) + 1 FROM list_books WHERE username = ? AND list_name = ?",
+                (username, list_name)
+            ).fetchone()
+            self.connection.execute(
+                "INSERT OR IGNORE INTO list_books (username, list_name, book_id, position) VALUES (?, ?, ?, ?)",
+                (username, list_name, int(book_id), row[0])
+            )
+            self.connection.commit()
+
+    def remove_list_book(self, username: str, list_name: str, book_id: int):
+        """Удаление книги из списка"""
+        self._write(
+            "DELETE FROM list_books WHERE username = ? AND list_name = ? AND book_id = ?",
+            (username, list_name, int(book_id))
+        )
+
+    def get_all_list_books(self) -> List[Tuple[str, str, int]]:
+        """Все книги во всех списках в виде (username, list_name, book_id)"""
+        rows = self._query("SELECT username, list_name, book_id FROM list_books ORDER BY username, list_name, position")
+        return [tuple(row) for row in rows]
+
+    def import_user_lists(self, user_lists: Dict[str, Dict[str, Dict]]):
+        """Импорт списков из формата user_lists.json"""
+        for username, lists_dict in user_lists.items():
+            for list_name, list_data in lists_dict.items():
+                self.save_list(username, list_name, list_data["name"], list_data.get("description", ""))
+                for book_id in list_data.get("book_ids", []):
+                    self.add_list_book(username, list_name, book_id)
+
+    # Пользователи
+
+    def get_user(self, username: str) -> Optional[Dict]:
+        """Данные пользователя по имени (без профиля вкуса)"""
+        rows = self._query(
+            "SELECT username, email, password_hash, created_at, preferences, reading_stats "
+            "FROM users WHERE username = ?",
+            (username,)
+        )
+        if not rows:
+            return None
+
+        user_data = dict(rows[0])
+        for key in ("preferences", "reading_stats"):
+            user_data[key] = json.loads(user_data[key]) if user_data[key] else None
+        return user_data
+
+    def email_exists(self, email: str) -> bool:
+        """Проверка занятости email"""
+        return bool(self._query("SELECT 1 FROM users WHERE email = ? LIMIT 1", (email,)))
+
+    def save_user(self, user_data: Dict):
+        """Создание или обновление пользователя (сохраненный профиль вкуса не меняется)"""
+        self._write(
+            "INSERT INTO users (username, email, password_hash, created_at, preferences, reading_stats) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (username) DO UPDATE SET email = excluded.email, "
+            "password_hash = excluded.password_hash, created_at = excluded.created_at, "
+            "preferences = excluded.preferences, reading_stats = excluded.reading_stats",
+            (user_data["username"], user_data["email"], user_data["password_hash"], user_data["created_at"],
+             json.dumps(user_data.get("preferences"), ensure_ascii=False),
+             json.dumps(user_data.get("reading_stats"), ensure_ascii=False))
+        )
+
+    def get_taste_profile(self, username: str) -> Optional[Dict]:
+        """Профиль вкуса пользователя (None — еще не построен)"""
+        rows = self._query("SELECT taste_profile FROM users WHERE username = ?", (username,))
+        return json.loads(rows[0]["taste_profile"]) if rows and rows[0]["taste_profile"] else None
+
+    def save_taste_profile(self, username: str, profile: Dict):
+        """Обновление одного профиля вкуса (остальные данные пользователя не перезаписываются)"""
+        self._write("UPDATE users SET taste_profile = ? WHERE username = ?",
+                    (json.dumps(profile, ensure_ascii=False), username))
+
+
+class ReviewsView(MutableMapping):
+    """Словарь отзывов {book_id: [reviews]} поверх SQLite (совместим с book_reviews.json)"""
+
+    def __init__(self, storage: SQLiteStorage):
+        self.storage = storage
+
+    def __getitem__(self, book_id: str) -> List[Dict]:
+        reviews = self.storage.get_book_reviews(int(book_id))
+        if not reviews:
+            raise KeyError(book_id)
+        return reviews
+
+    def __setitem__(self, book_id: str, reviews: List[Dict]):
+        self.storage.replace_book_reviews(int(book_id), reviews)
+
+    def __delitem__(self, book_id: str):
+        self.storage.replace_book_reviews(int(book_id), [])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.storage.iter_book_ids_with_reviews())
+
+    def __len__(self) -> int:
+        return len(self.storage.iter_book_ids_with_reviews())
\ No newline at end of file
@@ -0,0 +1,170 @@
+"""Профили вкуса пользователей: взвешенные суммы признаков понравившихся книг.
+
+Профиль меняется на O(признаков книги) при отзыве с оценкой от 4 и при
+добавлении книги в «Любимые» (или удалении из них) и сохраняется отдельно для
+каждого пользователя. Оценки книг каталога по профилю — одно произведение матрицы
+признаков книг на вектор профиля, без цикла по понравившимся книгам.
+"""
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+# Признаки профиля и их вес в оценке книги (как в формулах схожести neighbors.py)
+PROFILE_SCALAR_WEIGHTS = {"main_genre": 3.0}
+PROFILE_LIST_WEIGHTS = {"mood": 0.5, "plot_tropes": 0.3, "tags": 0.3}
+
+# Вклад книги в профиль: отзыв — оценка минус 3 (4 → 1, 5 → 2), любимая книга — 2
+GOOD_RATING = 4
+FAVORITES_LIST = "favorites"
+FAVORITE_WEIGHT = 2.0
+
+# Накопленный вес меньше этого считается нулем (после вычитаний)
+_EPSILON = 1e-9
+
+
+def review_weight(rating) -> float:
+    """Вклад отзыва в профиль (0 — оценка ниже GOOD_RATING)"""
+    return float(rating) - (GOOD_RATING - 1) if rating >= GOOD_RATING else 0.0
+
+
+@dataclass
+class TasteProfile:
+    """Профиль вкуса: {колонка: {значение: вес}} и суммарный вклад каждой книги {id: вес}"""
+    features: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    books: Dict[int, float] = field(default_factory=dict)
+
+    def is_empty(self) -> bool:
+        return not self.books
+
+    def add(self, book_id: int, book_features: Dict[str, List[str]], weight: float):
+        """Добавление признаков книги с весом weight (отрицательный вес — удаление)"""
+        for column, values in book_features.items():
+            column_weights = self.features.setdefault(column, {})
+            for value in values:
+                total = column_weights.get(value, 0.0) + weight
+                if abs(total) < _EPSILON:
+                    column_weights.pop(value, None)
+                else:
+                    column_weights[value] = total
+            if not column_weights:
+                del self.features[column]
+        total = self.books.get(book_id, 0.0) + weight
+        if abs(total) < _EPSILON:
+            self.books.pop(book_id, None)
+        else:
+            self.books[book_id] = total
+
+    def to_dict(self) -> Dict:
+        """Формат хранения (ключи JSON — строки)"""
+        return {"features": self.features, "books": {str(book_id): weight for book_id, weight in self.books.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "TasteProfile":
+        return cls({column: dict(values) for column, values in data.get("features", {}).items()},
+                   {int(book_id): weight for book_id, weight in data.get("books", {}).items()})
+
+
+class TasteProfileManager:
+    """Профили вкуса пользователей: обновление по событиям, хранение через UserManager.
+    
+    Менеджер общий для всех сессий Streamlit, поэтому профили меняются под блокировкой.
+    """
+
+    def __init__(self, book_db, auth_manager):
+        self.book_db = book_db
+        self.auth_manager = auth_manager
+        self.profiles: Dict[str, TasteProfile] = {}
+        self._lock = threading.RLock()
+
+    def get_profile(self, username: str) -> Optional[TasteProfile]:
+        """Профиль пользователя (None — еще не построен)"""
+        with self._lock:
+            profile = self.profiles.get(username)
+            if profile is None:
+                data = self.auth_manager.get_taste_profile(username)
+                if data is None:
+                    return None
+                profile = self.profiles[username] = TasteProfile.from_dict(data)
+            return profile
+
+    def rebuild(self, username: str, reviews: Iterable[Tuple[int, Dict]], favorite_ids: Iterable[int]) -> TasteProfile:
+        """Построение профиля по всем отзывам и любимым книгам (для пользователей без сохраненного профиля)"""
+        profile = TasteProfile()
+        for book_id, review in reviews:
+            self._add_book(profile, book_id, review_weight(review["rating"]))
+        for book_id in favorite_ids:
+            self._add_book(profile, book_id, FAVORITE_WEIGHT)
+        self._save(username, profile)
+        return profile
+
+    def on_review(self, username: str, book_id: int, rating: int):
+        """Новый отзыв: книга с оценкой от GOOD_RATING добавляется в профиль"""
+        self._update(username, book_id, review_weight(rating))
+
+    def on_list_change(self, username: str, list_name: str, book_id: int, added: bool):
+        """Книга добавлена в список или удалена из него: учитываются только «Любимые»"""
+        if list_name == FAVORITES_LIST:
+            self._update(username, book_id, FAVORITE_WEIGHT if added else -FAVORITE_WEIGHT)
+
+    def _update(self, username: str, book_id: int, weight: float):
+        # Профиль, которого еще нет, строится полностью при первой рекомендации
+        if weight == 0:
+            return
+        with self._lock:
+            profile = self.get_profile(username)
+            if profile is not None and self._add_book(profile, book_id, weight):
+                self._save(username, profile)
+
+    def _add_book(self, profile: TasteProfile, book_id: int, weight: float) -> bool:
+        position = self.book_db.get_position(int(book_id))
+        if weight == 0 or position is None:
+            return False
+        profile.add(int(book_id), self.book_features(position), weight)
+        return True
+
+    def _save(self, username: str, profile: TasteProfile):
+        with self._lock:
+            self.profiles[username] = profile
+            self.auth_manager.update_taste_profile(username, profile.to_dict())
+
+    def book_features(self, position: int) -> Dict[str, List[str]]:
+        """Признаки книги для профиля: значения скалярных колонок и списков"""
+        books = self.book_db.books
+        features = {}
+        for column in PROFILE_SCALAR_WEIGHTS:
+            value = books[column].iat[position]
+            features[column] = [] if value is None or value != value else [str(value)]  # NaN — пропуск
+        for column in PROFILE_LIST_WEIGHTS:
+            features[column] = self.book_db.get_attribute_matrix(column).row_terms(position)
+        return features
+
+    def scores(self, profile: TasteProfile) -> np.ndarray:
+        """Оценки всех книг каталога: матрица признаков книг × вектор профиля"""
+        with self._lock:  # профиль может меняться отзывом из другой сессии
+            features = {column: dict(values) for column, values in profile.features.items()}
+        books = self.book_db.books
+        scores = np.zeros(len(books), dtype=np.float64)
+        for column, weight in PROFILE_SCALAR_WEIGHTS.items():
+            values = features.get(column)
+            if not values:
+                continue
+            categories = books[column].cat.categories
+            # Последний элемент вектора — для пропусков (код -1)
+            vector = np.zeros(len(categories) + 1, dtype=np.float64)
+            codes = categories.get_indexer(list(values))
+            known = codes != -1
+            vector[codes[known]] = np.fromiter(values.values(), dtype=np.float64, count=len(values))[known]
+            scores += weight * vector[books[column].cat.codes.to_numpy()]
+        for column, weight in PROFILE_LIST_WEIGHTS.items():
+            values = features.get(column)
+            if not values:
+                continue
+            matrix = self.book_db.get_attribute_matrix(column)
+            vector = np.zeros(matrix.n_terms, dtype=np.float64)
+            for value, value_weight in values.items():
+                code = matrix.term_index.get(value)
+                if code is not None:
+                    vector[code] = value_weight
+            scores += weight * matrix.dot(vector)
+        return scores
\ No newline at end of file
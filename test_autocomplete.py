@@ -0,0 +1,22 @@
+"""Автодополнение по префиксу: совпадение с началом любого слова и порядок по весу."""
+from autocomplete import PrefixIndex
+
+
+def test_complete_by_any_word_ordered_by_weight():
+    index = PrefixIndex(["Михаил Булгаков", "Булат Окуджава", "Лев Толстой", "Алексей Толстой"], [5, 3, 9, 2])
+    assert index.complete("бул") == [("Михаил Булгаков", 5.0), ("Булат Окуджава", 3.0)]
+    assert index.complete("Толст", 1) == [("Лев Толстой", 9.0)]
+    assert index.complete("лев т") == [("Лев Толстой", 9.0)]
+    assert index.complete("пушк") == []
+
+
+def test_value_matched_by_several_words_is_returned_once():
+    index = PrefixIndex(["мама мыла маму", "мышь"], [1, 2])
+    assert index.complete("м") == [("мышь", 2.0), ("мама мыла маму", 1.0)]
+
+
+def test_weights_override_skips_zero_counts():
+    index = PrefixIndex(["мрачное", "мистическое", "романтичное"], [10, 20, 30])
+    weights = index.weights_for({"мрачное": 4, "романтичное": 7})
+    assert index.complete("м", weights=weights) == [("мрачное", 4.0)]
+    assert index.complete("", weights=weights) == [("романтичное", 7.0), ("мрачное", 4.0)]
\ No newline at end of file
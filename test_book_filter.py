@@ -0,0 +1,83 @@
+"""Фильтры и опции при списковых фильтрах (настроение, тропы, теги).
+
+BookFilter получает горячую проекцию каталога без списковых колонок, поэтому
+выбранные настроения и тропы должны применяться через multi-hot матрицы.
+"""
+import os
+import pandas as pd
+from book_filter import DEFAULT_AGE_OPTIONS, LIST_FILTER_COLUMNS, BookFilter
+from database import BookDatabase, age_option_points, parse_age_interval
+
+CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "books.jsonl")
+
+
+def _expected_options(full_df: pd.DataFrame, mood: str):
+    """Тропы и точки возраста у книг с настроением mood — полным просмотром записей"""
+    selected = full_df[full_df["mood"].apply(lambda values: isinstance(values, list) and mood in values)]
+    tropes = sorted({trope for values in selected["plot_tropes"] if isinstance(values, list) for trope in values})
+    character = selected[["character_age", "character_gender", "character_profession"]].dropna()
+    ages = sorted({point for age in character["character_age"] for point in age_option_points(*parse_age_interval(age))})
+    return tropes, ages
+
+
+def test_selected_mood_restricts_options():
+    db = BookDatabase(CATALOG)
+    book_filter = BookFilter(db.books, None, db.get_attribute_matrices())
+    full_df = pd.read_json(CATALOG, lines=True)
+    assert "mood" not in book_filter.books_df.columns
+
+    all_tropes = book_filter.get_filter_options({})["plot"]["children"]["plot_tropes"]["options"]
+    checked = 0
+    for mood in sorted({mood for values in full_df["mood"] if isinstance(values, list) for mood in values}):
+        tropes, ages = _expected_options(full_df, mood)
+        options = book_filter.get_filter_options({"mood": [mood]})
+        assert options["plot"]["children"]["plot_tropes"]["options"] == tropes
+        assert options["character"]["children"]["character_age"]["options"] == (ages or DEFAULT_AGE_OPTIONS)
+        assert sorted(book_filter.complete("plot_tropes", "", 1000, {"mood": [mood]})) == tropes
+        checked += len(tropes) < len(all_tropes)
+    assert checked  # хотя бы одно настроение сужает список тропов
+
+
+def test_scalar_value_for_list_filter_matches_nothing():
+    db = BookDatabase(CATALOG)
+    book_filter = BookFilter(db.books, None, db.get_attribute_matrices())
+    options = book_filter.get_filter_options({"mood": "мрачное"})
+    assert options["plot"]["children"]["plot_tropes"]["options"] == []
+
+
+def test_single_value_for_list_filter_matches_nothing():
+    # Как в исходном apply_filters: список не равен отдельной строке
+    db = BookDatabase(CATALOG)
+    book_filter = BookFilter(db.books, None, db.get_attribute_matrices())
+    assert len(book_filter.apply_filters({"mood": ["мрачное"]})) > 0
+    assert book_filter.apply_filters({"mood": "мрачное"}).empty
+    assert book_filter.apply_filters({"tags": "фэнтези"}).empty
+    assert book_filter.apply_filters({"main_genre": "Фэнтези", "tags": "фэнтези"}).empty
+
+
+
+def _expected_ids(full_df: pd.DataFrame, filters):
+    """id книг по фильтрам — построчной проверкой полных записей (как исходный apply_filters)"""
+    selected = full_df
+    for key, values in filters.items():
+        if key in LIST_FILTER_COLUMNS:
+            selected = selected[selected[key].apply(
+                lambda row: isinstance(row, list) and any(value in row for value in values))]
+        else:
+            selected = selected[selected[key] == values]
+    return selected["id"].tolist()
+
+
+def test_list_filters_match_full_records():
+    db = BookDatabase(CATALOG)
+    book_filter = BookFilter(db.books, None, db.get_attribute_matrices())
+    full_df = pd.read_json(CATALOG, lines=True)
+    genre = full_df["main_genre"].mode()[0]
+    for column in LIST_FILTER_COLUMNS:
+        values = sorted({value for row in full_df[column] if isinstance(row, list) for value in row})
+        for filters in ({column: values[:1]}, {column: values[:3]}, {column: values[-2:], "main_genre": genre}):
+            assert book_filter.apply_filters(filters)["id"].tolist() == _expected_ids(full_df, filters), filters
+            # Та же маска при проверке условия просмотром (шаг плана вне индекса)
+            mask = book_filter._scan_mask(column, filters[column])
+            assert db.books["id"][mask].tolist() == _expected_ids(full_df, {column: filters[column]})
+        assert not book_filter._scan_mask(column, values[0]).any()  # отдельное значение — как в apply_filters
\ No newline at end of file
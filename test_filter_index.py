@@ -0,0 +1,65 @@
+"""Битмап-индекс фильтров: каждое условие совпадает с маской pandas по тем же данным."""
+import numpy as np
+import pandas as pd
+from filter_index import FilterIndex
+from multi_hot import MultiHotMatrix
+
+BOOKS = pd.DataFrame({
+    "main_genre": ["Фэнтези", "Классика", None, "Фэнтези", "Детектив", "Классика", "Фэнтези", "Классика", "Детектив"],
+    "pacing": ["быстрый", None, "медленный", "быстрый", "быстрый", "медленный", None, "быстрый", "медленный"],
+    "rating": [4.5, 3.9, np.nan, 4.95, 4.0, 4.26, 2.0, 5.0, 4.25],
+    "age_min": [20, 30, np.nan, 60, 14, 17, 40, np.nan, 25],
+    "age_max": [30, 40, np.nan, 99, 18, 17, 99, np.nan, 35],
+})
+MOODS = [["мрачное"], ["романтичное", "мрачное"], [], ["веселое"], ["мрачное"], [], ["романтичное"], ["веселое"], []]
+
+
+def _index():
+    return FilterIndex(BOOKS, {"mood": MultiHotMatrix(MOODS)}, ["main_genre", "pacing"])
+
+
+def test_scalar_values_match_pandas():
+    index = _index()
+    for value in ("Фэнтези", "Классика", "Нет такого", None):
+        expected = (BOOKS["main_genre"] == value).to_numpy()
+        assert index.to_mask(index.equals("main_genre", value)).tolist() == expected.tolist(), value
+    for values in (["Фэнтези", "Детектив"], ["Классика", None], []):
+        expected = BOOKS["main_genre"].isin(values).to_numpy()
+        assert index.to_mask(index.isin("main_genre", values)).tolist() == expected.tolist(), values
+    assert index.to_mask(index.where("pacing", lambda value: value.startswith("б"))).tolist() == \
+        (BOOKS["pacing"] == "быстрый").tolist()
+
+
+def test_list_values_any_of():
+    index = _index()
+    for terms in (["мрачное"], ["веселое", "романтичное"], ["неизвестное"]):
+        expected = [any(term in moods for term in terms) for moods in MOODS]
+        assert index.to_mask(index.any_of("mood", terms)).tolist() == expected, terms
+
+
+def test_rating_buckets_and_remainders():
+    index = _index()
+    for min_rating in (0.0, 2.0, 3.95, 4.0, 4.25, 4.26, 4.3, 5.0, 5.1):
+        expected = (BOOKS["rating"] >= min_rating).to_numpy()
+        bitmap = index.at_least_rating(min_rating)
+        assert index.to_mask(bitmap).tolist() == expected.tolist(), min_rating
+        assert index.count(bitmap) == index.count_rating_at_least(min_rating) == expected.sum()
+
+
+def test_age_overlap():
+    index = _index()
+    for min_age, max_age in ((18, 25), (17, 17), (30, 40), (60, 99), (0, 10)):
+        expected = ((BOOKS["age_min"] <= max_age) & (BOOKS["age_max"] >= min_age)).to_numpy()
+        assert index.to_mask(index.age_overlap(min_age, max_age)).tolist() == expected.tolist(), (min_age, max_age)
+
+
+def test_contains_and_facet_counts():
+    index = _index()
+    bitmap = index.isin("main_genre", ["Фэнтези", "Классика"])
+    positions = np.arange(len(BOOKS))
+    assert index.contains(bitmap, positions).tolist() == index.to_mask(bitmap).tolist()
+
+    mask = (BOOKS["rating"] >= 4).to_numpy()
+    facets = index.facet_counts(mask, ["main_genre", "mood"])
+    assert facets["main_genre"] == BOOKS.loc[mask, "main_genre"].value_counts().to_dict()
+    assert facets["mood"] == {"мрачное": 2, "веселое": 2}
\ No newline at end of file
@@ -0,0 +1,35 @@
+"""Поиск с опечатками по триграммам совпадает с полным перебором словаря расстоянием Левенштейна."""
+import os
+import pandas as pd
+from fuzzy_search import TrigramIndex, levenshtein, match_distance, normalize
+
+CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "books.jsonl")
+
+
+def test_levenshtein():
+    assert levenshtein("булгаков", "булгаков") == 0
+    assert levenshtein("булгаков", "булгкаов") == 2
+    assert levenshtein("кот", "кит") == 1
+    assert levenshtein("", "мир") == 3
+
+
+def test_suggest_finds_titles_with_typos():
+    titles = pd.read_json(CATALOG, lines=True)["title"].dropna().unique().tolist()
+    index = TrigramIndex(titles)
+    for title in titles[:20]:
+        query = normalize(title)
+        if len(query) < 6:
+            continue
+        typo = query[:2] + query[3] + query[2] + query[4:]  # две соседние буквы переставлены
+        suggestions = index.suggest(typo, limit=5, max_distance=2)
+        assert title in [text for text, _ in suggestions], (title, typo)
+        # Ближайшие по расстоянию — те же, что дает полный перебор
+        best = min(match_distance(typo, normalize(text), 2) for text in titles)
+        assert suggestions[0][1] == best
+
+
+def test_added_strings_are_searchable():
+    index = TrigramIndex(["Мастер и Маргарита"])
+    index.add(["Зеленый дракон востока", "Мастер и Маргарита"])
+    assert len(index.strings) == 2
+    assert index.suggest("зилёный дракон")[0][0] == "Зеленый дракон востока"
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""Планировщик фильтров: порядок условий по селективности и результат, как у полного просмотра."""
+import os
+import numpy as np
+from book_filter import BookFilter
+from database import BookDatabase
+
+CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "books.jsonl")
+
+
+def _book_filter():
+    db = BookDatabase(CATALOG)
+    return BookFilter(db.books, None, db.get_attribute_matrices())
+
+
+def _scan_positions(book_filter, filters):
+    """Позиции книг по фильтрам — пересечением масок полного просмотра"""
+    mask = np.ones(len(book_filter.books_df), dtype=bool)
+    for key, value in filters.items():
+        mask &= book_filter._scan_mask(key, value)
+    return np.flatnonzero(mask)
+
+
+def test_plan_orders_steps_by_estimate_with_scans_last():
+    book_filter = _book_filter()
+    books = book_filter.books_df
+    genre = books["main_genre"].mode()[0]
+    sub_genre = books.loc[books["main_genre"] == genre, "sub_genre"].value_counts().index[-1]
+    filters = {"author": books["author"].iat[0], "main_genre": genre, "min_rating": 3.0,
+               "sub_genre": sub_genre, "mood": ["мрачное"]}
+
+    steps = book_filter.planner.plan(filters)
+    assert sorted(step.key for step in steps) == sorted(filters)
+    assert [step.key for step in steps][-1] == "author" and steps[-1].scan
+    estimates = [step.estimate for step in steps if not step.scan]
+    assert estimates == sorted(estimates)
+    # Оценка по статистике индекса равна числу книг для точного значения
+    by_key = {step.key: step for step in steps}
+    assert by_key["main_genre"].estimate == int((books["main_genre"] == genre).sum())
+    assert by_key["sub_genre"].estimate <= by_key["main_genre"].estimate
+
+
+def test_execute_matches_full_scan():
+    book_filter = _book_filter()
+    books = book_filter.books_df
+    genre = books["main_genre"].mode()[0]
+    for filters in (
+        {},
+        {"main_genre": genre},
+        {"main_genre": [genre, books["main_genre"].iat[-1]], "min_rating": 4.0},
+        {"character_age_range": (20, 30), "mood": ["мрачное", "романтичное"]},
+        {"author": books["author"].iat[0], "main_genre": books["main_genre"].iat[0]},
+        {"main_genre": "Нет такого жанра", "min_rating": 4.0},
+        {"mood": "мрачное"},
+    ):
+        expected = _scan_positions(book_filter, filters)
+        assert book_filter.planner.execute(filters).tolist() == expected.tolist(), filters
+
+
+def test_explain_stops_after_empty_step():
+    book_filter = _book_filter()
+    plan = book_filter.planner.explain({"main_genre": "Нет такого жанра", "min_rating": 4.0, "mood": ["мрачное"]})
+    assert plan[0]["filter"] == "main_genre" and plan[0]["estimate"] == 0 and plan[0]["rows"] == 0
+    # Остальные шаги не выполнялись: кандидатов не осталось
+    assert [step["rows"] for step in plan[1:]] == [None, None]
\ No newline at end of file
@@ -0,0 +1,88 @@
+"""Фильтрация в режиме SQLite совпадает с фильтрацией в памяти: скалярные и списковые
+атрибуты, возраст героя и рейтинг."""
+import os
+import sqlite3
+from book_filter import BookFilter
+from database import BookDatabase
+from sqlite_storage import SQLiteStorage
+
+CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "books.jsonl")
+
+FILTERS = [
+    {},
+    {"character_age_range": (18, 25)},
+    {"character_age_range": (30, 40)},
+    {"character_age_range": (45, 60)},
+    {"character_age_range": (60, 99)},
+    {"main_genre": "Фэнтези", "character_age_range": (20, 30)},
+    {"mood": ["мрачное", "романтичное"], "min_rating": 4.5},
+    {"mood": "мрачное"},
+    {"tags": ["любовь", "одиночество"], "character_age_range": (20, 40)},
+    {"main_genre": ["Фэнтези", "Классика"]},
+    {"main_genre": "Классика", "sub_genre": "Магический реализм"},
+    {"character_gender": "мужчина", "pacing": ["медленный", "размеренный"], "min_rating": 4.0},
+    {"min_rating": 4.7},
+    {"setting_location": "Москва", "plot_tropes": ["договор с дьяволом"]},
+]
+
+
+def _filters(storage):
+    db = BookDatabase(CATALOG, storage)
+    return BookFilter(db.books, storage, db.get_attribute_matrices())
+
+
+def test_sql_filters_match_memory(tmp_path):
+    memory = _filters(None)
+    sqlite = _filters(SQLiteStorage(str(tmp_path / "libro.db")))
+    for filters in FILTERS:
+        assert sqlite.filter_positions(filters).tolist() == memory.filter_positions(filters).tolist(), filters
+
+
+def test_age_columns_added_to_existing_database(tmp_path):
+    path = str(tmp_path / "libro.db")
+    storage = SQLiteStorage(path)
+    BookDatabase(CATALOG, storage)
+    # База, созданная до появления колонок возраста
+    with storage.lock:
+        storage.connection.execute("DROP INDEX idx_books_age")
+        storage.connection.execute("ALTER TABLE books DROP COLUMN age_min")
+        storage.connection.execute("ALTER TABLE books DROP COLUMN age_max")
+        storage.connection.commit()
+    storage.connection.close()
+
+    memory = _filters(None)
+    migrated = _filters(SQLiteStorage(path))
+    for filters in FILTERS:
+        assert migrated.filter_positions(filters).tolist() == memory.filter_positions(filters).tolist(), filters
+    plan = " ".join(row[-1] for row in sqlite3.connect(path).execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM books WHERE age_min <= 30 AND age_max >= 20"))
+    assert "idx_books_age" in plan
+
+
+OPTION_FILTERS = [
+    {},
+    {"main_genre": "Классика"},
+    {"mood": ["мрачное"]},
+    {"mood": "мрачное"},
+    {"main_genre": "Фэнтези", "plot_tropes": ["договор с дьяволом", "пророчество"]},
+    {"main_genre": ["Фэнтези"]},
+]
+
+
+def test_sql_options_and_completion_match_memory(tmp_path):
+    memory = _filters(None)
+    storage = SQLiteStorage(str(tmp_path / "libro.db"))
+    db = BookDatabase(CATALOG, storage)
+    sqlite = BookFilter(db.books, storage)
+    # В режиме SQLite индексы фильтров в памяти не строятся
+    assert sqlite.index is None and not sqlite.attribute_matrices
+
+    assert sqlite.filter_hierarchy == memory.filter_hierarchy
+    for filters in OPTION_FILTERS:
+        assert sqlite.get_filter_options(filters) == memory.get_filter_options(filters), filters
+        for column in ("mood", "plot_tropes", "main_genre", "character_profession"):
+            assert sqlite.complete(column, "", 50, filters) == memory.complete(column, "", 50, filters), (column, filters)
+    for column in ("title", "author", "mood", "setting_location"):
+        assert sqlite.complete(column, "") == memory.complete(column, ""), column
+    assert sqlite.summarize(FILTERS[6]) == memory.summarize(FILTERS[6])
+    assert "SQLite" in sqlite.explain(FILTERS[1])
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""Профиль вкуса, обновляемый по событиям, совпадает с построенным заново по всем отзывам и спискам."""
+import os
+import random
+import numpy as np
+import pytest
+from auth import UserManager
+from book_page import BookPageManager
+from database import BookDatabase
+from sqlite_storage import SQLiteStorage
+from taste_profiles import FAVORITES_LIST, PROFILE_LIST_WEIGHTS, PROFILE_SCALAR_WEIGHTS, TasteProfileManager
+from user_lists import UserListsManager
+
+CATALOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "books.jsonl")
+
+
+def _assert_same(profile, expected):
+    assert profile.books.keys() == expected.books.keys()
+    assert all(profile.books[book_id] == pytest.approx(weight) for book_id, weight in expected.books.items())
+    assert profile.features.keys() == expected.features.keys()
+    for column, values in expected.features.items():
+        assert profile.features[column] == pytest.approx(values), column
+
+
+@pytest.mark.parametrize("mode", ["json", "sqlite"])
+def test_incremental_profile_equals_rebuild(tmp_path, monkeypatch, mode):
+    monkeypatch.chdir(tmp_path)  # файлы пользователей, списков и отзывов — во временном каталоге
+    storage = SQLiteStorage(str(tmp_path / "libro.db")) if mode == "sqlite" else None
+    db = BookDatabase(CATALOG, storage)
+    auth = UserManager(storage=storage)
+    auth.register("reader", "reader@example.com", "secret")
+    profiles = TasteProfileManager(db, auth)
+    lists = UserListsManager(storage=storage, profiles=profiles)
+    pages = BookPageManager(db, auth, lists, storage, profiles)
+    profiles.rebuild("reader", [], [])  # профиль ведется с первого события
+
+    rng = random.Random(0)
+    book_ids = db.books["id"].tolist()
+    for _ in range(60):
+        pages.add_review(rng.choice(book_ids), "reader", rng.randint(1, 5), "")
+        if rng.random() < 0.3:
+            lists.add_book_to_list("reader", FAVORITES_LIST, rng.choice(book_ids))
+        favorites = lists.get_list_book_ids("reader", FAVORITES_LIST)
+        if favorites and rng.random() < 0.15:
+            lists.remove_book_from_list("reader", FAVORITES_LIST, favorites[0])
+
+    profile = profiles.get_profile("reader")
+    assert not profile.is_empty()
+    expected = TasteProfileManager(db, auth).rebuild(
+        "other", pages.get_user_reviews("reader"), lists.get_list_book_ids("reader", FAVORITES_LIST))
+    _assert_same(profile, expected)
+    # Профиль сохранен вместе с пользователем
+    _assert_same(TasteProfileManager(db, UserManager(storage=storage)).get_profile("reader"), profile)
+
+
+def test_scores_are_profile_dot_book_features(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = BookDatabase(CATALOG)
+    profiles = TasteProfileManager(db, UserManager())
+    profile = profiles.rebuild("reader", [(book_id, {"rating": 5}) for book_id in db.books["id"].iloc[:5]], [])
+
+    weights = {**PROFILE_SCALAR_WEIGHTS, **PROFILE_LIST_WEIGHTS}
+    expected = []
+    for position in range(len(db.books)):
+        features = profiles.book_features(position)
+        expected.append(sum(weights[column] * profile.features.get(column, {}).get(value, 0.0)
+                            for column, values in features.items() for value in values))
+    assert np.allclose(profiles.scores(profile), expected)
\ No newline at end of file
@@ -0,0 +1,66 @@
+"""Полнотекстовый поиск: оценки BM25 как по формуле, фразы в кавычках и добавление книг."""
+import math
+import numpy as np
+from text_search import BM25_B, BM25_K1, FIELD_WEIGHTS, TextIndex, tokenize
+
+RECORDS = [
+    {"title": "Мастер и Маргарита", "author": "Михаил Булгаков", "tags": ["мистика", "сатира"],
+     "description": "Дьявол приезжает в Москву, мастер пишет роман о Пилате."},
+    {"title": "Собачье сердце", "author": "Михаил Булгаков", "tags": ["сатира"],
+     "description": "Профессор превращает собаку в человека."},
+    {"title": "Дракон", "author": "Евгений Шварц", "tags": ["сказка"],
+     "description": "Рыцарь Ланцелот побеждает дракона в городе, где дракон правит."},
+    {"title": "Зеленый дракон", "author": None, "tags": [], "description": "Дракон летает над горами."},
+]
+
+
+def _expected_scores(records, query):
+    """BM25 по взвешенной частоте терминов в полях — прямым подсчетом"""
+    docs = []
+    for record in records:
+        counts, length = {}, 0.0
+        for field, weight in FIELD_WEIGHTS.items():
+            texts = record.get(field)
+            for text in texts if isinstance(texts, list) else [texts]:
+                for token in tokenize(text):
+                    counts[token] = counts.get(token, 0.0) + weight
+                    length += weight
+        docs.append((counts, length))
+    average = sum(length for _, length in docs) / len(docs)
+    scores = np.zeros(len(docs))
+    for term in set(tokenize(query)):
+        frequency = sum(term in counts for counts, _ in docs)
+        idf = math.log(1 + (len(docs) - frequency + 0.5) / (frequency + 0.5))
+        for doc, (counts, length) in enumerate(docs):
+            tf = counts.get(term, 0.0)
+            scores[doc] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / average))
+    return scores
+
+
+def test_scores_match_bm25_formula():
+    index = TextIndex(RECORDS)
+    for query in ("дракон", "Булгаков сатира", "драконы летают", "Пушкин"):
+        assert np.allclose(index.match(query), _expected_scores(RECORDS, query), rtol=1e-5), query
+    positions, _ = index.search("дракон")
+    assert positions.tolist() == [3, 2]  # в коротком документе дракон весомее
+
+
+def test_phrase_must_appear_in_order_within_one_field():
+    index = TextIndex(RECORDS)
+    assert np.flatnonzero(index.match('"зеленый дракон"')).tolist() == [3]
+    assert not index.match('"дракон зеленый"').any()
+    # Конец названия и начало автора не образуют фразу
+    assert not index.match('"сердце михаил"').any()
+    positions, _ = index.search('михаил "собачье сердце"')
+    assert positions.tolist() == [1]
+
+
+def test_added_documents_match_full_build(monkeypatch):
+    monkeypatch.setattr("text_search.SEGMENT_SIZE", 4)  # несколько замороженных сегментов и открытый
+    records = [dict(RECORDS[number % len(RECORDS)], title=f"Книга {number}") for number in range(14)]
+    index = TextIndex(records[:3])
+    for record in records[3:]:
+        index.add_document(record)
+    full = TextIndex(records)
+    for query in ("дракон", "книга 12", '"мастер пишет"', "сатира булгаков"):
+        assert np.allclose(index.match(query), full.match(query), rtol=1e-5), query
\ No newline at end of file
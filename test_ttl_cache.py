@@ -0,0 +1,40 @@
+"""Кэш результатов: вытеснение давно не использованных записей и срок жизни."""
+from ttl_cache import TTLCache
+
+
+def test_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # «a» использована позже «b»
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats() == {"size": 2, "hits": 3, "misses": 1, "evictions": 1}
+
+
+def test_expired_entry_is_recomputed(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("ttl_cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(ttl=10)
+    calls = []
+    compute = lambda: calls.append(now[0]) or len(calls)
+
+    assert cache.get_or_compute("key", compute) == 1
+    now[0] += 5
+    assert cache.get_or_compute("key", compute) == 1
+    now[0] += 6  # запись старше ttl
+    assert cache.get_or_compute("key", compute) == 2
+    assert calls == [1000.0, 1011.0]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_and_clear():
+    cache = TTLCache()
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.invalidate("a")
+    cache.invalidate("missing")
+    assert cache.get("a") is None and len(cache) == 1
+    cache.clear()
+    assert len(cache) == 0
@@ -0,0 +1,269 @@
+import math
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from filter_index import top_k
+from ttl_cache import TTLCache
+
+# Поля документа и их вес в частоте термина (BM25 по взвешенной сумме полей)
+FIELD_WEIGHTS = {"title": 3.0, "author": 2.0, "tags": 2.0, "description": 1.0}
+
+# Разрыв позиций между полями и тегами: фраза не склеивается из соседних полей
+FIELD_GAP = 2
+
+# Параметры BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Добавленные книги копятся в открытом сегменте, заполненный сегмент замораживается
+SEGMENT_SIZE = 1000
+
+# Сколько последних запросов хранят массив оценок (4 байта на книгу каталога)
+SCORES_CACHE_SIZE = 8
+
+TOKEN_PATTERN = re.compile(r"[0-9a-zа-я]+")
+PHRASE_PATTERN = re.compile(r'"([^"]*)"')
+CYRILLIC_PATTERN = re.compile(r"[а-я]")
+
+# Окончания для легкого стемминга русских слов (сначала более длинные)
+REFLEXIVE_SUFFIXES = ("ся", "сь")
+RUSSIAN_ENDINGS = sorted({
+    "иями", "ями", "ами", "иях", "ях", "ах", "ией", "ей", "ой", "ий", "ый", "ая", "яя",
+    "ое", "ее", "ые", "ие", "ого", "его", "ому", "ему", "ыми", "ими", "ым", "им", "ом", "ем",
+    "ам", "ям", "ую", "юю", "ов", "ев", "ью", "ия", "ья", "ье", "ию", "ть", "ти", "ла", "ло",
+    "ли", "ет", "ит", "ют", "ут", "ат", "ят", "ешь", "ишь", "ете", "ите",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "й",
+}, key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+
+# Служебные слова не участвуют в ранжировании (но остаются в позиционном индексе для фраз)
+STOP_WORDS = frozenset({
+    "и", "в", "во", "на", "с", "со", "к", "ко", "по", "о", "об", "от", "до", "из", "за", "у", "для",
+    "не", "ни", "а", "но", "или", "что", "как", "же", "ли", "бы", "the", "a", "an", "of", "and",
+})
+
+
+@lru_cache(maxsize=200_000)
+def stem(word: str) -> str:
+    """Легкий стемминг: у русских слов отбрасывается возвратная частица и одно окончание"""
+    if len(word) <= MIN_STEM_LENGTH or not CYRILLIC_PATTERN.search(word):
+        return word
+
+    for suffix in REFLEXIVE_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            word = word[:-len(suffix)]
+            break
+
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text) -> List[str]:
+    """Термины текста: нижний регистр, «ё» → «е», слова из букв и цифр, стемминг"""
+    if not isinstance(text, str):
+        return []
+    return [stem(token) for token in TOKEN_PATTERN.findall(text.lower().replace("ё", "е"))]
+
+
+class _Segment:
+    """Неизменяемый сегмент индекса: постинги (CSR по терминам) и вхождения терминов.
+
+    Постинг — пара (термин, документ) с взвешенной частотой. Вхождение — ключ
+    «документ << 32 | позиция»; вхождения термина лежат подряд и отсортированы.
+    """
+
+    def __init__(self, term_ids: np.ndarray, docs: np.ndarray, positions: np.ndarray,
+                 weights: np.ndarray, n_terms: int):
+        order = np.lexsort((positions, docs, term_ids))
+        term_ids, docs = term_ids[order], docs[order]
+        self.occurrences = (docs << 32) | positions[order]
+        weights = weights[order]
+
+        # Начало каждого постинга в потоке токенов
+        starts = np.flatnonzero(np.concatenate(([True], (np.diff(term_ids) != 0) | (np.diff(docs) != 0)))) \
+            if len(term_ids) else np.zeros(0, dtype=np.int64)
+        self.docs = docs[starts].astype(np.int32)
+        self.tf = np.add.reduceat(weights, starts).astype(np.float32) if len(starts) else np.zeros(0, np.float32)
+        self.occurrences_indptr = np.append(starts, len(term_ids)).astype(np.int64)
+        self.term_indptr = np.concatenate(
+            ([0], np.cumsum(np.bincount(term_ids[starts], minlength=n_terms)))
+        ).astype(np.int64)
+
+    def postings(self, term_id: int) -> slice:
+        """Диапазон постингов термина"""
+        if term_id + 1 >= len(self.term_indptr):
+            return slice(0, 0)
+        return slice(self.term_indptr[term_id], self.term_indptr[term_id + 1])
+
+    def term_occurrences(self, term_id: int) -> np.ndarray:
+        """Отсортированные ключи вхождений термина"""
+        postings = self.postings(term_id)
+        return self.occurrences[self.occurrences_indptr[postings.start]:self.occurrences_indptr[postings.stop]]
+
+    def memory_usage(self) -> int:
+        return sum(array.nbytes for array in (self.occurrences, self.docs, self.tf,
+                                              self.occurrences_indptr, self.term_indptr))
+
+
+class TextIndex:
+    """Полнотекстовый индекс каталога: название, автор, описание и теги.
+
+    Ранжирование BM25, фразы в кавычках проверяются по позиционному индексу.
+    Документ — позиция книги в каталоге (строка db.books), поэтому результат
+    пересекается с результатом BookFilter без перевода в id.
+    """
+
+    def __init__(self, records: Iterable[Dict]):
+        self.vocabulary: Dict[str, int] = {}
+        self.segments: List[_Segment] = []
+        self.doc_lengths = np.zeros(0, dtype=np.float32)  # взвешенная длина документа
+        self.doc_frequency = np.zeros(0, dtype=np.int64)  # в скольких документах встречается термин
+        self._open_records: List[Dict] = []  # книги открытого (последнего) сегмента
+        self._open_segment: Optional[_Segment] = None
+        self._lock = threading.RLock()
+        # Оценки недавних запросов: повторные запуски страницы и «Показать еще» не пересчитывают BM25.
+        # Ключ включает число книг, поэтому добавление книги делает старые записи недоступными
+        self.scores_cache = TTLCache(maxsize=SCORES_CACHE_SIZE)
+
+        self.segments.append(self._build_segment(list(records), doc_offset=0))
+
+    @property
+    def n_docs(self) -> int:
+        return len(self.doc_lengths)
+
+    def add_document(self, record: Dict):
+        """Добавление книги (следующая позиция каталога) без перестройки индекса"""
+        with self._lock:
+            self._open_records.append(record)
+            doc_offset = self.n_docs - (len(self._open_records) - 1)
+            if self._open_segment is not None:
+                # Открытый сегмент пересобирается целиком: он не больше SEGMENT_SIZE книг
+                self._forget_segment(self._open_segment, doc_offset)
+                self.segments.remove(self._open_segment)
+
+            self._open_segment = self._build_segment(self._open_records, doc_offset)
+            self.segments.append(self._open_segment)
+            if len(self._open_records) >= SEGMENT_SIZE:
+                self._open_records = []
+                self._open_segment = None
+
+    def _build_segment(self, records: List[Dict], doc_offset: int) -> _Segment:
+        """Токенизация книг и построение сегмента; статистика BM25 обновляется"""
+        term_ids, docs, positions, weights = [], [], [], []
+        doc_lengths = np.zeros(len(records), dtype=np.float32)
+
+        for doc, record in enumerate(records):
+            position = 0
+            for field, weight in FIELD_WEIGHTS.items():
+                texts = record.get(field)
+                texts = texts if isinstance(texts, list) else [texts]
+                for text in texts:
+                    tokens = tokenize(text)
+                    term_ids.extend(self.vocabulary.setdefault(token, len(self.vocabulary)) for token in tokens)
+                    positions.extend(range(position, position + len(tokens)))
+                    docs.extend([doc_offset + doc] * len(tokens))
+                    weights.extend([weight] * len(tokens))
+                    doc_lengths[doc] += weight * len(tokens)
+                    position += len(tokens) + FIELD_GAP
+
+        segment = _Segment(np.asarray(term_ids, dtype=np.int64), np.asarray(docs, dtype=np.int64),
+                           np.asarray(positions, dtype=np.int64), np.asarray(weights, dtype=np.float32),
+                           len(self.vocabulary))
+
+        self.doc_lengths = np.concatenate((self.doc_lengths[:doc_offset], doc_lengths))
+        # Нормировка BM25 по длине документа зависит от средней длины — пересчитывается при добавлении
+        average_length = max(float(self.doc_lengths.mean()), 1e-9) if self.n_docs else 1.0
+        self._length_norm = (BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / average_length)).astype(np.float32)
+        frequency = np.diff(segment.term_indptr)
+        self.doc_frequency = np.pad(self.doc_frequency, (0, len(frequency) - len(self.doc_frequency)))
+        self.doc_frequency += frequency
+        return segment
+
+    def _forget_segment(self, segment: _Segment, doc_offset: int):
+        """Вычитание статистики сегмента перед его пересборкой"""
+        frequency = np.diff(segment.term_indptr)
+        self.doc_frequency[:len(frequency)] -= frequency
+        self.doc_lengths = self.doc_lengths[:doc_offset]
+
+    def match(self, query: str) -> np.ndarray:
+        """Оценки BM25 всех книг каталога по запросу (0 — книга не подходит).
+
+        Слова запроса объединяются по «или» и ранжируются; фразы в двойных
+        кавычках обязательны и должны встречаться подряд в одном поле.
+        Массив только для чтения: он разделяется между вызовами через кэш.
+        """
+        return self.scores_cache.get_or_compute((self.n_docs, query), lambda: self._match(query))
+
+    def search(self, query: str, limit: Optional[int] = None,
+               candidates: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Поиск: позиции книг в каталоге и оценки BM25 по убыванию.
+
+        candidates — позиции, которыми ограничен поиск (например, результат BookFilter).
+        """
+        scores = self.match(query)
+        positions = np.flatnonzero(scores) if candidates is None else candidates[scores[candidates] > 0]
+        positions = positions[top_k(scores[positions], len(positions) if limit is None else limit)]
+        return positions, scores[positions]
+
+    def _match(self, query: str) -> np.ndarray:
+        phrases = [tokenize(phrase) for phrase in PHRASE_PATTERN.findall(query)]
+        phrases = [phrase for phrase in phrases if phrase]
+        terms = tokenize(PHRASE_PATTERN.sub(" ", query)) + [term for phrase in phrases for term in phrase]
+        terms = [term for term in terms if term not in STOP_WORDS]
+
+        with self._lock:
+            if any(term not in self.vocabulary for phrase in phrases for term in phrase):
+                # Термина фразы нет в словаре — фраза не встречается нигде
+                scores = np.zeros(self.n_docs, dtype=np.float32)
+            else:
+                scores = self._bm25(sorted({self.vocabulary[term] for term in terms if term in self.vocabulary}))
+                for phrase in phrases:
+                    scores[~self._phrase_mask([self.vocabulary[term] for term in phrase])] = 0
+        scores.flags.writeable = False
+        return scores
+
+    def _bm25(self, term_ids: List[int]) -> np.ndarray:
+        """Оценки BM25 всех документов (0 — ни одного термина запроса)"""
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        if not self.n_docs:
+            return scores
+
+        for term_id in term_ids:
+            frequency = self.doc_frequency[term_id]
+            idf = math.log(1 + (self.n_docs - frequency + 0.5) / (frequency + 0.5))
+            for segment in self.segments:
+                postings = segment.postings(term_id)
+                docs = segment.docs[postings]
+                tf = segment.tf[postings]
+                # Документы в постингах термина уникальны, поэтому += без np.add.at
+                scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + self._length_norm[docs])
+        return scores
+
+    def _phrase_mask(self, term_ids: List[int]) -> np.ndarray:
+        """Документы, где термины фразы идут подряд"""
+        mask = np.zeros(self.n_docs, dtype=bool)
+        for segment in self.segments:
+            occurrences = [segment.term_occurrences(term_id) for term_id in term_ids]
+            # Начала фразы берутся по самому редкому термину, остальные ищутся бинарным поиском
+            anchor = int(np.argmin([len(keys) for keys in occurrences]))
+            starts = occurrences[anchor] - anchor
+            for offset, keys in enumerate(occurrences):
+                if offset == anchor:
+                    continue
+                if not len(starts) or not len(keys):
+                    starts = starts[:0]
+                    break
+                expected = starts + offset
+                found = np.minimum(np.searchsorted(keys, expected), len(keys) - 1)
+                starts = starts[keys[found] == expected]
+            mask[starts >> 32] = True
+        return mask
+
+    def memory_usage(self) -> int:
+        """Объем индекса в байтах (без словаря)"""
+        return (sum(segment.memory_usage() for segment in self.segments)
+                + self.doc_lengths.nbytes + self._length_norm.nbytes + self.doc_frequency.nbytes)
\ No newline at end of file
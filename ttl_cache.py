@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """Ограниченный LRU-кэш со сроком жизни записей и счетчиками попаданий.
+
+    Потокобезопасен: один экземпляр разделяют все сессии Streamlit.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl  # секунды; None — записи не устаревают
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # {ключ: (время записи, значение)}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default=None):
+        """Значение по ключу (устаревшая запись удаляется и считается промахом)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value):
+        """Сохранение значения; при переполнении вытесняется давно не использованная запись"""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        """Значение из кэша или результат compute(), сохраненный в кэш"""
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            # Вычисление идет без блокировки: параллельные промахи по одному ключу допустимы
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def invalidate(self, key: Hashable):
+        """Удаление записи, если она есть"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики кэша: размер, попадания, промахи, вытеснения"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
\ No newline at end of file
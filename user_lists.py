@@ -13,9 +13,18 @@ class UserBookList:
 class UserListsManager:
     """Менеджер списков пользователей"""
     
-    def __init__(self, data_file="user_lists.json"):
+    def __init__(self, data_file="user_lists.json", storage=None, profiles=None):
         self.data_file = data_file
+        self.storage = storage
+        self.profiles = profiles  # профили вкуса (taste_profiles.py); None — без профилей
         self.user_lists = self._load_data()
+        self.user_versions: Dict[str, int] = {}  # {username: счетчик изменений списков}
+        
+        if storage is not None:
+            # Списки хранятся в SQLite, JSON импортируется один раз
+            if storage.is_empty("user_lists"):
+                storage.import_user_lists(self._serialize(self.user_lists))
+            self.user_lists = {}
     
     def _load_data(self) -> Dict[str, Dict[str, UserBookList]]:
         """Загрузка данных из файла"""
@@ -34,11 +43,10 @@ class UserListsManager:
                 return {}
         return {}
     
-    def _save_data(self):
-        """Сохранение данных в файл"""
-        # Преобразуем объекты в словари
+    def _serialize(self, user_lists: Dict[str, Dict[str, UserBookList]]) -> Dict:
+        """Преобразование объектов списков в словари (формат user_lists.json)"""
         save_data = {}
-        for username, lists_dict in self.user_lists.items():
+        for username, lists_dict in user_lists.items():
             save_data[username] = {}
             for list_name, book_list in lists_dict.items():
                 save_data[username][list_name] = {
@@ -46,22 +54,68 @@ class UserListsManager:
                     "book_ids": book_list.book_ids,
                     "description": book_list.description
                 }
+        return save_data
+    
+    def _save_data(self):
+        """Сохранение данных в файл"""
+        save_data = self._serialize(self.user_lists)
         
         with open(self.data_file, 'w', encoding='utf-8') as f:
             json.dump(save_data, f, ensure_ascii=False, indent=2)
     
+    def get_user_version(self, username: str) -> int:
+        """Счетчик изменений списков пользователя: по нему сбрасываются кэши, зависящие от списков"""
+        return self.user_versions.get(username, 0)
+    
+    def _touch(self, username: str):
+        self.user_versions[username] = self.user_versions.get(username, 0) + 1
+    
+    def _changed(self, username: str, list_name: str, book_id: int, added: bool):
+        """Книга действительно добавлена в список или удалена из него"""
+        if self.profiles is not None:
+            self.profiles.on_list_change(username, list_name, book_id, added)
+        self._touch(username)
+    
     def get_user_lists(self, username: str) -> Dict[str, UserBookList]:
         """Получение списков пользователя"""
-        return self.user_lists.get(username, {
+        default_lists = {
             "reading": UserBookList("Читаю", [], "Книги, которые читаю сейчас"),
             "read": UserBookList("Прочитано", [], "Прочитанные книги"),
             "planned": UserBookList("Планирую", [], "Книги, которые планирую прочитать"),
             "dropped": UserBookList("Брошено", [], "Книги, которые бросил читать"),
             "favorites": UserBookList("Любимые", [], "Мои любимые книги")
-        })
+        }
+        
+        if self.storage is not None:
+            stored_lists = self.storage.get_user_lists(username)
+            if not stored_lists:
+                return default_lists
+            return {list_name: UserBookList(**list_data) for list_name, list_data in stored_lists.items()}
+        
+        return self.user_lists.get(username, default_lists)
+    
+    def get_list_book_ids(self, username: str, list_name: str) -> List[int]:
+        """Получение id книг в списке пользователя"""
+        if self.storage is not None:
+            return self.storage.get_list_book_ids(username, list_name)
+        
+        if username not in self.user_lists or list_name not in self.user_lists[username]:
+            return []
+        return self.user_lists[username][list_name].book_ids
     
     def add_book_to_list(self, username: str, list_name: str, book_id: int):
         """Добавление книги в список"""
+        if self.storage is not None:
+            lists = self.get_user_lists(username)
+            if list_name not in lists:
+                lists[list_name] = UserBookList(list_name)
+            for key, book_list in lists.items():
+                self.storage.save_list(username, key, book_list.name, book_list.description)
+            if book_id not in lists[list_name].book_ids:
+                self.storage.add_list_book(username, list_name, book_id)
+                self._changed(username, list_name, book_id, added=True)
+            return
+        
         if username not in self.user_lists:
             self.user_lists[username] = self.get_user_lists(username)
         
@@ -71,15 +125,23 @@ class UserListsManager:
         if book_id not in self.user_lists[username][list_name].book_ids:
             self.user_lists[username][list_name].book_ids.append(book_id)
             self._save_data()
+            self._changed(username, list_name, book_id, added=True)
     
     def remove_book_from_list(self, username: str, list_name: str, book_id: int):
         """Удаление книги из списка"""
+        if self.storage is not None:
+            if book_id in self.get_list_book_ids(username, list_name):
+                self.storage.remove_list_book(username, list_name, book_id)
+                self._changed(username, list_name, book_id, added=False)
+            return
+        
         if (username in self.user_lists and 
             list_name in self.user_lists[username] and
             book_id in self.user_lists[username][list_name].book_ids):
             
             self.user_lists[username][list_name].book_ids.remove(book_id)
             self._save_data()
+            self._changed(username, list_name, book_id, added=False)
     
     def move_book_between_lists(self, username: str, book_id: int, 
                                 from_list: str, to_list: str):
@@ -90,17 +152,7 @@ class UserListsManager:
     def get_books_in_list(self, username: str, list_name: str, 
                           book_db) -> List[Dict]:
         """Получение информации о книгах в списке"""
-        if username not in self.user_lists or list_name not in self.user_lists[username]:
-            return []
-        
-        book_ids = self.user_lists[username][list_name].book_ids
-        books = book_db.books[book_db.books["id"].isin(book_ids)]
-        
-        # Сохраняем порядок как в списке
-        ordered_books = []
-        for book_id in book_ids:
-            book_data = books[books["id"] == book_id]
-            if not book_data.empty:
-                ordered_books.append(book_data.iloc[0].to_dict())
+        book_ids = self.get_list_book_ids(username, list_name)
         
-        return ordered_books
\ No newline at end of file
+        # Пакетный запрос по индексу, порядок как в списке сохраняется
+        return book_db.get_books(book_ids)
\ No newline at end of file